@@ -2,16 +2,33 @@ from os import path
 
 from matminer.utils.io import load_dataframe_from_json, store_dataframe_as_json
 
-from mp_time_split.core import MPTimeSplit, get_data_home
-from mp_time_split.utils.data import DUMMY_SNAPSHOT_NAME, SNAPSHOT_NAME
+from mp_time_split.core import MPTimeSplit, get_cache_home, get_data_home
+from mp_time_split.utils.data import (
+    DUMMY_SNAPSHOT_NAME,
+    SNAPSHOT_NAME,
+    ReferenceCache,
+)
+from mp_time_split.utils.snapshot import write_snapshot
+
+# compression of the published snapshots, see `mp_time_split.utils.codecs.CODECS`.
+# The checksums frozen in `mp_time_split.core` are of gzip files, so other codecs
+# (e.g. "bgzf" for parallel decompression in `load()`) require publishing the
+# snapshots and their checksums anew
+codec = "gzip"
+
+# parsed references are reused across entries and across snapshot builds, kept in
+# the user cache directory rather than the package data directory
+reference_cache = ReferenceCache(
+    maxsize=None, cache_path=path.join(get_cache_home(), "reference_cache.json.gz")
+)
 
 # %% dummy data
 mpt = MPTimeSplit(num_sites=(1, 2), elements=["V"])
-dummy_expt_df = mpt.fetch_data(one_by_one=True)
+dummy_expt_df = mpt.fetch_data(one_by_one=True, reference_cache=reference_cache)
 dummy_data_path = path.join(get_data_home(), DUMMY_SNAPSHOT_NAME)
 
 store_dataframe_as_json(dummy_expt_df, dummy_data_path, compression=None)
-store_dataframe_as_json(dummy_expt_df, dummy_data_path + ".gz", compression="gz")
+write_snapshot(dummy_expt_df, dummy_data_path + ".gz", codec=codec, n_jobs=-1)
 
 dummy_expt_df_check = load_dataframe_from_json(dummy_data_path)
 
@@ -21,10 +38,10 @@ if not dummy_match.empty:
 
 # %% full data
 mpt = MPTimeSplit(num_sites=(1, 52))
-expt_df = mpt.fetch_data()
+expt_df = mpt.fetch_data(reference_cache=reference_cache)
 data_path = path.join(get_data_home(), SNAPSHOT_NAME)
 store_dataframe_as_json(expt_df, data_path, compression=None)
-store_dataframe_as_json(expt_df, data_path + ".gz", compression="gz")
+write_snapshot(expt_df, data_path + ".gz", codec=codec, n_jobs=-1)
 expt_df_check = load_dataframe_from_json(dummy_data_path)
 
 match = dummy_expt_df.compare(dummy_expt_df_check)
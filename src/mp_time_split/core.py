@@ -18,23 +18,35 @@ References:
 import argparse
 import logging
 import sys
+from copy import copy
+from functools import partial
 from hashlib import md5
 from os import environ, path
 from pathlib import Path
-from shutil import move
+from shutil import copyfileobj
 from typing import List, Optional, Tuple, Union
-from urllib.request import urlretrieve
+from urllib.request import urlopen
 
-import pandas as pd
-import pybtex.errors
-from matminer.utils.io import load_dataframe_from_json
 from typing_extensions import Literal
 
 from mp_time_split import __version__
-from mp_time_split.utils.data import DUMMY_SNAPSHOT_NAME, SNAPSHOT_NAME
-from mp_time_split.utils.split import AVAILABLE_MODES, mp_time_split
-
-pybtex.errors.set_strict_mode(False)
+from mp_time_split.utils.constants import AVAILABLE_MODES, TEST_FOLD
+from mp_time_split.utils.data import DUMMY_SNAPSHOT_NAME, SNAPSHOT_NAME, atomic_write
+from mp_time_split.utils.instrument import phase
+
+# pandas, matminer, pybtex, scikit-learn etc. are imported where they are first
+# needed so that importing this module (e.g. for the CLI) stays fast
+
+# attributes set by `load()` and `fetch_data()`, shared by concurrent async loads
+LOAD_STATE = [
+    "data",
+    "data_path",
+    "checksum",
+    "reference_table",
+    "filter_key",
+    "trainval_splits",
+    "test_split",
+]
 
 __author__ = "sgbaird"
 __copyright__ = "sgbaird"
@@ -94,6 +106,87 @@ def get_data_home(data_home=None):
     return data_home
 
 
+def get_cache_home(cache_home=None):
+    """
+    Selects the directory for files derived from snapshots (e.g. indices, symmetry
+    info and the snapshot store) when no `save_dir` is given to :class:`MPTimeSplit`.
+    Unlike :func:`get_data_home`, this is never inside the installed package.
+
+    Args:
+        cache_home (str): folder to use, if None a default is selected
+
+    Returns (str)
+    """
+    # first check for env var, then default to the user cache directory
+    if cache_home is None:
+        cache_home = environ.get(
+            "MP_TIME_CACHE",
+            path.join(environ.get("XDG_CACHE_HOME", "~/.cache"), "mp_time_split"),
+        )
+
+    cache_home = path.expanduser(cache_home)
+
+    return cache_home
+
+
+def get_snapshot_path(save_dir, dummy=False):
+    """Path of the (dummy) snapshot in `save_dir`."""
+    name = SNAPSHOT_NAME if not dummy else DUMMY_SNAPSHOT_NAME
+    return path.join(save_dir, name + ".gz")
+
+
+def verify_snapshot(data_path, checksum=None, dummy=False):
+    """Check the md5 checksum of a snapshot on disk, raising ValueError on mismatch.
+
+    If `checksum` is None, the checksum of the (dummy) figshare snapshot is expected.
+    """
+    if checksum is None:
+        checksum = dummy_checksum_frozen if dummy else full_checksum_frozen
+    actual = md5(Path(data_path).read_bytes()).hexdigest()
+    if actual != checksum:
+        raise ValueError(
+            f"checksum of {data_path} ({actual}) does not match what was expected {checksum})"  # noqa: E501
+        )
+    return actual
+
+
+def get_download_source(url=None, checksum=None, dummy=False):
+    """Resolve the URL of a snapshot and the checksum it is expected to have.
+
+    Without `url` and `checksum`, the (dummy) snapshot from figshare is used. The
+    expected checksum is None if it is not known in advance.
+    """
+    if dummy and url is None and checksum is None:
+        # dummy data from figshare for testing
+        return "https://figshare.com/ndownloader/files/35592005", dummy_checksum_frozen
+    if not dummy and url is None and checksum is None:
+        # full dataset from figshare for production
+        return "https://figshare.com/ndownloader/files/35592011", full_checksum_frozen
+    if url is None:
+        raise ValueError(
+            f"url should not be None at this point. url: {url}, type: {type(url)}"
+        )
+    return url, None
+
+
+def get_store_version(url=None, checksum=None, dummy=False):
+    """Name of a snapshot in the store of :func:`MPTimeSplit.load`, None if unknown.
+
+    Snapshots from figshare are stored under a ref ("dummy" or "full") since the
+    checksum of a snapshot already on disk is not known in advance.
+    """
+    if checksum is None and url is None:
+        return "dummy" if dummy else "full"
+    return checksum
+
+
+def check_download_checksum(url, checksum, checksum_frozen):
+    if checksum_frozen is not None and checksum != checksum_frozen:
+        raise ValueError(
+            f"checksum from {url} ({checksum}) does not match what was expected {checksum_frozen})"  # noqa: E501
+        )
+
+
 class MPTimeSplit:
     def __init__(
         self,
@@ -121,14 +214,29 @@ class MPTimeSplit:
 
         if save_dir is None:
             self.save_dir = get_data_home()
+            # the default `save_dir` may be the installed package, so derived files
+            # are kept out of it
+            self.cache_dir = get_cache_home()
         else:
             self.save_dir = save_dir
+            self.cache_dir = save_dir
 
         Path(self.save_dir).mkdir(exist_ok=True, parents=True)
 
         self.target = target
 
-    def fetch_data(self, one_by_one=False):
+        self.data = None
+        self.data_path = None
+        self.checksum = None
+        self.graphs = None
+        self.reference_table = None
+        self.filter_key = None
+
+    def fetch_data(self, one_by_one=False, **fetch_kwargs):
+        import pandas as pd
+
+        from mp_time_split.utils.split import mp_time_split
+
         try:
             from mp_time_split.utils.api import fetch_data
         except ImportError as e:
@@ -142,64 +250,400 @@ class MPTimeSplit:
             exclude_elements=self.exclude_elements,
             use_theoretical=self.use_theoretical,
             one_by_one=one_by_one,
+            **fetch_kwargs,
         )
         if not isinstance(self.data, pd.DataFrame):
             raise ValueError("`self.data` is not a `pd.DataFrame`")
-
-        self.trainval_splits, self.test_split = mp_time_split(
-            self.data, n_cv_splits=len(FOLDS), mode=self.mode
-        )
+        # fetched data is not associated with a snapshot on disk
+        self.data_path = None
+        self.checksum = None
+        self.reference_table = None
+        self.filter_key = None
+        self.graphs = None
+
+        with phase("split", items=len(self.data), mode=self.mode):
+            self.trainval_splits, self.test_split = mp_time_split(
+                self.data, n_cv_splits=len(FOLDS), mode=self.mode
+            )
         self.inputs = self.data.structure
         self.outputs = getattr(self.data, self.target)
         return self.data
 
-    def load(self, url=None, checksum=None, dummy=False, force_download=False):
-        name = SNAPSHOT_NAME if not dummy else DUMMY_SNAPSHOT_NAME
-        name = name + ".gz"
-        data_path = path.join(self.save_dir, name)
+    def download(self, url=None, checksum=None, dummy=False, force_download=False):
+        """Download the snapshot into `self.save_dir` unless already present.
+
+        Returns the path and md5 checksum of the snapshot without loading it. See
+        :func:`load` for the parameters.
+        """
+        data_path = get_snapshot_path(self.save_dir, dummy=dummy)
 
         is_on_disk = Path(data_path).is_file()
 
         if force_download or not is_on_disk:
-            if dummy and url is None and checksum is None:
-                # dummy data from figshare for testing
-                url = "https://figshare.com/ndownloader/files/35592005"
-                checksum_frozen = dummy_checksum_frozen
-            elif not dummy and url is None and checksum is None:
-                # full dataset from figshare for production
-                url = "https://figshare.com/ndownloader/files/35592011"
-                checksum_frozen = full_checksum_frozen
-            elif url is None:
-                raise ValueError(
-                    f"url should not be None at this point. url: {url}, type: {type(url)}"  # noqa: E501
-                )
-            else:
-                checksum_frozen = None
+            url, checksum_frozen = get_download_source(url, checksum, dummy=dummy)
 
-            # download to temp file in case interrupted partway
-            data_path_tmp = data_path + "tmp"
-            urlretrieve(url, data_path_tmp)
-            move(data_path_tmp, data_path)
+            with phase("download", url=url) as record:
+                with urlopen(url) as response, atomic_write(data_path) as f:
+                    copyfileobj(response, f)
+                record["bytes"] = path.getsize(data_path)
         else:
             checksum_frozen = None
 
-        checksum = md5(Path(data_path).read_bytes()).hexdigest()
+        with phase("verify", bytes=path.getsize(data_path)):
+            checksum = md5(Path(data_path).read_bytes()).hexdigest()
 
-        if checksum_frozen is not None and checksum != checksum_frozen:
-            raise ValueError(
-                f"checksum from {url} ({checksum}) does not match what was expected {checksum_frozen})"  # noqa: E501
-            )
+        check_download_checksum(url, checksum, checksum_frozen)
+        return data_path, checksum
+
+    def load(
+        self,
+        url=None,
+        checksum=None,
+        dummy=False,
+        force_download=False,
+        symprec=None,
+        n_jobs=None,
+        compact=False,
+        normalize_references=False,
+        store=False,
+        block_size=None,
+    ):
+        """Load the (dummy) snapshot, downloading it first if necessary.
+
+        The compression codec of the snapshot (e.g. gzip, BGZF or zstd) is detected
+        from its contents, and BGZF or zstd blocks are decompressed across `n_jobs`
+        threads, see :mod:`mp_time_split.utils.codecs`. `n_jobs` also applies to the
+        symmetry analysis if `symprec` is not None.
+
+        If `compact`, the non-structure columns are converted to compact dtypes, e.g.
+        `material_id` to integer IDs. See
+        :func:`mp_time_split.utils.compact.compact_dataframe`.
+
+        If `normalize_references`, the `references` and `discovery` columns are moved
+        to `self.reference_table`, which stores each distinct reference and author
+        only once and rebuilds the per-entry values on demand. See
+        :class:`mp_time_split.utils.references.ReferenceTable`.
+
+        If `store`, snapshots are kept in the content-addressed store at
+        `{cache_dir}/store` under their checksum, where entries shared between
+        versions (e.g. the dummy, full and custom `url`/`checksum` snapshots) are
+        stored only once. A version already in the store is loaded from there without
+        downloading. See :class:`mp_time_split.utils.store.SnapshotStore`.
+
+        The `num_sites`, `elements` and `exclude_elements` filters of this instance
+        are applied to the snapshot via per-entry element bitmasks and a sorted
+        number-of-sites index, which are computed once and stored in `cache_dir`.
+        Splits are computed on the filtered snapshot, which stays sorted by
+        year. See :class:`mp_time_split.utils.query.SnapshotIndex`.
+
+        If `block_size` is not None, the snapshot is read through a copy stored in
+        `cache_dir` (created on first use) in which entries are grouped by chemical
+        system into compressed blocks of `block_size` entries with per-block element,
+        site and year statistics. Blocks that cannot match the filters are then skipped
+        without being decompressed. See
+        :func:`mp_time_split.utils.blocks.write_block_snapshot`.
+
+        `cache_dir` is `save_dir` if one was passed to :class:`MPTimeSplit`, and
+        :func:`get_cache_home` otherwise, so that only the snapshot itself is written
+        to the package data directory.
+        """
+        return self._load(
+            partial(
+                self.download,
+                url=url,
+                checksum=checksum,
+                dummy=dummy,
+                force_download=force_download,
+            ),
+            url=url,
+            checksum=checksum,
+            dummy=dummy,
+            force_download=force_download,
+            symprec=symprec,
+            n_jobs=n_jobs,
+            compact=compact,
+            normalize_references=normalize_references,
+            store=store,
+            block_size=block_size,
+        )
+
+    def _load(
+        self,
+        download,
+        url=None,
+        checksum=None,
+        dummy=False,
+        force_download=False,
+        symprec=None,
+        n_jobs=None,
+        compact=False,
+        normalize_references=False,
+        store=False,
+        block_size=None,
+    ):
+        # `download()` returns the path and checksum of the snapshot on disk
+        from mp_time_split.utils import references
+        from mp_time_split.utils.blocks import read_block_snapshot, write_block_snapshot
+        from mp_time_split.utils.data import get_sidecar_path
+        from mp_time_split.utils.query import (
+            get_filter_key,
+            load_or_compute_snapshot_index,
+        )
+        from mp_time_split.utils.snapshot import read_snapshot
+        from mp_time_split.utils.split import mp_time_split
 
-        expt_df = load_dataframe_from_json(data_path)
+        filters = dict(
+            num_sites=self.num_sites,
+            elements=self.elements,
+            exclude_elements=self.exclude_elements,
+        )
+        self.filter_key = get_filter_key(**filters)
+        is_filtered = False
+
+        snapshot_store = None
+        if store:
+            from mp_time_split.utils.store import SnapshotStore
+
+            snapshot_store = SnapshotStore(path.join(self.cache_dir, "store"))
+        version = get_store_version(url, checksum, dummy=dummy)
+
+        if (
+            store
+            and not force_download
+            and version is not None
+            and version in snapshot_store
+        ):
+            checksum = snapshot_store.resolve(version)
+            data_path = snapshot_store.get_manifest_path(checksum)
+            expt_df = snapshot_store.load(checksum, n_jobs=n_jobs)
+            reference_table = None
+        else:
+            data_path, checksum = download()
+            blocks_path = None
+            if block_size is not None:
+                blocks_path = get_sidecar_path(
+                    self._get_sidecar_base(data_path),
+                    checksum,
+                    "blocks",
+                    ext=".blk",
+                    block_size=block_size,
+                )
+            if blocks_path is not None and path.isfile(blocks_path):
+                expt_df = read_block_snapshot(blocks_path, **filters)
+                reference_table = None
+                is_filtered = True
+            else:
+                with phase("decode", bytes=path.getsize(data_path)) as record:
+                    expt_df, reference_table = read_snapshot(data_path, n_jobs=n_jobs)
+                    record["items"] = len(expt_df)
+                if reference_table is not None and (store or blocks_path is not None):
+                    expt_df = references.denormalize_references(
+                        expt_df, reference_table
+                    )
+                    reference_table = None
+                if snapshot_store is not None:
+                    snapshot_store.add(expt_df, version=checksum)
+                    if version is not None and version != checksum:
+                        snapshot_store.set_ref(version, checksum)
+                if blocks_path is not None:
+                    write_block_snapshot(expt_df, blocks_path, block_size=block_size)
+        if self.filter_key is not None and not is_filtered:
+            if reference_table is not None:
+                expt_df = references.denormalize_references(expt_df, reference_table)
+                reference_table = None
+            with phase("filter", items=len(expt_df)) as record:
+                index = load_or_compute_snapshot_index(
+                    expt_df.structure,
+                    data_path=self._get_sidecar_base(data_path),
+                    checksum=checksum,
+                )
+                expt_df = expt_df[index.select(**filters)]
+                record["selected"] = len(expt_df)
+        if normalize_references and reference_table is None:
+            expt_df, reference_table = references.normalize_references(expt_df)
+        elif not normalize_references and reference_table is not None:
+            expt_df = references.denormalize_references(expt_df, reference_table)
+            reference_table = None
+        self.reference_table = reference_table
+        if compact:
+            from mp_time_split.utils.compact import compact_dataframe
+
+            expt_df = compact_dataframe(expt_df)
         self.data = expt_df
-        self.trainval_splits, self.test_split = mp_time_split(
-            self.data, n_cv_splits=len(FOLDS), mode=self.mode
+        self.data_path = data_path
+        self.checksum = checksum
+        # derived from the previous selection, see `get_neighbor_graphs()`
+        self.graphs = None
+        with phase("split", items=len(self.data), mode=self.mode):
+            self.trainval_splits, self.test_split = mp_time_split(
+                self.data, n_cv_splits=len(FOLDS), mode=self.mode
+            )
+        self.inputs = self.data.structure
+        self.outputs = getattr(self.data, self.target)
+
+        if symprec is not None:
+            self.get_symmetry(symprec=symprec, n_jobs=n_jobs)
+
+        return self.data
+
+    def _get_config_key(self):
+        def freeze(value):
+            return value if value is None or isinstance(value, str) else tuple(value)
+
+        return (
+            self.save_dir,
+            freeze(self.num_sites),
+            freeze(self.elements),
+            freeze(self.exclude_elements),
+            self.use_theoretical,
+            self.mode,
         )
+
+    def _get_state(self):
+        return {name: getattr(self, name) for name in LOAD_STATE}
+
+    def _set_state(self, state):
+        for name, value in state.items():
+            setattr(self, name, value)
+        # callers sharing one load get their own frame, e.g. for added columns
+        self.data = self.data.copy(deep=False)
+        self.graphs = None
         self.inputs = self.data.structure
         self.outputs = getattr(self.data, self.target)
 
+    async def _single_flight_state(self, key, run):
+        # await `run()` (returning a state) once for concurrent callers with the same
+        # key, or on its own if the key is not hashable
+        from mp_time_split.utils.aio import LOADS
+
+        try:
+            hash(key)
+        except TypeError:
+            state = await run()
+        else:
+            state = await LOADS.run(key, run)
+        self._set_state(state)
         return self.data
 
+    async def adownload(
+        self, url=None, checksum=None, dummy=False, force_download=False, executor=None
+    ):
+        """Like :func:`download`, without blocking the event loop.
+
+        The snapshot is streamed to disk and hashed chunk by chunk in `executor` (the
+        default executor of the event loop if None), see
+        :func:`mp_time_split.utils.aio.stream_download`. Concurrent calls for the
+        same snapshot path, `url` and `checksum` share one download, whatever the
+        filters or other arguments of the :func:`aload` calls awaiting it.
+        """
+        from mp_time_split.utils.aio import LOADS, md5_file, stream_download
+
+        data_path = get_snapshot_path(self.save_dir, dummy=dummy)
+
+        async def run():
+            source, checksum_frozen = url, None
+            if force_download or not Path(data_path).is_file():
+                source, checksum_frozen = get_download_source(
+                    url, checksum, dummy=dummy
+                )
+                actual = await stream_download(source, data_path, executor=executor)
+            else:
+                actual = await md5_file(data_path, executor=executor)
+            check_download_checksum(source, actual, checksum_frozen)
+            return data_path, actual
+
+        return await LOADS.run(("download", data_path, url, checksum), run)
+
+    async def aload(
+        self,
+        url=None,
+        checksum=None,
+        dummy=False,
+        force_download=False,
+        executor=None,
+        **load_kwargs,
+    ):
+        """Like :func:`load`, without blocking the event loop.
+
+        The snapshot is downloaded with :func:`adownload`, and decoding, filtering
+        and splitting run in `executor` (the default executor of the event loop if
+        None). Concurrent calls with the same configuration (`save_dir`, filters,
+        `mode`) and arguments await one in-flight load and then share its result,
+        with a separate shallow copy of `data` each. Calls that differ otherwise
+        still share the download of the snapshot.
+
+        Examples
+        --------
+        >>> mpts = [MPTimeSplit() for _ in range(8)]
+        >>> await asyncio.gather(*(mpt.aload() for mpt in mpts))
+        """
+        import asyncio
+
+        from mp_time_split.utils.store import SnapshotStore
+
+        download_kwargs = dict(
+            url=url, checksum=checksum, dummy=dummy, force_download=force_download
+        )
+        version = get_store_version(url, checksum, dummy=dummy)
+
+        async def run():
+            worker = copy(self)
+            in_store = (
+                load_kwargs.get("store", False)
+                and not force_download
+                and version is not None
+                and version in SnapshotStore(path.join(self.cache_dir, "store"))
+            )
+            if in_store:
+                download = partial(worker.download, **download_kwargs)
+            else:
+                downloaded = await self.adownload(executor=executor, **download_kwargs)
+
+                def download():
+                    return downloaded
+
+            await asyncio.get_running_loop().run_in_executor(
+                executor,
+                partial(worker._load, download, **download_kwargs, **load_kwargs),
+            )
+            return worker._get_state()
+
+        key = (
+            "load",
+            self._get_config_key(),
+            url,
+            checksum,
+            dummy,
+            force_download,
+            tuple(sorted(load_kwargs.items())),
+        )
+        return await self._single_flight_state(key, run)
+
+    async def afetch_data(self, one_by_one=False, executor=None, **fetch_kwargs):
+        """Like :func:`fetch_data`, without blocking the event loop.
+
+        The API queries and parsing run in `executor` (the default executor of the
+        event loop if None). Concurrent calls with the same configuration and
+        hashable arguments await one in-flight fetch, as for :func:`aload`.
+        """
+        import asyncio
+
+        async def run():
+            worker = copy(self)
+            await asyncio.get_running_loop().run_in_executor(
+                executor,
+                partial(worker.fetch_data, one_by_one=one_by_one, **fetch_kwargs),
+            )
+            return worker._get_state()
+
+        key = (
+            "fetch",
+            self._get_config_key(),
+            one_by_one,
+            tuple(sorted(fetch_kwargs.items())),
+        )
+        return await self._single_flight_state(key, run)
+
     def get_train_and_val_data(self, fold):
         if self.data is None:
             raise NameError("`fetch_data()` must be run first.")
@@ -224,6 +668,141 @@ class MPTimeSplit:
 
         return train_inputs, test_inputs, train_outputs, test_outputs
 
+    def to_shared_memory(self, columns=None):
+        """Place structures, numeric columns and splits in shared memory.
+
+        Returns a picklable :class:`mp_time_split.utils.shared.SharedSnapshot` handle
+        to pass to worker processes instead of this instance. Use it as a context
+        manager (or call its ``unlink()``) in the main process to free the memory.
+        """
+        if self.data is None:
+            raise NameError("`fetch_data()` or `load()` must be run first.")
+        from mp_time_split.utils.shared import SharedSnapshot
+
+        return SharedSnapshot.from_mpt(self, columns=columns)
+
+    def _get_sidecar_base(self, data_path):
+        # derived files are named after the snapshot, but kept in `self.cache_dir`
+        if data_path is None:
+            return None
+        return path.join(self.cache_dir, path.basename(data_path))
+
+    def _get_sidecar_checksum(self):
+        # derived data of a filtered snapshot is stored separately from the full one
+        if self.checksum is None or self.filter_key is None:
+            return self.checksum
+        return f"{self.checksum}-{self.filter_key}"
+
+    def get_neighbor_graphs(self, cutoff=8.0, max_num_nbr=12, n_jobs=None):
+        """Precompute neighbor lists of every structure in `self.data`.
+
+        Neighbor lists are computed across `n_jobs` processes, stored as a CSR-style
+        ``.npz`` file in `cache_dir` for a loaded snapshot (keyed by checksum,
+        `cutoff` and `max_num_nbr`) and kept as `self.graphs` for
+        :func:`get_train_and_val_graphs` and :func:`get_test_graphs`. See
+        :class:`mp_time_split.utils.graph.NeighborGraphs`.
+        """
+        if self.data is None:
+            raise NameError("`fetch_data()` or `load()` must be run first.")
+        from mp_time_split.utils.graph import load_or_compute_neighbor_graphs
+
+        self.graphs = load_or_compute_neighbor_graphs(
+            self.data.structure,
+            data_path=self._get_sidecar_base(self.data_path),
+            checksum=self._get_sidecar_checksum(),
+            cutoff=cutoff,
+            max_num_nbr=max_num_nbr,
+            n_jobs=n_jobs,
+        )
+        return self.graphs
+
+    def get_train_and_val_graphs(self, fold):
+        if self.graphs is None:
+            raise NameError("`get_neighbor_graphs()` must be run first.")
+        if fold not in FOLDS:
+            raise ValueError(f"fold={fold} should be one of {FOLDS}")
+
+        train_graphs, val_graphs = [
+            self.graphs.take(tvs) for tvs in self.trainval_splits[fold]
+        ]
+        return train_graphs, val_graphs
+
+    def get_test_graphs(self):
+        if self.graphs is None:
+            raise NameError("`get_neighbor_graphs()` must be run first.")
+
+        train_graphs, test_graphs = [self.graphs.take(ts) for ts in self.test_split]
+        return train_graphs, test_graphs
+
+    def get_symmetry(self, symprec=0.1, n_jobs=None):
+        """Attach spacegroup and symmetrized structure columns to `self.data`.
+
+        Symmetry analysis runs across `n_jobs` processes only once per snapshot: the
+        result is stored in `cache_dir` for a loaded snapshot (keyed by checksum and
+        `symprec`) and reused on later calls. See
+        :func:`mp_time_split.utils.symmetry.load_or_compute_symmetry`.
+        """
+        if self.data is None:
+            raise NameError("`fetch_data()` or `load()` must be run first.")
+        from mp_time_split.utils.symmetry import load_or_compute_symmetry
+
+        symmetry = load_or_compute_symmetry(
+            self.data.structure,
+            data_path=self._get_sidecar_base(self.data_path),
+            checksum=self._get_sidecar_checksum(),
+            symprec=symprec,
+            n_jobs=n_jobs,
+        )
+        for column in symmetry.columns:
+            self.data[column] = symmetry[column]
+        return symmetry
+
+    def get_fingerprints(self, symprec=0.1, n_jobs=None):
+        """Attach a canonical structure fingerprint to each entry of `self.data`.
+
+        Fingerprints of a loaded snapshot are stored in `cache_dir` (keyed by checksum
+        and `symprec`) and reused on later calls. See
+        :func:`mp_time_split.utils.fingerprint.get_fingerprint`.
+        """
+        if self.data is None:
+            raise NameError("`fetch_data()` or `load()` must be run first.")
+        from mp_time_split.utils.fingerprint import load_or_compute_fingerprints
+
+        self.data["fingerprint"] = load_or_compute_fingerprints(
+            self.data.structure,
+            data_path=self._get_sidecar_base(self.data_path),
+            checksum=self._get_sidecar_checksum(),
+            symprec=symprec,
+            n_jobs=n_jobs,
+        )
+        return self.data.fingerprint
+
+    def get_leakage_report(self, fold, symprec=0.1, n_jobs=None):
+        """Group entries with the same fingerprint across the partitions of `fold`.
+
+        `fold` is one of `self.folds` (train vs. val) or ``"test"`` (train vs. test).
+        See :func:`mp_time_split.utils.fingerprint.get_leakage_report`.
+        """
+        if self.data is None:
+            raise NameError("`fetch_data()` or `load()` must be run first.")
+        from mp_time_split.utils.fingerprint import get_leakage_report
+
+        if fold == TEST_FOLD:
+            split = self.test_split
+            held_out_name = TEST_FOLD
+        elif fold in FOLDS:
+            split = self.trainval_splits[fold]
+            held_out_name = "val"
+        else:
+            raise ValueError(f"fold={fold} should be one of {FOLDS + [TEST_FOLD]}")
+
+        if "fingerprint" not in self.data:
+            self.get_fingerprints(symprec=symprec, n_jobs=n_jobs)
+
+        return get_leakage_report(
+            self.data.fingerprint, self.data.material_id, split, held_out_name
+        )
+
 
 # ---- CLI ----
 # The functions defined in this section are wrappers around the main Python
@@ -231,16 +810,13 @@ class MPTimeSplit:
 # executable/script.
 
 
-def parse_args(args):
-    """Parse command line parameters
-    Args:
-      args (List[str]): command line parameters as list of strings
-          (for example  ``["--help"]``).
+def get_parser():
+    """Build the command line parser used by :func:`parse_args`
     Returns:
-      :obj:`argparse.Namespace`: command line parameters namespace
+      :obj:`argparse.ArgumentParser`: parser of the command line parameters
     """
     parser = argparse.ArgumentParser(
-        description="For downloading mp-time-split snapshot."
+        description="For downloading mp-time-split snapshot and exporting its splits."
     )
     parser.add_argument(
         "--version",
@@ -272,7 +848,80 @@ def parse_args(args):
         action="store_const",
         const=logging.DEBUG,
     )
-    return parser.parse_args(args)
+
+    subparsers = parser.add_subparsers(
+        dest="command", help="Defaults to `prefetch` if omitted."
+    )
+    prefetch = subparsers.add_parser(
+        "prefetch", help="Download the snapshot unless already present."
+    )
+    verify = subparsers.add_parser(
+        "verify", help="Verify the md5 checksum of a downloaded snapshot."
+    )
+    export = subparsers.add_parser(
+        "export",
+        help="Export train/val/test indices and material_ids of every fold.",
+    )
+    for subparser in [prefetch, verify, export]:
+        subparser.add_argument(
+            "--dummy",
+            action="store_true",
+            help="Use the small dummy snapshot instead of the full one.",
+        )
+    for subparser in [prefetch, verify]:
+        subparser.add_argument(
+            "--checksum",
+            default=None,
+            help="Expected md5 checksum, by default that of the figshare snapshot.",
+            type=str,
+            metavar="STRING",
+        )
+    prefetch.add_argument(
+        "--url",
+        default=None,
+        help="URL to download from instead of figshare (requires --checksum).",
+        type=str,
+        metavar="STRING",
+    )
+    prefetch.add_argument(
+        "--force", action="store_true", help="Download even if already present."
+    )
+    export.add_argument(
+        "--mode",
+        dest="modes",
+        nargs="+",
+        default=AVAILABLE_MODES,
+        choices=AVAILABLE_MODES,
+        help="Split modes to export, by default all of them.",
+    )
+    export.add_argument(
+        "--format",
+        dest="fmt",
+        default="npy",
+        choices=["npy", "txt"],
+        help="File format of the exported indices, by default npy.",
+    )
+    export.add_argument(
+        "-o",
+        "--out-dir",
+        dest="out_dir",
+        default=None,
+        help="Directory to export to, by default `{save_dir}/splits`.",
+        type=str,
+        metavar="STRING",
+    )
+    return parser
+
+
+def parse_args(args):
+    """Parse command line parameters
+    Args:
+      args (List[str]): command line parameters as list of strings
+          (for example  ``["--help"]``).
+    Returns:
+      :obj:`argparse.Namespace`: command line parameters namespace
+    """
+    return get_parser().parse_args(args)
 
 
 def setup_logging(loglevel):
@@ -294,12 +943,52 @@ def main(args):
       args (List[str]): command line parameters as list of strings
           (for example  ``["--verbose", "./data"]``).
     """
-    args = parse_args(args)
+    parser = get_parser()
+    args = parser.parse_args(args)
     setup_logging(args.loglevel)
+    command = args.command or "prefetch"
+    dummy = getattr(args, "dummy", False)
+
+    if command == "prefetch":
+        url = getattr(args, "url", None)
+        checksum = getattr(args, "checksum", None)
+        if url is not None and checksum is None:
+            parser.error("--url requires --checksum")
+        data_path = get_snapshot_path(args.save_dir, dummy=dummy)
+        needs_download = getattr(args, "force", False) or not path.isfile(data_path)
+        if checksum is not None and url is None and needs_download:
+            parser.error(
+                f"--checksum without --url only verifies an existing snapshot, but "
+                f"{data_path} would have to be downloaded (pass --url as well)"
+            )
+
+    if command == "verify":
+        data_path = get_snapshot_path(args.save_dir, dummy=dummy)
+        checksum = verify_snapshot(data_path, checksum=args.checksum, dummy=dummy)
+        _logger.info(f"The snapshot at {data_path} has the expected checksum")
+        print(checksum)
+        return
+
     _logger.debug("Beginning download of mp-time-split snapshot")
     mpt = MPTimeSplit(save_dir=args.save_dir)
-    mpt.load()
-    _logger.info(f"The snapshot is saved at {args.save_dir}")
+    if command == "prefetch":
+        data_path, checksum = mpt.download(
+            url=getattr(args, "url", None),
+            checksum=getattr(args, "checksum", None),
+            dummy=dummy,
+            force_download=getattr(args, "force", False),
+        )
+        if getattr(args, "checksum", None) is not None:
+            verify_snapshot(data_path, checksum=args.checksum)
+        _logger.info(f"The snapshot is saved at {args.save_dir}")
+        print(checksum)
+    elif command == "export":
+        from mp_time_split.utils.export import export_splits
+
+        out_dir = args.out_dir or path.join(args.save_dir, "splits")
+        mpt.load(dummy=dummy)
+        export_splits(mpt, out_dir, modes=args.modes, fmt=args.fmt)
+        _logger.info(f"The splits are exported to {out_dir}")
 
 
 def run():
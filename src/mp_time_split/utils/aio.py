@@ -0,0 +1,120 @@
+import asyncio
+from concurrent.futures import Executor
+from hashlib import md5
+from pathlib import Path
+from typing import Awaitable, Callable, Dict, Hashable, Optional, TypeVar
+from urllib.request import urlopen
+
+from mp_time_split.utils.data import atomic_write
+from mp_time_split.utils.instrument import phase
+
+T = TypeVar("T")
+
+CHUNK_SIZE = 1 << 20
+
+
+def _copy_chunk(source, f, hasher, chunk_size: int) -> int:
+    chunk = source.read(chunk_size)
+    f.write(chunk)
+    hasher.update(chunk)
+    return len(chunk)
+
+
+async def stream_download(
+    url: str,
+    fpath: str,
+    chunk_size: int = CHUNK_SIZE,
+    executor: Optional[Executor] = None,
+) -> str:
+    """Download ``url`` to ``fpath`` chunk by chunk without blocking the event loop.
+
+    Each chunk is read, written and added to the md5 hash in `executor`, so the file
+    is not read again to verify it. The file only appears at ``fpath`` once
+    complete, see :func:`mp_time_split.utils.data.atomic_write`.
+
+    Parameters
+    ----------
+    url : str
+        URL supported by :func:`urllib.request.urlopen`, including ``file://``.
+    fpath : str
+        Destination path.
+    chunk_size : int
+        Bytes per read, by default 1 MiB.
+    executor : Optional[Executor]
+        Executor for blocking reads and writes. If None, the default executor of the
+        event loop. By default None.
+
+    Returns
+    -------
+    str
+        md5 checksum of the downloaded file.
+    """
+    loop = asyncio.get_running_loop()
+    hasher = md5()
+    with phase("download", url=url) as record:
+        response = await loop.run_in_executor(executor, urlopen, url)
+        try:
+            with atomic_write(fpath) as f:
+                num_bytes = 0
+                while True:
+                    n = await loop.run_in_executor(
+                        executor, _copy_chunk, response, f, hasher, chunk_size
+                    )
+                    if n == 0:
+                        break
+                    num_bytes += n
+        finally:
+            response.close()
+        record["bytes"] = num_bytes
+    return hasher.hexdigest()
+
+
+def _update_from_file(f, hasher, chunk_size: int) -> int:
+    chunk = f.read(chunk_size)
+    hasher.update(chunk)
+    return len(chunk)
+
+
+async def md5_file(
+    fpath: str, chunk_size: int = CHUNK_SIZE, executor: Optional[Executor] = None
+) -> str:
+    """md5 checksum of a file, read in chunks in `executor`."""
+    loop = asyncio.get_running_loop()
+    hasher = md5()
+    with phase("verify", bytes=Path(fpath).stat().st_size):
+        with open(fpath, "rb") as f:
+            while await loop.run_in_executor(
+                executor, _update_from_file, f, hasher, chunk_size
+            ):
+                pass
+    return hasher.hexdigest()
+
+
+class SingleFlight:
+    def __init__(self) -> None:
+        """Share one in-flight call among concurrent callers with the same key.
+
+        The first caller for a key starts the call, and callers arriving while it is
+        running await the same result (or exception) instead of starting their own.
+        Once it finishes, the next caller starts a new call.
+        """
+        self._tasks: Dict[Hashable, asyncio.Task] = {}
+
+    def __len__(self) -> int:
+        return len(self._tasks)
+
+    async def run(self, key: Hashable, func: Callable[[], Awaitable[T]]) -> T:
+        # tasks are bound to the event loop that created them
+        key = (id(asyncio.get_running_loop()), key)
+        task = self._tasks.get(key)
+        if task is None:
+            task = asyncio.ensure_future(func())
+            self._tasks[key] = task
+            task.add_done_callback(lambda _: self._tasks.pop(key, None))
+        # a cancelled caller must not cancel the call for the others
+        return await asyncio.shield(task)
+
+
+# in-flight `MPTimeSplit.adownload()`, `aload()` and `afetch_data()` calls of this
+# process
+LOADS = SingleFlight()
@@ -1,6 +1,26 @@
-from typing import List, Optional, Tuple, Union
+import gzip
+import json
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from hashlib import sha1
+from os import path
+from pathlib import Path
+from time import sleep
+from typing import (
+    Any,
+    Callable,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Sequence,
+    Tuple,
+    Union,
+)
 
+import numpy as np
 import pandas as pd
+from monty.io import zopen
+from monty.json import MontyDecoder, MontyEncoder
 
 try:
     from mp_api.client import MPRester
@@ -10,14 +30,709 @@ except Exception as e:
     from mp_api import MPRester
 
 
-from mp_api.client.core.client import DEFAULT_API_KEY
+try:
+    from mp_api.client.core.client import DEFAULT_API_KEY
+except ImportError:
+    # removed in newer versions of `mp-api`, which read `MP_API_KEY` when None
+    DEFAULT_API_KEY = None
+try:
+    from mp_api.client.core.client import MPRestError
+except ImportError:
+    from mp_api.core.client import MPRestError
+from requests import RequestException
 from tqdm import tqdm
 from typing_extensions import Literal
 
-from mp_time_split.utils.data import get_discovery_dict, noble, radioactive
+from mp_time_split.utils.constants import AVAILABLE_EXCLUDE_STRS  # noqa: F401
+from mp_time_split.utils.data import (
+    ReferenceCache,
+    atomic_write,
+    get_discovery_dict,
+    get_excluded_elements,
+)
+from mp_time_split.utils.instrument import phase
+
+# ensure match between following and `Literal` type hint for `partition_by`
+AVAILABLE_PARTITIONS = ["num_sites", "num_elements"]
+# upper bound for the last `num_elements` partition, i.e. the number of elements
+MAX_NUM_ELEMENTS = 118
+# ensure match between following and `Literal` type hint for `provenance_mode`
+AVAILABLE_PROVENANCE_MODES = ["auto", "bulk", "targeted"]
+PROVENANCE_FIELDS = ["references", "material_id"]
+RECORDED_ROUTES = ["summary", "provenance"]
+# transport and HTTP errors retried by `call_with_retry`, programming errors are not
+RETRY_ERRORS = (RequestException, MPRestError, ConnectionError, TimeoutError)
+
+
+class Document(dict):
+    """Replayed API document supporting attribute access like ``mp_api`` documents."""
+
+    def __getattr__(self, name):
+        try:
+            return self[name]
+        except KeyError as e:
+            raise AttributeError(name) from e
+
+
+class _RecordEncoder(MontyEncoder):
+    def default(self, o):
+        try:
+            return super().default(o)
+        except TypeError:
+            return str(o)
+
+
+def _to_dict(doc) -> Any:
+    """Convert an ``mp_api`` document (or list of documents) to plain dicts."""
+    if isinstance(doc, list):
+        return [_to_dict(d) for d in doc]
+    if isinstance(doc, dict):
+        return dict(doc)
+    if hasattr(doc, "model_dump"):
+        return doc.model_dump()
+    if hasattr(doc, "dict"):
+        return doc.dict()
+    if hasattr(doc, "__dict__"):
+        return dict(vars(doc))
+    return doc
+
+
+def _to_document(obj) -> Any:
+    if isinstance(obj, list):
+        return [_to_document(o) for o in obj]
+    if isinstance(obj, dict):
+        return Document(obj)
+    return obj
+
+
+def get_record_path(record_dir: str, route: str, method: str, args, kwargs) -> str:
+    """Get the file a client call is recorded to, keyed by a hash of its arguments."""
+    call = json.dumps(
+        {"args": args, "kwargs": kwargs}, sort_keys=True, cls=_RecordEncoder
+    )
+    key = sha1(call.encode()).hexdigest()
+    return path.join(record_dir, f"{route}.{method}.{key}.json.gz")
+
+
+class _RecordingRoute:
+    def __init__(self, route, name: str, record_dir: str) -> None:
+        self.route = route
+        self.name = name
+        self.record_dir = record_dir
+
+    def __getattr__(self, method):
+        func = getattr(self.route, method)
+
+        def record(*args, **kwargs):
+            result = func(*args, **kwargs)
+            fpath = get_record_path(self.record_dir, self.name, method, args, kwargs)
+            with zopen(fpath, "wt") as f:
+                json.dump(_to_dict(result), f, cls=_RecordEncoder)
+            return result
+
+        return record
+
+
+class RecordingClient:
+    def __init__(self, client, record_dir: str) -> None:
+        """Client wrapper that saves ``summary`` and ``provenance`` responses to disk.
+
+        Use as the ``client`` of :func:`fetch_data` and serve the recording back
+        offline via :class:`ReplayClient`.
+
+        Parameters
+        ----------
+        client : MPRester
+            Client to record, e.g. ``MPRester(api_key)``.
+        record_dir : str
+            Directory to save the responses in, one file per call.
+
+        Examples
+        --------
+        >>> client = RecordingClient(MPRester(api_key), "recordings")
+        >>> expt_df = fetch_data(num_sites=(1, 2), elements=["V"], client=client)
+        """
+        self.client = client
+        self.record_dir = record_dir
+        Path(record_dir).mkdir(exist_ok=True, parents=True)
+
+    def __enter__(self):
+        mpr = self.client.__enter__()
+        for name in RECORDED_ROUTES:
+            setattr(
+                self, name, _RecordingRoute(getattr(mpr, name), name, self.record_dir)
+            )
+        return self
+
+    def __exit__(self, *exc_info):
+        return self.client.__exit__(*exc_info)
+
+
+class _ReplayRoute:
+    def __init__(self, name: str, record_dir: str, latency: float) -> None:
+        self.name = name
+        self.record_dir = record_dir
+        self.latency = latency
+
+    def __getattr__(self, method):
+        def replay(*args, **kwargs):
+            fpath = get_record_path(self.record_dir, self.name, method, args, kwargs)
+            if not path.isfile(fpath):
+                raise KeyError(
+                    f"No recorded response for {self.name}.{method}(*{args}, **{kwargs}) in {self.record_dir}"  # noqa: E501
+                )
+            sleep(self.latency)
+            with zopen(fpath, "rt") as f:
+                return _to_document(json.load(f, cls=MontyDecoder))
+
+        return replay
+
+
+class ReplayClient:
+    def __init__(self, record_dir: str, latency: float = 0.0) -> None:
+        """Offline stand-in for ``MPRester`` serving responses saved by
+        :class:`RecordingClient`.
+
+        Parameters
+        ----------
+        record_dir : str
+            Directory containing the recorded responses.
+        latency : float
+            Seconds to wait before serving each response, e.g. to benchmark
+            concurrent fetching. By default 0.0.
+
+        Examples
+        --------
+        >>> client = ReplayClient("recordings", latency=0.2)
+        >>> expt_df = fetch_data(num_sites=(1, 2), elements=["V"], client=client)
+        """
+        self.record_dir = record_dir
+        self.latency = latency
+        for name in RECORDED_ROUTES:
+            setattr(self, name, _ReplayRoute(name, record_dir, latency))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+def call_with_retry(
+    func: Callable,
+    *args,
+    max_retries: int = 3,
+    backoff: float = 1.0,
+    retry_on: Tuple[type, ...] = RETRY_ERRORS,
+    **kwargs,
+):
+    """Call ``func(*args, **kwargs)``, retrying with exponential backoff on failure.
+
+    Parameters
+    ----------
+    func : Callable
+        Function to call, e.g. :func:`mpr.provenance.get_data_by_id`.
+    max_retries : int
+        Maximum number of retries after the first attempt, by default 3.
+    backoff : float
+        Seconds to wait before the first retry, doubled after each retry, by default
+        1.0.
+    retry_on : Tuple[type, ...]
+        Exception types that are retried, by default :data:`RETRY_ERRORS`. Other
+        exceptions are raised right away.
+
+    Returns
+    -------
+    Any
+        Return value of ``func``. The last exception is raised if all attempts fail.
+    """
+    name = getattr(func, "__qualname__", repr(func))
+    with phase("request", func=name) as record:
+        for attempt in range(max_retries + 1):
+            record["attempts"] = attempt + 1
+            try:
+                return func(*args, **kwargs)
+            except retry_on:
+                if attempt == max_retries:
+                    raise
+                sleep(backoff * 2**attempt)
+
+
+def get_search_partitions(
+    partition_by: Optional[Literal["num_sites", "num_elements"]] = None,
+    num_partitions: int = 8,
+    num_sites: Optional[Tuple[int, int]] = None,
+) -> List[dict]:
+    """Split the summary search query space into disjoint sub-queries.
+
+    Parameters
+    ----------
+    partition_by : Optional[Literal["num_sites", "num_elements"]]
+        Search field to partition on. If None, a single sub-query covering the whole
+        query space is returned. By default None.
+    num_partitions : int
+        Maximum number of sub-queries, by default 8.
+    num_sites : Optional[Tuple[int, int]]
+        Range of number of sites of the full query. Required if ``partition_by ==
+        "num_sites"``. By default None.
+
+    Returns
+    -------
+    List[dict]
+        Search kwargs of each sub-query, e.g. ``[{"num_sites": (1, 13)},
+        {"num_sites": (14, 26)}, ...]``.
+
+    Examples
+    --------
+    >>> get_search_partitions("num_sites", num_partitions=2, num_sites=(1, 52))
+    [{'num_sites': (1, 26)}, {'num_sites': (27, 52)}]
+    >>> get_search_partitions("num_elements", num_partitions=3)
+    [{'num_elements': (1, 1)}, {'num_elements': (2, 2)}, {'num_elements': (3, 118)}]
+    """
+    if partition_by is None:
+        return [{}]
+    if partition_by not in AVAILABLE_PARTITIONS:
+        raise NotImplementedError(
+            f"partition_by={partition_by} not implemented. Use one of {AVAILABLE_PARTITIONS}"  # noqa: E501
+        )
+    if partition_by == "num_sites":
+        if num_sites is None:
+            raise ValueError(
+                "`num_sites` must be specified to partition the search by `num_sites`"
+            )
+        lo, hi = num_sites
+        edges = np.unique(np.linspace(lo, hi + 1, num_partitions + 1).astype(int))
+        return [
+            {"num_sites": (int(start), int(stop) - 1)}
+            for start, stop in zip(edges[:-1], edges[1:])
+        ]
+    partitions = [{"num_elements": (n, n)} for n in range(1, num_partitions)]
+    partitions.append({"num_elements": (num_partitions, MAX_NUM_ELEMENTS)})
+    return partitions
+
+
+def _search_partitions(
+    mpr: MPRester,
+    partition_by: Optional[Literal["num_sites", "num_elements"]],
+    num_partitions: int,
+    max_workers: int,
+    max_retries: int,
+    backoff: float,
+    search_kwargs: dict,
+) -> Iterator[Tuple[int, list]]:
+    # (position, documents) of each sub-query, as soon as it completes
+    if partition_by == "num_elements" and "num_elements" in search_kwargs:
+        raise ValueError(
+            "`num_elements` cannot be both a search criterion and the partition field"
+        )
+    partitions = get_search_partitions(
+        partition_by, num_partitions, num_sites=search_kwargs.get("num_sites")
+    )
+
+    def search(partition):
+        return call_with_retry(
+            mpr.summary.search,
+            **{**search_kwargs, **partition},
+            max_retries=max_retries,
+            backoff=backoff,
+        )
+
+    if len(partitions) == 1:
+        yield 0, search(partitions[0])
+        return
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {
+            executor.submit(search, partition): i
+            for i, partition in enumerate(partitions)
+        }
+        for future in as_completed(futures):
+            # drop the reference to the result once it has been consumed
+            yield futures.pop(future), future.result()
+
+
+def _unique_by_material_id(results: Iterable) -> Iterator:
+    seen = set()
+    for r in results:
+        mid = str(r.material_id)
+        if mid not in seen:
+            seen.add(mid)
+            yield r
+
+
+def search_summary(
+    mpr: MPRester,
+    partition_by: Optional[Literal["num_sites", "num_elements"]] = None,
+    num_partitions: int = 8,
+    max_workers: int = 4,
+    max_retries: int = 3,
+    backoff: float = 1.0,
+    **search_kwargs,
+) -> list:
+    """Run a summary search as concurrent, disjoint sub-queries and merge the results.
+
+    The merged documents are deduplicated by ``material_id`` and returned in
+    sub-query order, so the DataFrame built from them (sorted by MPID) is the same as
+    for a single ``mpr.summary.search(**search_kwargs)`` call.
+
+    Parameters
+    ----------
+    mpr : MPRester
+        Open client.
+    partition_by : Optional[Literal["num_sites", "num_elements"]]
+        See :func:`get_search_partitions`, by default None.
+    num_partitions : int
+        See :func:`get_search_partitions`, by default 8.
+    max_workers : int
+        Maximum number of sub-queries in flight at once, by default 4.
+    max_retries : int
+        See :func:`call_with_retry`, by default 3.
+    backoff : float
+        See :func:`call_with_retry`, by default 1.0.
+    search_kwargs : dict, optional
+        kwargs passed to :func:`mpr.summary.search`.
+
+    Returns
+    -------
+    list
+        Summary documents.
+    """
+    partition_results: dict = {}
+    for i, results in _search_partitions(
+        mpr,
+        partition_by,
+        num_partitions,
+        max_workers,
+        max_retries,
+        backoff,
+        search_kwargs,
+    ):
+        partition_results[i] = results
+    return list(
+        _unique_by_material_id(
+            r for i in sorted(partition_results) for r in partition_results[i]
+        )
+    )
+
+
+def iter_search_summary(
+    mpr: MPRester,
+    partition_by: Optional[Literal["num_sites", "num_elements"]] = None,
+    num_partitions: int = 8,
+    max_workers: int = 4,
+    max_retries: int = 3,
+    backoff: float = 1.0,
+    **search_kwargs,
+) -> Iterator:
+    """Like :func:`search_summary`, yielding documents as each sub-query completes.
+
+    Only the documents of sub-queries that have completed but not been consumed yet
+    are held at once, e.g. while :func:`get_field_columns` streams them into column
+    buffers. Documents come in the order in which the sub-queries complete, so sort
+    them (e.g. by MPID as in :func:`fetch_data`) for a deterministic order.
+    """
+    partitions = _search_partitions(
+        mpr,
+        partition_by,
+        num_partitions,
+        max_workers,
+        max_retries,
+        backoff,
+        search_kwargs,
+    )
+    yield from _unique_by_material_id(r for _, results in partitions for r in results)
+
+
+def search_by_ids(
+    route,
+    material_ids: list,
+    fields: Optional[List[str]] = None,
+    batch_size: int = 1000,
+    max_workers: int = 4,
+    max_retries: int = 3,
+    backoff: float = 1.0,
+) -> list:
+    """Search an API route for a list of IDs via concurrent, batched ID-list queries.
+
+    Parameters
+    ----------
+    route : optional
+        API route, e.g. ``mpr.summary`` or ``mpr.provenance``.
+    material_ids : list
+        Materials Project IDs to search for.
+    fields : Optional[List[str]]
+        Fields to project, by default None.
+    batch_size : int
+        Number of IDs per query, by default 1000.
+    max_workers : int
+        Maximum number of concurrent queries, by default 4.
+    max_retries : int
+        See :func:`call_with_retry`, by default 3.
+    backoff : float
+        See :func:`call_with_retry`, by default 1.0.
+
+    Returns
+    -------
+    list
+        Documents in no particular order.
+    """
+    batches = [
+        [str(mid) for mid in material_ids[i : i + batch_size]]
+        for i in range(0, len(material_ids), batch_size)
+    ]
+
+    def search(batch):
+        return call_with_retry(
+            route.search,
+            material_ids=batch,
+            fields=fields,
+            max_retries=max_retries,
+            backoff=backoff,
+        )
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        return [
+            r for batch_results in executor.map(search, batches) for r in batch_results
+        ]
 
-# ensure match between following and `Literal` type hint for `exclude_elements`
-AVAILABLE_EXCLUDE_STRS = ["noble", "radioactive", "noble+radioactive"]
+
+def search_provenance(
+    mpr: MPRester,
+    material_ids: list,
+    mode: Literal["auto", "bulk", "targeted"] = "auto",
+    max_targeted_ratio: float = 0.1,
+    batch_size: int = 1000,
+    max_workers: int = 4,
+    max_retries: int = 3,
+    backoff: float = 1.0,
+) -> pd.Series:
+    """Retrieve provenance documents for `material_ids`.
+
+    Either all provenance documents are downloaded and then filtered down to
+    `material_ids` ("bulk"), or only the needed documents are requested via batches of
+    ID-list queries run concurrently ("targeted").
+
+    Parameters
+    ----------
+    mpr : MPRester
+        Open client.
+    material_ids : list
+        Materials Project IDs to retrieve provenance documents for.
+    mode : Literal["auto", "bulk", "targeted"]
+        Retrieval strategy. If "auto", "targeted" is used when ``len(material_ids)``
+        is less than `max_targeted_ratio` times the total number of provenance
+        documents, and "bulk" otherwise. By default "auto".
+    max_targeted_ratio : float
+        See `mode`, by default 0.1.
+    batch_size : int
+        Number of IDs per query for "targeted", by default 1000.
+    max_workers : int
+        Maximum number of concurrent queries for "targeted", by default 4.
+    max_retries : int
+        See :func:`call_with_retry`, by default 3.
+    backoff : float
+        See :func:`call_with_retry`, by default 1.0.
+
+    Returns
+    -------
+    pd.Series
+        Provenance documents indexed by and in the same order as `material_ids`.
+    """
+    if mode not in AVAILABLE_PROVENANCE_MODES:
+        raise NotImplementedError(
+            f"mode={mode} not implemented. Use one of {AVAILABLE_PROVENANCE_MODES}"
+        )
+    if mode == "auto":
+        num_total = mpr.provenance.count()
+        targeted = len(material_ids) < max_targeted_ratio * num_total
+        mode = "targeted" if targeted else "bulk"
+
+    if mode == "bulk":
+        # https://github.com/materialsproject/api/issues/613
+        provenance_results = mpr.provenance.search(fields=PROVENANCE_FIELDS)
+    else:
+        provenance_results = search_by_ids(
+            mpr.provenance,
+            material_ids,
+            fields=PROVENANCE_FIELDS,
+            batch_size=batch_size,
+            max_workers=max_workers,
+            max_retries=max_retries,
+            backoff=backoff,
+        )
+
+    provenance_ids = [fpr.material_id for fpr in provenance_results]
+    prov_df = pd.Series(
+        name="provenance", data=provenance_results, index=provenance_ids
+    )
+    return prov_df.loc[material_ids]
+
+
+class DocumentCache:
+    def __init__(self, cache_dir: str) -> None:
+        """Local cache of raw API documents keyed by ``material_id``.
+
+        Each cached document is stored together with the ``last_updated`` timestamp
+        of its summary document, so that only new or changed entries need to be
+        requested again (see :func:`fetch_data`).
+
+        Parameters
+        ----------
+        cache_dir : str
+            Directory holding one ``{name}.json.gz`` file per kind of document.
+        """
+        self.cache_dir = cache_dir
+        Path(cache_dir).mkdir(exist_ok=True, parents=True)
+
+    def get_path(self, name: str) -> str:
+        return path.join(self.cache_dir, f"{name}.json.gz")
+
+    def load(self, name: str) -> dict:
+        fpath = self.get_path(name)
+        if not path.isfile(fpath):
+            return {}
+        with zopen(fpath, "rt") as f:
+            return json.load(f, cls=MontyDecoder)
+
+    def save(self, name: str, entries: dict) -> None:
+        with atomic_write(self.get_path(name)) as f, gzip.open(f, "wt") as gz:
+            json.dump(entries, gz, cls=_RecordEncoder)
+
+    def update(
+        self,
+        name: str,
+        material_ids: List[str],
+        last_updated: List[str],
+        fetch: Callable[[List[str]], list],
+    ) -> List[Document]:
+        """Get documents for `material_ids`, fetching only new or changed ones.
+
+        Parameters
+        ----------
+        name : str
+            Kind of document, e.g. ``"provenance"``.
+        material_ids : List[str]
+            Materials Project IDs.
+        last_updated : List[str]
+            ``last_updated`` timestamp of each entry.
+        fetch : Callable[[List[str]], list]
+            Function returning the documents of the given IDs, in the same order.
+
+        Returns
+        -------
+        List[Document]
+            Documents in the same order as `material_ids`.
+        """
+        entries = self.load(name)
+        stale = [
+            (mid, lu)
+            for mid, lu in zip(material_ids, last_updated)
+            if mid not in entries or entries[mid]["last_updated"] != lu
+        ]
+        if stale:
+            stale_ids = [mid for mid, _ in stale]
+            for (mid, lu), doc in zip(stale, fetch(stale_ids)):
+                entries[mid] = {"last_updated": lu, "doc": _to_dict(doc)}
+            self.save(name, entries)
+        return [Document(entries[mid]["doc"]) for mid in material_ids]
+
+
+def get_cache_name(kind: str, fields: Optional[List[str]] = None, **query) -> str:
+    """Name of a :class:`DocumentCache` file for a query.
+
+    The name depends on the projected fields and the search criteria, so that calls
+    with different criteria never share cached documents.
+
+    Examples
+    --------
+    >>> get_cache_name("summary", ["material_id"], num_sites=(1, 2))
+    'summary_879c1c52ed1b'
+    """
+    key = json.dumps(
+        {"fields": None if fields is None else sorted(fields), **query},
+        sort_keys=True,
+        default=str,
+    )
+    return f"{kind}_" + sha1(key.encode()).hexdigest()[:12]
+
+
+def get_provenance_one_by_one(
+    mpr: MPRester,
+    material_ids: list,
+    max_workers: int = 4,
+    max_retries: int = 3,
+    backoff: float = 1.0,
+) -> list:
+    """Retrieve provenance documents one material at a time, concurrently.
+
+    Parameters
+    ----------
+    mpr : MPRester
+        Open client.
+    material_ids : list
+        Materials Project IDs to retrieve provenance documents for.
+    max_workers : int
+        Maximum number of requests in flight at once, by default 4.
+    max_retries : int
+        See :func:`call_with_retry`, by default 3.
+    backoff : float
+        See :func:`call_with_retry`, by default 1.0.
+
+    Returns
+    -------
+    list
+        Provenance documents in the same order as `material_ids`.
+    """
+
+    def get_data_by_id(mid):
+        return call_with_retry(
+            mpr.provenance.get_data_by_id,
+            mid,
+            max_retries=max_retries,
+            backoff=backoff,
+        )
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        # `map` yields results in input order regardless of completion order
+        return list(
+            tqdm(executor.map(get_data_by_id, material_ids), total=len(material_ids))
+        )
+
+
+def get_field_columns(results: Iterable, fields: Optional[List[str]]) -> dict:
+    """Stream documents into one list per field.
+
+    Parameters
+    ----------
+    results : Iterable
+        API documents.
+    fields : Optional[List[str]]
+        Fields to keep. If None, all fields of each document are kept.
+
+    Returns
+    -------
+    dict
+        Mapping of field name to the list of values of that field, suitable for
+        ``pd.DataFrame(columns)`` without an intermediate row-wise copy.
+    """
+    columns: dict = {} if fields is None else {field: [] for field in fields}
+    for i, r in enumerate(results):
+        if fields is None:
+            for field, value in _to_dict(r).items():
+                columns.setdefault(field, [None] * i).append(value)
+            for values in columns.values():
+                if len(values) == i:
+                    values.append(None)
+        else:
+            for field in fields:
+                columns[field].append(getattr(r, field))
+    return columns
+
+
+def take_columns(columns: dict, positions: Sequence[int]) -> None:
+    """Select ``positions`` of every column in place, one column at a time."""
+    for name, values in columns.items():
+        columns[name] = [values[i] for i in positions]
 
 
 def fetch_data(
@@ -37,6 +752,17 @@ def fetch_data(
     use_theoretical: bool = False,
     return_both_if_experimental: bool = False,
     one_by_one: bool = False,
+    partition_by: Optional[Literal["num_sites", "num_elements"]] = None,
+    num_partitions: int = 8,
+    max_workers: int = 4,
+    provenance_mode: Literal["auto", "bulk", "targeted"] = "auto",
+    max_retries: int = 3,
+    backoff: float = 1.0,
+    client=None,
+    cache_dir: Optional[str] = None,
+    n_jobs: Optional[int] = None,
+    fast_discovery: bool = False,
+    reference_cache: Optional[ReferenceCache] = None,
     **search_kwargs,
 ) -> Union[pd.DataFrame, Tuple[pd.DataFrame, pd.DataFrame]]:
     """Retrieve MP data sorted by MPID (theoretical+exptl) or pub year (exptl).
@@ -87,6 +813,44 @@ def fetch_data(
         Whether to return both the full DataFrame containing theoretical+experimental
         (`df`) and the experimental-only DataFrame (`expt_df`) or only `expt_df`, by
         default False. This is only applicable if `use_theoretical` is False.
+    one_by_one : bool, optional
+        Whether to retrieve provenance documents one material at a time instead of
+        via a single search, by default False.
+    partition_by : Optional[Literal["num_sites", "num_elements"]]
+        If not None, split the summary search into disjoint sub-queries on this field
+        and run them concurrently, see :func:`search_summary`. The result is the same
+        as for the serial search. By default None.
+    num_partitions : int, optional
+        Maximum number of summary sub-queries, by default 8.
+    max_workers : int, optional
+        Maximum number of concurrent requests (summary sub-queries, provenance
+        batches or `one_by_one` provenance requests), by default 4.
+    provenance_mode : Literal["auto", "bulk", "targeted"]
+        How to retrieve provenance documents if not `one_by_one`, see
+        :func:`search_provenance`. By default "auto".
+    max_retries : int, optional
+        Maximum number of retries of a request failing with a transport or HTTP
+        error, see :func:`call_with_retry`. By default 3.
+    backoff : float, optional
+        Seconds to wait before the first retry of a request, doubled after each
+        retry, see :func:`call_with_retry`. By default 1.0.
+    client : optional
+        Client to use instead of ``MPRester(api_key)``, e.g. a
+        :class:`RecordingClient` or :class:`ReplayClient`. By default None.
+    cache_dir : Optional[str]
+        If not None, raw summary and provenance documents are cached in this directory
+        (see :class:`DocumentCache`). Only the ``material_id`` and ``last_updated``
+        fields of the query are then searched, and full documents are only requested
+        for entries that are new or changed since they were cached. By default None.
+    n_jobs : Optional[int]
+        Number of worker processes used to parse references, see
+        :func:`get_discovery_dict`. By default None.
+    fast_discovery : bool
+        Whether to extract years and authors with a regex scanner where possible, see
+        :func:`get_discovery_dict`. By default False.
+    reference_cache : Optional[ReferenceCache]
+        Cache of parsed references shared across calls, see
+        :func:`get_discovery_dict`. By default None.
     search_kwargs : dict, optional
         kwargs: Supported search terms, e.g. nelements_max=3 for the "materials" search
         API. Consult the specific API route for valid search terms,
@@ -133,82 +897,146 @@ def fetch_data(
         if not use_theoretical and "theoretical" not in fields:
             fields.append("theoretical")
 
-    if exclude_elements is None:
-        excl_elems = None
-    elif isinstance(exclude_elements, str):
-        if exclude_elements not in AVAILABLE_EXCLUDE_STRS:
-            raise NotImplementedError(
-                f"Because str passed to `exclude_elements` instead of list of str, expected one of {AVAILABLE_EXCLUDE_STRS}"  # noqa: E501
+    excl_elems = get_excluded_elements(exclude_elements)
+
+    if client is None:
+        client = MPRester(api_key)
+
+    cache = None if cache_dir is None else DocumentCache(cache_dir)
+    # search criteria that the cached documents depend on
+    query = dict(
+        num_sites=num_sites,
+        elements=elements,
+        exclude_elements=excl_elems,
+        use_theoretical=use_theoretical,
+        **search_kwargs,
+    )
+
+    with client as mpr:
+
+        def summary_search(fields, search=search_summary):
+            return search(
+                mpr,
+                partition_by=partition_by,
+                num_partitions=num_partitions,
+                max_workers=max_workers,
+                max_retries=max_retries,
+                backoff=backoff,
+                num_sites=num_sites,
+                elements=elements,
+                exclude_elements=excl_elems,
+                fields=fields,
+                **search_kwargs,
             )
-        if exclude_elements == "noble":
-            excl_elems = noble
-        elif exclude_elements == "radioactive":
-            excl_elems = radioactive
-        elif exclude_elements == "noble+radioactive":
-            excl_elems = noble + radioactive
-    else:
-        excl_elems = exclude_elements
 
-    with MPRester(api_key) as mpr:
-        results = mpr.summary.search(
-            num_sites=num_sites,
-            elements=elements,
-            exclude_elements=excl_elems,
-            fields=fields,
-            **search_kwargs,
-        )
+        with phase("summary_search") as record:
+            if cache is None:
+                # streamed into the columns as each sub-query completes
+                results = summary_search(fields, search=iter_search_summary)
+            else:
+                id_results = summary_search(["material_id", "last_updated"])
+                last_updated = {
+                    str(r.material_id): str(r.last_updated) for r in id_results
+                }
 
-        if fields is not None:
-            field_data = []
-            for r in results:
-                field_data.append({field: getattr(r, field) for field in fields})
-        else:
-            field_data = results
+                def fetch_summary(material_ids):
+                    docs = search_by_ids(
+                        mpr.summary,
+                        material_ids,
+                        fields=fields,
+                        max_workers=max_workers,
+                        max_retries=max_retries,
+                        backoff=backoff,
+                    )
+                    docs = {str(doc.material_id): doc for doc in docs}
+                    return [docs[mid] for mid in material_ids]
 
-        material_id = [str(fd["material_id"]) for fd in field_data]
+                results = cache.update(
+                    get_cache_name("summary", fields, **query),
+                    list(last_updated.keys()),
+                    list(last_updated.values()),
+                    fetch_summary,
+                )
+
+            columns = get_field_columns(results, fields)
+            # documents are no longer needed, only the per-column references to their
+            # data
+            del results
+            record["items"] = len(columns["material_id"])
 
         # mvc values get distinguished by a negative sign
-        index = [
-            int(mid.replace("mp-", "").replace("mvc-", "-")) for mid in material_id
-        ]
-        df = pd.DataFrame(field_data, index=index)
-        df = df.sort_index()
+        index = np.array(
+            [
+                int(str(mid).replace("mp-", "").replace("mvc-", "-"))
+                for mid in columns["material_id"]
+            ],
+            dtype=np.int64,
+        )
+        order = np.argsort(index, kind="stable")
+        take_columns(columns, order)
+        index = index[order]
+
+        if use_theoretical or return_both_if_experimental:
+            df = pd.DataFrame(columns, index=index)
 
         if not use_theoretical:
             # REVIEW: whether to use MPID class or str of MPIDs?
             # if latter, `expt_df.material_id.apply(str).tolist()`
-            expt_df = df.query("theoretical == False")
-            expt_material_id = expt_df.material_id.tolist()
+            # as `df.query("theoretical == False")`, i.e. None is not experimental
+            theoretical = np.asarray(columns["theoretical"], dtype=object)
+            expt_positions = np.flatnonzero(theoretical == False)  # noqa: E712
+            # `take_columns` builds new lists, so this leaves `df` as is
+            take_columns(columns, expt_positions)
+            expt_index = index[expt_positions]
+            expt_material_id = columns["material_id"]
 
-            if not one_by_one:
-                # https://github.com/materialsproject/api/issues/613
-                provenance_results = mpr.provenance.search(
-                    fields=["references", "material_id"]
-                )
-                provenance_ids = [fpr.material_id for fpr in provenance_results]
-                prov_df = pd.Series(
-                    name="provenance", data=provenance_results, index=provenance_ids
-                )
-                expt_provenance_results = prov_df.loc[expt_material_id]
-            else:
+            def get_provenance(material_ids):
+                if not one_by_one:
+                    return search_provenance(
+                        mpr,
+                        material_ids,
+                        mode=provenance_mode,
+                        max_workers=max_workers,
+                        max_retries=max_retries,
+                        backoff=backoff,
+                    )
                 # slow version
-                expt_provenance_results = [
-                    mpr.provenance.get_data_by_id(mid) for mid in tqdm(expt_material_id)
-                ]
+                return get_provenance_one_by_one(
+                    mpr,
+                    material_ids,
+                    max_workers=max_workers,
+                    max_retries=max_retries,
+                    backoff=backoff,
+                )
+
+            with phase("provenance_fetch") as record:
+                if cache is None:
+                    expt_provenance_results = get_provenance(expt_material_id)
+                else:
+                    expt_material_id = [str(mid) for mid in expt_material_id]
+                    expt_provenance_results = cache.update(
+                        get_cache_name("provenance", PROVENANCE_FIELDS, **query),
+                        expt_material_id,
+                        [last_updated[mid] for mid in expt_material_id],
+                        get_provenance,
+                    )
+                record["items"] = len(expt_provenance_results)
             # CrystalSystem not JSON serializable, see
             # https://github.com/materialsproject/api/issues/615
             # expt_df["provenance"] = expt_provenance_results
 
             # extract earliest ICSD year
             references = [pr.references for pr in expt_provenance_results]
-            discovery = get_discovery_dict(references)
-            year = [disc["year"] for disc in discovery]
-            # https://stackoverflow.com/a/35387129/13697228
-            expt_df = expt_df.assign(
-                references=references, discovery=discovery, year=year
+            discovery = get_discovery_dict(
+                references, n_jobs=n_jobs, fast=fast_discovery, cache=reference_cache
             )
+            year = [disc["year"] for disc in discovery]
+            columns.update(references=references, discovery=discovery, year=year)
 
-            expt_df = expt_df.sort_values(by=["year"])
+            # stable, i.e. entries of the same year stay sorted by MPID
+            order = pd.Series(year).sort_values(kind="stable").index
+            take_columns(columns, order)
+            expt_df = pd.DataFrame(columns, index=expt_index[order])
 
     if use_theoretical:
         return df
@@ -0,0 +1,228 @@
+import gzip
+import json
+import struct
+from typing import List, Optional, Tuple, Union
+
+import numpy as np
+import pandas as pd
+from monty.json import MontyDecoder, MontyEncoder
+from typing_extensions import Literal
+
+from mp_time_split.utils.data import atomic_write, get_excluded_elements
+from mp_time_split.utils.instrument import phase
+from mp_time_split.utils.query import SnapshotIndex, get_symbols_mask
+
+MAGIC = b"MPTSBLK1"
+# footer offset (little-endian uint64) followed by the magic bytes
+_TRAILER = struct.Struct("<Q8s")
+
+
+def is_block_snapshot(fpath: str) -> bool:
+    """Whether ``fpath`` was written by :func:`write_block_snapshot`."""
+    with open(fpath, "rb") as f:
+        return f.read(len(MAGIC)) == MAGIC
+
+
+def _get_block_stats(
+    index: SnapshotIndex, years: Optional[np.ndarray], rows: np.ndarray
+) -> dict:
+    masks = index.element_masks[rows]
+    num_sites = index.num_sites[rows]
+    stats = {
+        "element_union": np.bitwise_or.reduce(masks, axis=0).tolist(),
+        "element_intersection": np.bitwise_and.reduce(masks, axis=0).tolist(),
+        "num_sites": [int(num_sites.min()), int(num_sites.max())],
+    }
+    if years is not None:
+        block_years = years[rows]
+        block_years = block_years[~np.isnan(block_years)]
+        if len(block_years):
+            stats["year"] = [int(block_years.min()), int(block_years.max())]
+    return stats
+
+
+def write_block_snapshot(
+    df: pd.DataFrame, fpath: str, block_size: int = 1000, cluster: bool = True
+) -> dict:
+    """Store a snapshot as independently compressed blocks with per-block statistics.
+
+    Each block of (at most) ``block_size`` entries is a separate gzip member, and a
+    footer lists the byte range of every block together with the union and
+    intersection of the element sets of its entries (as in :class:`SnapshotIndex`)
+    and its range of number of sites and of years. :func:`read_block_snapshot` uses
+    these statistics to skip blocks that cannot match a filter.
+
+    Parameters
+    ----------
+    df : pd.DataFrame
+        Snapshot as returned by :func:`MPTimeSplit.load` or
+        :func:`MPTimeSplit.fetch_data`.
+    fpath : str
+        Path to write to.
+    block_size : int
+        Number of entries per block, by default 1000.
+    cluster : bool
+        Whether to group entries of the same chemical system into the same blocks,
+        which makes the element statistics far more selective. The original row
+        order (i.e. by year) is restored when reading. If False, blocks follow the
+        row order of ``df``, which suits year range queries. By default True.
+
+    Returns
+    -------
+    dict
+        The footer.
+    """
+    index = SnapshotIndex.from_structures(df.structure)
+    years = None
+    if "year" in df:
+        years = pd.to_numeric(df["year"], errors="coerce").to_numpy(dtype=float)
+    order = np.arange(len(df))
+    if cluster:
+        chemsys = [
+            "-".join(sorted(e.symbol for e in s.composition.elements))
+            for s in df.structure
+        ]
+        order = np.lexsort((index.num_sites, chemsys))
+
+    columns = list(df.columns)
+    footer = {"columns": columns, "num_rows": len(df), "blocks": []}
+    with atomic_write(fpath) as f:
+        f.write(MAGIC)
+        for start in range(0, len(df), block_size):
+            rows = order[start : start + block_size]
+            block = df.iloc[rows]
+            payload = {
+                "position": rows.tolist(),
+                "index": block.index.tolist(),
+                "data": block.values.tolist(),
+            }
+            data = gzip.compress(json.dumps(payload, cls=MontyEncoder).encode())
+            footer["blocks"].append(
+                {
+                    "offset": f.tell(),
+                    "length": len(data),
+                    "num_rows": len(rows),
+                    **_get_block_stats(index, years, rows),
+                }
+            )
+            f.write(data)
+        footer_offset = f.tell()
+        f.write(gzip.compress(json.dumps(footer).encode()))
+        f.write(_TRAILER.pack(footer_offset, MAGIC))
+    return footer
+
+
+def read_block_footer(fpath: str) -> dict:
+    with open(fpath, "rb") as f:
+        f.seek(-_TRAILER.size, 2)
+        end = f.tell()
+        footer_offset, magic = _TRAILER.unpack(f.read(_TRAILER.size))
+        if magic != MAGIC:
+            raise ValueError(f"{fpath} is not a block snapshot or is truncated")
+        f.seek(footer_offset)
+        return json.loads(gzip.decompress(f.read(end - footer_offset)))
+
+
+def select_blocks(
+    footer: dict,
+    num_sites: Optional[Tuple[int, int]] = None,
+    elements: Optional[List[str]] = None,
+    exclude_elements: Optional[Union[List[str], str]] = None,
+    years: Optional[Tuple[int, int]] = None,
+) -> List[int]:
+    """Positions of the blocks that may contain entries matching all filters.
+
+    See :func:`read_block_snapshot` for the parameters.
+    """
+    blocks = footer["blocks"]
+    selected = np.ones(len(blocks), dtype=bool)
+    if num_sites is not None:
+        lo, hi = num_sites
+        block_sites = np.array([b["num_sites"] for b in blocks]).reshape(-1, 2)
+        selected &= (block_sites[:, 0] <= hi) & (block_sites[:, 1] >= lo)
+    if years is not None:
+        lo, hi = years
+        for i, b in enumerate(blocks):
+            if "year" in b:
+                selected[i] &= b["year"][0] <= hi and b["year"][1] >= lo
+    if elements:
+        # some entry of the block must have all elements
+        query = get_symbols_mask(elements)
+        union = np.array([b["element_union"] for b in blocks], dtype=np.uint64)
+        selected &= np.all((union.reshape(-1, 2) & query) == query, axis=1)
+    excluded = get_excluded_elements(exclude_elements)
+    if excluded:
+        # skip blocks where every entry has one of the excluded elements
+        query = get_symbols_mask(excluded)
+        common = np.array([b["element_intersection"] for b in blocks], np.uint64)
+        selected &= np.all((common.reshape(-1, 2) & query) == 0, axis=1)
+    return np.flatnonzero(selected).tolist()
+
+
+def read_block_snapshot(
+    fpath: str,
+    num_sites: Optional[Tuple[int, int]] = None,
+    elements: Optional[List[str]] = None,
+    exclude_elements: Optional[
+        Union[List[str], Literal["noble", "radioactive", "noble+radioactive"]]
+    ] = None,
+    years: Optional[Tuple[int, int]] = None,
+) -> pd.DataFrame:
+    """Read the entries of a block snapshot matching all filters.
+
+    Only blocks whose statistics allow a match are decompressed and decoded, and
+    their entries are then filtered exactly.
+
+    Parameters
+    ----------
+    fpath : str
+        Path written by :func:`write_block_snapshot`.
+    num_sites, elements, exclude_elements
+        Filters as for :class:`MPTimeSplit`, see :func:`SnapshotIndex.select`.
+    years : Optional[Tuple[int, int]]
+        Inclusive range of discovery years, by default None.
+
+    Returns
+    -------
+    pd.DataFrame
+        Matching entries in the order of the DataFrame that was written.
+    """
+    footer = read_block_footer(fpath)
+    block_ids = select_blocks(
+        footer,
+        num_sites=num_sites,
+        elements=elements,
+        exclude_elements=exclude_elements,
+        years=years,
+    )
+    blocks = footer["blocks"]
+    num_bytes = sum(blocks[i]["length"] for i in block_ids)
+    with phase("decode", bytes=num_bytes) as record:
+        positions: List[int] = []
+        index: list = []
+        data: list = []
+        with open(fpath, "rb") as f:
+            for i in block_ids:
+                f.seek(blocks[i]["offset"])
+                payload = json.loads(
+                    gzip.decompress(f.read(blocks[i]["length"])), cls=MontyDecoder
+                )
+                positions.extend(payload["position"])
+                index.extend(payload["index"])
+                data.extend(payload["data"])
+        df = pd.DataFrame(data, index=index, columns=footer["columns"])
+        # restore the original (e.g. time) order
+        df = df.iloc[np.argsort(positions, kind="stable")]
+        if len(df):
+            selected = SnapshotIndex.from_structures(df.structure).select(
+                num_sites=num_sites,
+                elements=elements,
+                exclude_elements=exclude_elements,
+            )
+            df = df[selected]
+        if years is not None:
+            df = df[df["year"].between(*years)]
+        record["items"] = len(df)
+        record["blocks"] = len(block_ids)
+        record["total_blocks"] = len(blocks)
+    return df
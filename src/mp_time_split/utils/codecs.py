@@ -0,0 +1,266 @@
+import gzip
+import struct
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from os import path
+from typing import Callable, Dict, List, NamedTuple, Optional, Sequence
+
+from mp_time_split.utils.parallel import get_n_jobs
+
+GZIP_MAGIC = b"\x1f\x8b"
+ZSTD_MAGIC = b"\x28\xb5\x2f\xfd"
+
+# BGZF (as used by htslib): a series of gzip members of at most 64 KiB, each with an
+# extra "BC" subfield holding its size so that members can be located without
+# inflating them
+BGZF_BLOCK_SIZE = 0xFF00
+_BGZF_HEADER = struct.Struct("<4sIBBHBBHH")
+_BGZF_ID = b"\x1f\x8b\x08\x04"
+_BGZF_EOF = bytes.fromhex("1f8b08040000000000ff0600424302001b0003000000000000000000")
+_GZIP_TRAILER = struct.Struct("<II")
+
+# zstd frames of this many uncompressed bytes, listed in a seek table at the end
+ZSTD_BLOCK_SIZE = 1 << 22
+_ZSTD_SKIPPABLE_MAGIC = 0x184D2A5E
+_ZSTD_SEEKABLE_MAGIC = 0x8F92EAB1
+_ZSTD_SEEK_FOOTER = struct.Struct("<IBI")
+_ZSTD_SEEK_ENTRY = struct.Struct("<II")
+
+
+class Codec(NamedTuple):
+    """Compression format of snapshot files.
+
+    ``compress`` and ``decompress`` take the data and ``n_jobs``, the number of
+    threads to use where the format allows it. ``detect`` tells from the first bytes
+    of a file whether it is in this format.
+    """
+
+    name: str
+    extension: str
+    compress: Callable[[bytes, Optional[int]], bytes]
+    decompress: Callable[[bytes, Optional[int]], bytes]
+    detect: Callable[[bytes], bool]
+
+
+CODECS: Dict[str, Codec] = {}
+
+
+def register_codec(codec: Codec) -> None:
+    """Make a codec available to :func:`compress` and :func:`decompress`.
+
+    Codecs registered later are tried first by :func:`detect_codec`, so a codec can
+    refine the detection of a more general one (e.g. BGZF files are also gzip).
+    """
+    CODECS[codec.name] = codec
+
+
+def _map(func: Callable, items: Sequence, n_jobs: Optional[int] = None) -> List:
+    # zlib and zstandard release the GIL, so threads decompress in parallel
+    n_jobs = min(get_n_jobs(n_jobs), max(len(items), 1))
+    if n_jobs == 1:
+        return [func(item) for item in items]
+    with ThreadPoolExecutor(max_workers=n_jobs) as executor:
+        return list(executor.map(func, items))
+
+
+def _chunk(data: bytes, size: int) -> List[memoryview]:
+    view = memoryview(data)
+    return [view[i : i + size] for i in range(0, len(data), size)]
+
+
+def _bgzf_compress_block(chunk: memoryview, level: int = 6) -> bytes:
+    compressor = zlib.compressobj(level, zlib.DEFLATED, -15)
+    deflated = compressor.compress(chunk) + compressor.flush()
+    block_size = _BGZF_HEADER.size + len(deflated) + _GZIP_TRAILER.size
+    header = _BGZF_HEADER.pack(_BGZF_ID, 0, 0, 255, 6, 66, 67, 2, block_size - 1)
+    return header + deflated + _GZIP_TRAILER.pack(zlib.crc32(chunk), len(chunk))
+
+
+def _bgzf_decompress_block(block: memoryview) -> bytes:
+    crc, size = _GZIP_TRAILER.unpack(block[-_GZIP_TRAILER.size :])
+    data = zlib.decompress(block[_BGZF_HEADER.size : -_GZIP_TRAILER.size], -15)
+    if len(data) != size or zlib.crc32(data) != crc:
+        raise ValueError("corrupted BGZF block")
+    return data
+
+
+def _detect_bgzf(head: bytes, pos: int = 0) -> bool:
+    if len(head) - pos < _BGZF_HEADER.size:
+        return False
+    magic, _, _, _, xlen, si1, si2, slen, _ = _BGZF_HEADER.unpack_from(head, pos)
+    return magic == _BGZF_ID and (xlen, si1, si2, slen) == (6, 66, 67, 2)
+
+
+def _get_bgzf_blocks(data: bytes) -> Optional[List[memoryview]]:
+    view = memoryview(data)
+    blocks = []
+    pos = 0
+    while pos < len(data):
+        if not _detect_bgzf(data, pos):
+            return None
+        stop = pos + _BGZF_HEADER.unpack_from(data, pos)[-1] + 1
+        if stop > len(data):
+            return None
+        blocks.append(view[pos:stop])
+        pos = stop
+    return blocks
+
+
+def bgzf_compress(data: bytes, n_jobs: Optional[int] = None, level: int = 6) -> bytes:
+    """Compress into BGZF blocks, which any gzip reader can decompress."""
+    blocks = _map(
+        partial(_bgzf_compress_block, level=level),
+        _chunk(data, BGZF_BLOCK_SIZE),
+        n_jobs,
+    )
+    return b"".join(blocks) + _BGZF_EOF
+
+
+def bgzf_decompress(data: bytes, n_jobs: Optional[int] = None) -> bytes:
+    blocks = _get_bgzf_blocks(data)
+    if blocks is None:
+        # other gzip members (e.g. concatenated files), decompressed serially
+        return gzip.decompress(data)
+    return b"".join(_map(_bgzf_decompress_block, blocks, n_jobs))
+
+
+def _import_zstandard():
+    try:
+        import zstandard
+    except ImportError as e:
+        raise ImportError(
+            "Failed to import zstandard. Try `pip install mp_time_split[zstd]` or `pip install zstandard`"  # noqa: E501
+        ) from e
+    return zstandard
+
+
+def _zstd_compress_block(chunk: memoryview, level: int = 3) -> bytes:
+    # compressors are not thread-safe, so use one per block
+    return _import_zstandard().ZstdCompressor(level=level).compress(chunk)
+
+
+def _zstd_decompress_block(args) -> bytes:
+    frame, size = args
+    return (
+        _import_zstandard().ZstdDecompressor().decompress(frame, max_output_size=size)
+    )
+
+
+def zstd_compress(data: bytes, n_jobs: Optional[int] = None, level: int = 3) -> bytes:
+    """Compress into independent zstd frames followed by a seek table.
+
+    The seek table is a skippable frame as in the zstd seekable format, so the
+    output is a valid zstd stream that other tools can decompress as a whole.
+    """
+    chunks = _chunk(data, ZSTD_BLOCK_SIZE)
+    frames = _map(partial(_zstd_compress_block, level=level), chunks, n_jobs)
+    table = b"".join(
+        _ZSTD_SEEK_ENTRY.pack(len(frame), len(chunk))
+        for frame, chunk in zip(frames, chunks)
+    )
+    table += _ZSTD_SEEK_FOOTER.pack(len(frames), 0, _ZSTD_SEEKABLE_MAGIC)
+    skippable = struct.pack("<II", _ZSTD_SKIPPABLE_MAGIC, len(table)) + table
+    return b"".join(frames) + skippable
+
+
+def zstd_decompress(data: bytes, n_jobs: Optional[int] = None) -> bytes:
+    zstandard = _import_zstandard()
+    footer_start = len(data) - _ZSTD_SEEK_FOOTER.size
+    if footer_start < 0 or data[-4:] != struct.pack("<I", _ZSTD_SEEKABLE_MAGIC):
+        # no seek table, decompress serially
+        reader = zstandard.ZstdDecompressor().stream_reader(
+            data, read_across_frames=True
+        )
+        return reader.read()
+    num_frames, descriptor, _ = _ZSTD_SEEK_FOOTER.unpack_from(data, footer_start)
+    # entries have an additional checksum if the corresponding flag is set
+    entry_size = _ZSTD_SEEK_ENTRY.size + (4 if descriptor & 0x80 else 0)
+    table_start = footer_start - num_frames * entry_size
+    frames = []
+    pos = 0
+    view = memoryview(data)
+    for i in range(num_frames):
+        frame_size, size = _ZSTD_SEEK_ENTRY.unpack_from(
+            data, table_start + i * entry_size
+        )
+        frames.append((view[pos : pos + frame_size], size))
+        pos += frame_size
+    return b"".join(_map(_zstd_decompress_block, frames, n_jobs))
+
+
+register_codec(
+    Codec(
+        "raw",
+        "",
+        lambda data, n_jobs=None: data,
+        lambda data, n_jobs=None: data,
+        lambda head: False,
+    )
+)
+register_codec(
+    Codec(
+        "gzip",
+        ".gz",
+        lambda data, n_jobs=None: gzip.compress(data),
+        lambda data, n_jobs=None: gzip.decompress(data),
+        lambda head: head.startswith(GZIP_MAGIC),
+    )
+)
+register_codec(Codec("bgzf", ".bgz", bgzf_compress, bgzf_decompress, _detect_bgzf))
+register_codec(
+    Codec(
+        "zstd",
+        ".zst",
+        zstd_compress,
+        zstd_decompress,
+        lambda head: head.startswith(ZSTD_MAGIC),
+    )
+)
+
+
+def detect_codec(head: bytes) -> str:
+    """Name of the codec of a file starting with ``head`` (at least 18 bytes)."""
+    for codec in reversed(list(CODECS.values())):
+        if codec.name != "raw" and codec.detect(head):
+            return codec.name
+    return "raw"
+
+
+def get_codec_from_path(fpath: str) -> str:
+    """Name of the codec matching the extension of ``fpath``, e.g. "gzip" for .gz."""
+    ext = path.splitext(fpath)[1]
+    for codec in CODECS.values():
+        if codec.extension and codec.extension == ext:
+            return codec.name
+    return "raw"
+
+
+def compress(data: bytes, codec: str, n_jobs: Optional[int] = None) -> bytes:
+    """Compress ``data`` with a registered codec, see :data:`CODECS`."""
+    if codec not in CODECS:
+        raise ValueError(f"codec={codec} should be one of {list(CODECS)}")
+    return CODECS[codec].compress(data, n_jobs)
+
+
+def decompress(
+    data: bytes, codec: Optional[str] = None, n_jobs: Optional[int] = None
+) -> bytes:
+    """Decompress ``data``, detecting the codec from its first bytes if None.
+
+    Parameters
+    ----------
+    data : bytes
+        Compressed data.
+    codec : Optional[str]
+        Name of a registered codec, by default None.
+    n_jobs : Optional[int]
+        Number of threads for codecs with independently decompressible blocks
+        ("bgzf" and "zstd" as written by :func:`compress`). If None, 1 (following
+        the scikit-learn convention). By default None.
+    """
+    if codec is None:
+        codec = detect_codec(data[:64])
+    if codec not in CODECS:
+        raise ValueError(f"codec={codec} should be one of {list(CODECS)}")
+    return CODECS[codec].decompress(data, n_jobs)
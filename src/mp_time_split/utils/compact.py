@@ -0,0 +1,56 @@
+from typing import Iterable, List
+
+import numpy as np
+import pandas as pd
+
+# distinguishes mvc (negative) from mp (positive) IDs, as for the index of `mpt.data`
+MATERIAL_ID_PREFIXES = {"mp-": 1, "mvc-": -1}
+
+
+def to_material_id_int(material_id: Iterable) -> np.ndarray:
+    """Convert ``"mp-146"``-style IDs to ``146`` and ``"mvc-12"`` to ``-12``."""
+    ids = []
+    for mid in material_id:
+        mid = str(mid)
+        prefix = mid[: mid.index("-") + 1]
+        ids.append(MATERIAL_ID_PREFIXES[prefix] * int(mid[len(prefix) :]))
+    return np.array(ids, dtype=np.int32)
+
+
+def to_material_id_str(material_id: Iterable[int]) -> List[str]:
+    """Inverse of :func:`to_material_id_int`."""
+    return [f"mp-{mid}" if mid >= 0 else f"mvc-{-mid}" for mid in material_id]
+
+
+def compact_dataframe(df: pd.DataFrame) -> pd.DataFrame:
+    """Convert the non-structure columns of a snapshot to compact dtypes.
+
+    ``year`` becomes nullable ``Int16``, float columns (e.g. ``energy_above_hull``)
+    ``float32``, ``theoretical`` ``bool`` and ``material_id`` ``int32`` (see
+    :func:`to_material_id_int`, use :func:`to_material_id_str` to convert back).
+
+    Parameters
+    ----------
+    df : pd.DataFrame
+        Snapshot as returned by :func:`MPTimeSplit.load` or
+        :func:`MPTimeSplit.fetch_data`.
+
+    Returns
+    -------
+    pd.DataFrame
+        Copy of ``df`` (structures and other objects are not copied) with compact
+        dtypes.
+    """
+    df = df.copy(deep=False)
+    for name, dtype in df.dtypes.items():
+        if dtype.kind == "f" and name != "year":
+            df[name] = df[name].astype(np.float32)
+    if "year" in df:
+        df["year"] = pd.array(
+            [None if pd.isna(y) else int(y) for y in df["year"]], dtype="Int16"
+        )
+    if "theoretical" in df:
+        df["theoretical"] = df["theoretical"].astype(bool)
+    if "material_id" in df and df["material_id"].dtype.kind not in "iu":
+        df["material_id"] = to_material_id_int(df["material_id"])
+    return df
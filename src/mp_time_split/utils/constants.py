@@ -0,0 +1,7 @@
+"""Lightweight constants, importable without loading pandas, scikit-learn, etc."""
+
+AVAILABLE_MODES = ["TimeSeriesSplit", "TimeSeriesOverflowSplit", "TimeKFold"]
+# name used in place of an integer fold to refer to the final train/test split
+TEST_FOLD = "test"
+# ensure match with the `Literal` type hint of `exclude_elements`
+AVAILABLE_EXCLUDE_STRS = ["noble", "radioactive", "noble+radioactive"]
@@ -1,11 +1,26 @@
+import gzip
+import json
 import re
-from typing import List
+from collections import OrderedDict
+from contextlib import contextmanager
+from functools import partial
+from hashlib import sha1
+from os import path, remove, replace
+from pathlib import Path
+from typing import IO, Callable, Iterator, List, Optional, Tuple, TypeVar, Union
+from uuid import uuid4
+from warnings import warn
 
-import pybtex.errors
-from pybtex.database.input import bibtex
+from monty.io import zopen
+from monty.json import MontyEncoder
+from monty.serialization import loadfn
 from tqdm import tqdm
 
-pybtex.errors.set_strict_mode(False)
+from mp_time_split.utils.constants import AVAILABLE_EXCLUDE_STRS
+from mp_time_split.utils.instrument import phase
+from mp_time_split.utils.parallel import parallel_imap
+
+T = TypeVar("T")
 
 SNAPSHOT_NAME = "mp_time_summary.json"
 DUMMY_SNAPSHOT_NAME = "mp_dummy_time_summary.json"
@@ -16,7 +31,340 @@ radioactive = ["U", "Th", "Ra", "Pu", "Po", "Rn", "Cm", "At", "Bk", "Fr", "Ac",
 # fmt: on
 
 
-def get_discovery_dict(references: List[dict]) -> List[dict]:
+def get_excluded_elements(
+    exclude_elements: Optional[Union[List[str], str]]
+) -> Optional[List[str]]:
+    """Resolve `exclude_elements` of :func:`MPTimeSplit` to element symbols.
+
+    A list is returned as is, and "noble", "radioactive" or "noble+radioactive" are
+    expanded to :data:`noble`, :data:`radioactive` or both.
+    """
+    if exclude_elements is None or not isinstance(exclude_elements, str):
+        return exclude_elements
+    if exclude_elements not in AVAILABLE_EXCLUDE_STRS:
+        raise NotImplementedError(
+            f"Because str passed to `exclude_elements` instead of list of str, expected one of {AVAILABLE_EXCLUDE_STRS}"  # noqa: E501
+        )
+    if exclude_elements == "noble":
+        return noble
+    if exclude_elements == "radioactive":
+        return radioactive
+    return noble + radioactive
+
+
+# start of a bibtex entry, e.g. ``@article{Karen2005,``
+_ENTRY_RE = re.compile(r"@\s*(\w+)\s*\{\s*([^,\s{}]+)\s*,")
+# any field assignment, used to detect fields the scanner cannot handle
+_FIELD_RE = re.compile(r"(?:^|[,\s])(year|author)\s*=", re.IGNORECASE)
+# plain ``{...}`` or ``"..."`` values without nested braces
+_YEAR_RE = re.compile(
+    r"(?:^|[,\s])year\s*=\s*(?:\{\s*(\d{4})\s*\}|\"\s*(\d{4})\s*\"|(\d{4}))\s*[,}]",
+    re.IGNORECASE,
+)
+_AUTHOR_RE = re.compile(
+    r"(?:^|[,\s])author\s*=\s*(?:\{([^{}\"\\~]*)\}|\"([^{}\"\\~]*)\")\s*[,}]",
+    re.IGNORECASE,
+)
+_AND_RE = re.compile(r"\s+and\s+", re.IGNORECASE)
+
+
+def get_sidecar_path(
+    data_path: str, checksum: str, kind: str, ext: str = ".json.gz", **params
+) -> str:
+    """Get the path of a file derived from and stored next to a snapshot.
+
+    Parameters
+    ----------
+    data_path : str
+        Path to the snapshot, e.g. ``".../mp_time_summary.json.gz"``.
+    checksum : str
+        Checksum of the snapshot. Derived files are only valid for this checksum.
+    kind : str
+        Kind of derived data, e.g. ``"fingerprint"``.
+    ext : str
+        File extension, by default ".json.gz".
+    params : dict, optional
+        Parameters that the derived data depends on, e.g. ``symprec=0.1``.
+
+    Returns
+    -------
+    str
+        Path of the form ``"{dir}/{stem}_{kind}_{checksum}[_{key}={value}...]{ext}"``
+
+    Examples
+    --------
+    >>> get_sidecar_path("data/mp_time_summary.json.gz", "57da7f", "fingerprint", symprec=0.1)
+    'data/mp_time_summary_fingerprint_57da7f_symprec=0.1.json.gz'
+    """  # noqa: E501
+    stem = path.basename(data_path).split(".")[0]
+    suffix = "".join(f"_{key}={value}" for key, value in sorted(params.items()))
+    name = f"{stem}_{kind}_{checksum}{suffix}{ext}"
+    return path.join(path.dirname(data_path), name)
+
+
+@contextmanager
+def atomic_write(fpath: str, mode: str = "wb") -> Iterator[IO]:
+    """Open a temporary file that replaces ``fpath`` once the ``with`` block exits.
+
+    Readers never see a partially written file. The temporary file has a unique name
+    next to ``fpath``, so concurrent writers of the same path don't interfere (the
+    last one to finish wins), and it is removed if the ``with`` block raises.
+
+    Examples
+    --------
+    >>> with atomic_write("data/cache.json.gz") as f, gzip.open(f, "wt") as gz:
+    ...     json.dump(results, gz)
+    """
+    Path(fpath).parent.mkdir(exist_ok=True, parents=True)
+    tmp_path = f"{fpath}.{uuid4().hex}.tmp"
+    try:
+        with open(tmp_path, mode.replace("w", "x")) as f:
+            yield f
+        replace(tmp_path, fpath)
+    except BaseException:
+        if path.exists(tmp_path):
+            remove(tmp_path)
+        raise
+
+
+def dump_json_gz(obj, fpath: str) -> None:
+    """Write ``obj`` as gzipped JSON with :func:`atomic_write`, see ``loadfn``."""
+    with atomic_write(fpath) as f, gzip.open(f, "wt") as gz:
+        json.dump(obj, gz, cls=MontyEncoder)
+
+
+def load_or_compute_sidecar(
+    compute: Callable[[], T],
+    data_path: Optional[str],
+    checksum: Optional[str],
+    kind: str,
+    ext: str = ".json.gz",
+    load: Callable[[str], Optional[T]] = loadfn,
+    save: Callable[[T, str], None] = dump_json_gz,
+    **params,
+) -> T:
+    """Load data stored next to a snapshot, computing and storing it if absent.
+
+    Storing is best effort: if the directory of the snapshot is not writable (e.g.
+    the packaged dummy snapshot in a read-only install), a warning is issued and the
+    data is only returned.
+
+    Parameters
+    ----------
+    compute : Callable[[], T]
+        Computes the data if it is not stored yet.
+    data_path : Optional[str]
+        Path to the snapshot. If None (e.g. for freshly fetched data), the data is
+        computed but not stored.
+    checksum : Optional[str]
+        Checksum of the snapshot. If None, the data is computed but not stored.
+    kind, ext, params
+        See :func:`get_sidecar_path`.
+    load : Callable[[str], Optional[T]]
+        Reads a stored file, returning None if it is not valid for this snapshot so
+        that it is recomputed. By default ``loadfn``.
+    save : Callable[[T, str], None]
+        Writes the data to a path, preferably with :func:`atomic_write`. By default
+        :func:`dump_json_gz`.
+
+    Returns
+    -------
+    T
+        Stored or freshly computed data.
+    """
+    fpath = None
+    if data_path is not None and checksum is not None:
+        fpath = get_sidecar_path(data_path, checksum, kind, ext=ext, **params)
+        if path.isfile(fpath):
+            stored = load(fpath)
+            if stored is not None:
+                return stored
+    result = compute()
+    if fpath is not None:
+        try:
+            save(result, fpath)
+        except OSError as e:
+            warn(f"Could not store the {kind} data at {fpath}: {e}")
+    return result
+
+
+def _parse_first_report(refs: List[str]) -> dict:
+    """Get the earliest bib info of a single MP entry by fully parsing with pybtex."""
+    import pybtex.errors
+    from pybtex.database.input import bibtex
+
+    pybtex.errors.set_strict_mode(False)
+    parser = bibtex.Parser()
+    refs = "".join(refs)
+    refs = parser.parse_string(refs)
+    entries = refs.entries
+    entries_by_year = [
+        (int(entry.fields["year"]), entry)
+        for _, entry in entries.items()
+        if "year" in entry.fields and re.match(r"\d{4}", entry.fields["year"])
+    ]
+    if entries_by_year:
+        entries_by_year = sorted(entries_by_year, key=lambda x: x[0])
+        first_report = {
+            "year": entries_by_year[0][0],
+            "authors": entries_by_year[0][1].persons["author"],
+        }
+        first_report["authors"] = [str(auth) for auth in first_report["authors"]]
+        first_report["num_authors"] = len(first_report["authors"])
+        return first_report
+    return dict(year=None, authors=None, num_authors=None)
+
+
+def _scan_authors(author: str) -> Optional[List[str]]:
+    """Split a plain ``"Last, First and Last, First"`` field, or None if not plain."""
+    authors = []
+    for name in _AND_RE.split(author.strip()):
+        parts = name.split(",")
+        if len(parts) != 2:
+            return None
+        last, first = (" ".join(part.split()) for part in parts)
+        if not last or not first:
+            return None
+        authors.append(f"{last}, {first}")
+    return authors
+
+
+def scan_first_report(refs: List[str]) -> Optional[dict]:
+    """Get the earliest bib info of a single MP entry with a regex scanner.
+
+    Only handles the plain entries that make up the bulk of MP references, i.e. one
+    ``year`` field of 4 digits and ``author`` fields of ``"Last, First"`` names
+    without braces, escapes or special characters.
+
+    Parameters
+    ----------
+    refs : List[str]
+        Bibtex strings of a single MP entry.
+
+    Returns
+    -------
+    Optional[dict]
+        Same as an element of :func:`get_discovery_dict`, or None if the references
+        contain anything the scanner can't handle. The result is then expected to be
+        obtained by parsing with pybtex instead.
+    """
+    text = "".join(refs)
+    starts = list(_ENTRY_RE.finditer(text))
+    # stray text or "@" outside of entry headers, e.g. within a field value
+    if text.count("@") != len(starts) or (starts and text[: starts[0].start()].strip()):
+        return None
+    keys = [m.group(2).lower() for m in starts]
+    if len(set(keys)) != len(keys):
+        return None
+
+    first = None
+    for start, stop in zip(starts, starts[1:] + [None]):
+        if start.group(1).lower() in ["comment", "string", "preamble"]:
+            return None
+        body = text[start.end() : None if stop is None else stop.start()]
+        body = body.rstrip()
+        if not body.endswith("}") or body.count("{") + 1 != body.count("}"):
+            return None
+        names = [m.group(1).lower() for m in _FIELD_RE.finditer(body)]
+        if len(names) != len(set(names)):
+            return None
+        if "year" not in names:
+            continue
+        year_match = _YEAR_RE.search(body)
+        if year_match is None:
+            return None
+        year = int(next(g for g in year_match.groups() if g is not None))
+        if first is None or year < first[0]:
+            first = (year, body)
+
+    if first is None:
+        return dict(year=None, authors=None, num_authors=None)
+    year, body = first
+    author_match = _AUTHOR_RE.search(body)
+    if author_match is None:
+        return None
+    authors = _scan_authors(next(g for g in author_match.groups() if g is not None))
+    if authors is None:
+        return None
+    return {"year": year, "authors": authors, "num_authors": len(authors)}
+
+
+def get_first_report(refs: List[str], fast: bool = False) -> dict:
+    """Get the earliest bib info of one MP entry, see :func:`get_discovery_dict`."""
+    if fast:
+        first_report = scan_first_report(refs)
+        if first_report is not None:
+            return first_report
+    return _parse_first_report(refs)
+
+
+def get_reference_key(refs: List[str]) -> str:
+    """Content hash of the references of a single MP entry."""
+    return sha1("".join(refs).encode()).hexdigest()
+
+
+class ReferenceCache:
+    def __init__(
+        self, maxsize: Optional[int] = 100_000, cache_path: Optional[str] = None
+    ):
+        """LRU cache of :func:`get_first_report` results keyed by content hash.
+
+        Many MP entries share the same (ICSD) references, so each distinct reference
+        string only needs to be parsed once, including across runs if ``cache_path``
+        is given.
+
+        Parameters
+        ----------
+        maxsize : Optional[int]
+            Maximum number of results kept, least recently used first out. If None,
+            the cache is unbounded. By default 100_000.
+        cache_path : Optional[str]
+            If not None, results are loaded from and saved to this ``.json.gz`` file
+            (see :func:`save`). By default None.
+        """
+        self.maxsize = maxsize
+        self.cache_path = cache_path
+        self.results: "OrderedDict[str, dict]" = OrderedDict()
+        if cache_path is not None and path.isfile(cache_path):
+            with zopen(cache_path, "rt") as f:
+                self.results.update(json.load(f))
+            self._evict()
+
+    def __len__(self) -> int:
+        return len(self.results)
+
+    def __contains__(self, key: str) -> bool:
+        return key in self.results
+
+    def _evict(self) -> None:
+        while self.maxsize is not None and len(self.results) > self.maxsize:
+            self.results.popitem(last=False)
+
+    def get(self, key: str) -> Optional[dict]:
+        if key not in self.results:
+            return None
+        self.results.move_to_end(key)
+        return self.results[key]
+
+    def set(self, key: str, first_report: dict) -> None:
+        self.results[key] = first_report
+        self.results.move_to_end(key)
+        self._evict()
+
+    def save(self) -> None:
+        """Write the cached results to ``cache_path``, if any."""
+        if self.cache_path is None:
+            return
+        with atomic_write(self.cache_path) as f, gzip.open(f, "wt") as gz:
+            json.dump(self.results, gz)
+
+
+def get_discovery_dict(
+    references: List[List[str]],
+    n_jobs: Optional[int] = None,
+    fast: bool = False,
+    cache: Optional[ReferenceCache] = None,
+) -> List[dict]:
     """Get a dictionary containing earliest bib info for each MP entry.
 
     Modified from source:
@@ -25,9 +373,19 @@ def get_discovery_dict(references: List[dict]) -> List[dict]:
 
     Parameters
     ----------
-    provenance_results : List[dict]
+    references : List[List[str]]
         List of references results, e.g. taken from from the ``ProvenanceRester`` API
         results (:func:`mp_api.provenance`)
+    n_jobs : Optional[int]
+        Number of worker processes used for parsing, see :func:`parallel_map`. By
+        default None.
+    fast : bool
+        Whether to first try :func:`scan_first_report`, only falling back to pybtex
+        for the references it can't handle, by default False.
+    cache : Optional[ReferenceCache]
+        Cache of previously parsed references, updated (and saved, if it has a
+        ``cache_path``) with the newly parsed ones. Identical references within
+        ``references`` are only parsed once regardless. By default None.
 
     Returns
     -------
@@ -41,30 +399,53 @@ def get_discovery_dict(references: List[dict]) -> List[dict]:
     ...     provenance_results = mpr.provenance.search(num_sites=(1, 4), elements=["V"])
     >>> discovery = get_discovery_dict(provenance_results)
     [{'year': 1963, 'authors': ['Raub, E.', 'Fritzsche, W.'], 'num_authors': 2}, {'year': 1925, 'authors': ['Becker, K.', 'Ebert, F.'], 'num_authors': 2}, {'year': 1965, 'authors': ['Giessen, B.C.', 'Grant, N.J.'], 'num_authors': 2}, {'year': 1957, 'authors': ['Philip, T.V.', 'Beck, P.A.'], 'num_authors': 2}, {'year': 1963, 'authors': ['Darby, J.B.jr.'], 'num_authors': 1}, {'year': 1977, 'authors': ['Aksenova, T.V.', 'Kuprina, V.V.', 'Bernard, V.B.', 'Skolozdra, R.V.'], 'num_authors': 4}, {'year': 1964, 'authors': ['Maldonado, A.', 'Schubert, K.'], 'num_authors': 2}, {'year': 1962, 'authors': ['Darby, J.B.jr.', 'Lam, D.J.', 'Norton, L.J.', 'Downey, J.W.'], 'num_authors': 4}, {'year': 1925, 'authors': ['Becker, K.', 'Ebert, F.'], 'num_authors': 2}, {'year': 1959, 'authors': ['Dwight, A.E.'], 'num_authors': 1}] # noqa: E501
-    """
-    discovery = []
-    for refs in tqdm(references):
-        parser = bibtex.Parser()
-        refs = "".join(refs)
-        refs = parser.parse_string(refs)
-        entries = refs.entries
-        entries_by_year = [
-            (int(entry.fields["year"]), entry)
-            for _, entry in entries.items()
-            if "year" in entry.fields and re.match(r"\d{4}", entry.fields["year"])
-        ]
-        if entries_by_year:
-            entries_by_year = sorted(entries_by_year, key=lambda x: x[0])
-            first_report = {
-                "year": entries_by_year[0][0],
-                "authors": entries_by_year[0][1].persons["author"],
-            }
-            first_report["authors"] = [str(auth) for auth in first_report["authors"]]
-            first_report["num_authors"] = len(first_report["authors"])
-            discovery.append(first_report)
-        else:
-            discovery.append(dict(year=None, authors=None, num_authors=None))
-    return discovery
+    """  # noqa: E501
+    with phase("bibtex_parse", items=len(references)) as record:
+        first_reports, record["parsed"] = _get_first_reports(
+            references, n_jobs, fast, cache
+        )
+
+    # copy so that entries sharing references don't share mutable author lists
+    return [
+        dict(
+            first_reports[key],
+            authors=None
+            if first_reports[key]["authors"] is None
+            else list(first_reports[key]["authors"]),
+        )
+        for key in map(get_reference_key, references)
+    ]
+
+
+def _get_first_reports(references, n_jobs, fast, cache) -> Tuple[dict, int]:
+    """First report per distinct reference key and the number of newly parsed ones."""
+    keys = [get_reference_key(refs) for refs in references]
+    first_reports = {}
+    if cache is not None:
+        for key in keys:
+            first_report = cache.get(key)
+            if first_report is not None:
+                first_reports[key] = first_report
+
+    # parse each distinct, uncached reference string only once
+    new_refs = {}
+    for key, refs in zip(keys, references):
+        if key not in first_reports and key not in new_refs:
+            new_refs[key] = refs
+    parsed = list(
+        tqdm(
+            parallel_imap(
+                partial(get_first_report, fast=fast), new_refs.values(), n_jobs=n_jobs
+            ),
+            total=len(new_refs),
+        )
+    )
+    first_reports.update(zip(new_refs.keys(), parsed))
+    if cache is not None and new_refs:
+        for key, first_report in zip(new_refs.keys(), parsed):
+            cache.set(key, first_report)
+        cache.save()
+    return first_reports, len(new_refs)
 
 
 # def encode_dataframe(df):
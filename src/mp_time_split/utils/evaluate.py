@@ -0,0 +1,134 @@
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from time import perf_counter
+from typing import Callable, List, Optional, Union
+
+import pandas as pd
+from typing_extensions import Literal
+
+from mp_time_split.utils.constants import TEST_FOLD
+from mp_time_split.utils.parallel import get_n_jobs
+
+AVAILABLE_EXECUTORS = ["thread", "process"]
+
+
+def evaluate_fold(
+    data, fold: Union[int, str], estimator_factory: Callable, metric: Callable
+) -> dict:
+    """Fit a fresh estimator on the train data of one fold and score it.
+
+    Parameters
+    ----------
+    data : Union[MPTimeSplit, SharedSnapshot]
+        Object providing ``get_train_and_val_data(fold)`` and ``get_test_data()``.
+    fold : Union[int, str]
+        Integer fold (scored on the validation data) or ``"test"`` (scored on the
+        test data).
+    estimator_factory : Callable
+        Called without arguments to get an unfitted estimator with ``fit(inputs,
+        outputs)`` and ``predict(inputs)`` methods, e.g. a scikit-learn class.
+    metric : Callable
+        Called as ``metric(true_outputs, predicted_outputs)``, e.g.
+        :func:`sklearn.metrics.mean_absolute_error`.
+
+    Returns
+    -------
+    dict
+        ``fold``, ``score``, ``num_train``, ``num_held_out``, ``fit_time`` and
+        ``predict_time`` (in seconds).
+    """
+    if fold == TEST_FOLD:
+        (
+            train_inputs,
+            held_out_inputs,
+            train_outputs,
+            held_out_outputs,
+        ) = data.get_test_data()
+    else:
+        (
+            train_inputs,
+            held_out_inputs,
+            train_outputs,
+            held_out_outputs,
+        ) = data.get_train_and_val_data(fold)
+    estimator = estimator_factory()
+    start = perf_counter()
+    estimator.fit(train_inputs, train_outputs)
+    fit_time = perf_counter() - start
+    start = perf_counter()
+    predictions = estimator.predict(held_out_inputs)
+    predict_time = perf_counter() - start
+    return {
+        "fold": fold,
+        "score": metric(held_out_outputs, predictions),
+        "num_train": len(train_inputs),
+        "num_held_out": len(held_out_inputs),
+        "fit_time": fit_time,
+        "predict_time": predict_time,
+    }
+
+
+def evaluate_folds(
+    data,
+    estimator_factory: Callable,
+    metric: Callable,
+    folds: Optional[List[Union[int, str]]] = None,
+    executor: Union[Literal["thread", "process"], Executor] = "thread",
+    n_jobs: Optional[int] = None,
+) -> pd.DataFrame:
+    """Fit and score an estimator on every fold and the final test split concurrently.
+
+    Parameters
+    ----------
+    data : Union[MPTimeSplit, SharedSnapshot]
+        Instance on which :func:`MPTimeSplit.load` or :func:`MPTimeSplit.fetch_data`
+        has been run, or its :func:`MPTimeSplit.to_shared_memory` handle, which is
+        much cheaper to send to worker processes.
+    estimator_factory : Callable
+        See :func:`evaluate_fold`. Must be picklable unless ``executor="thread"``.
+    metric : Callable
+        See :func:`evaluate_fold`. Must be picklable unless ``executor="thread"``.
+    folds : Optional[List[Union[int, str]]]
+        Folds to evaluate. If None, all of ``data.folds`` followed by ``"test"``. By
+        default None.
+    executor : Union[Literal["thread", "process"], Executor]
+        ``"thread"`` or ``"process"`` for a thread or process pool created (and shut
+        down) here, or any :class:`concurrent.futures.Executor` instance, e.g. a
+        :class:`mp_time_split.utils.file_queue.FileQueueExecutor`. By default
+        "thread".
+    n_jobs : Optional[int]
+        Number of workers of a pool created here. If None, one per fold. By default
+        None.
+
+    Returns
+    -------
+    pd.DataFrame
+        One row per fold with the output of :func:`evaluate_fold` as columns, indexed
+        by fold. The mean ``score`` over the integer folds is the cross-validation
+        score and the ``"test"`` row the final score.
+
+    Examples
+    --------
+    >>> from sklearn.dummy import DummyRegressor
+    >>> from sklearn.metrics import mean_absolute_error
+    >>> mpt = MPTimeSplit()
+    >>> mpt.load()
+    >>> scores = evaluate_folds(mpt, DummyRegressor, mean_absolute_error)
+    """
+    if folds is None:
+        folds = list(data.folds) + [TEST_FOLD]
+
+    if isinstance(executor, str):
+        if executor not in AVAILABLE_EXECUTORS:
+            raise ValueError(
+                f"executor={executor} should be one of {AVAILABLE_EXECUTORS} or a `concurrent.futures.Executor`"  # noqa: E501
+            )
+        max_workers = len(folds) if n_jobs is None else get_n_jobs(n_jobs)
+        pool_cls = ThreadPoolExecutor if executor == "thread" else ProcessPoolExecutor
+        with pool_cls(max_workers=max_workers) as pool:
+            return evaluate_folds(data, estimator_factory, metric, folds, pool)
+
+    futures = [
+        executor.submit(evaluate_fold, data, fold, estimator_factory, metric)
+        for fold in folds
+    ]
+    return pd.DataFrame([future.result() for future in futures]).set_index("fold")
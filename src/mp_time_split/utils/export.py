@@ -0,0 +1,163 @@
+from os import path
+from pathlib import Path
+from typing import List, Optional, Tuple, Union
+
+import numpy as np
+from typing_extensions import Literal
+
+from mp_time_split.utils.constants import AVAILABLE_MODES, TEST_FOLD
+
+AVAILABLE_FORMATS = ["npy", "txt"]
+
+
+def get_partition_names(fold: Union[int, str]) -> Tuple[str, str]:
+    """Names of the train and held-out partitions of ``fold``."""
+    return ("train", TEST_FOLD) if fold == TEST_FOLD else ("train", "val")
+
+
+def get_index_path(
+    export_dir: str,
+    mode: str,
+    fold: Union[int, str],
+    partition: str,
+    fmt: Literal["npy", "txt"] = "npy",
+    material_id: bool = False,
+) -> str:
+    """Get the path of an exported index file.
+
+    Returns
+    -------
+    str
+        Path of the form ``"{export_dir}/{mode}/{fold}_{partition}[_material_id].{fmt}"``
+        e.g. ``"splits/TimeSeriesSplit/0_train.npy"`` or
+        ``"splits/TimeKFold/test_test_material_id.txt"``.
+    """  # noqa: E501
+    suffix = "_material_id" if material_id else ""
+    return path.join(export_dir, mode, f"{fold}_{partition}{suffix}.{fmt}")
+
+
+def _save(fpath: str, values: np.ndarray, fmt: str) -> None:
+    if fmt == "npy":
+        np.save(fpath, values)
+    else:
+        np.savetxt(fpath, values, fmt="%s")
+
+
+def export_splits(
+    mpt,
+    export_dir: str,
+    modes: Optional[List[str]] = None,
+    fmt: Literal["npy", "txt"] = "npy",
+) -> List[str]:
+    """Write the positional train/val/test indices and ``material_id``-s of each fold.
+
+    Parameters
+    ----------
+    mpt : MPTimeSplit
+        Instance on which :func:`MPTimeSplit.load` or :func:`MPTimeSplit.fetch_data`
+        has been run.
+    export_dir : str
+        Directory to write to, see :func:`get_index_path` for the layout.
+    modes : Optional[List[str]]
+        Split modes to export. If None, all of :data:`AVAILABLE_MODES`. By default
+        None.
+    fmt : Literal["npy", "txt"]
+        ``"npy"`` for memory-mappable arrays (see :func:`load_split_indices`) or
+        ``"txt"`` for one entry per line. By default "npy".
+
+    Returns
+    -------
+    List[str]
+        Paths of the written files.
+    """
+    from mp_time_split.utils.split import mp_time_split
+
+    if mpt.data is None:
+        raise NameError("`fetch_data()` or `load()` must be run first.")
+    if fmt not in AVAILABLE_FORMATS:
+        raise ValueError(f"fmt={fmt} should be one of {AVAILABLE_FORMATS}")
+    if modes is None:
+        modes = AVAILABLE_MODES
+
+    material_id = mpt.data.material_id
+    if material_id.dtype.kind in "iu":
+        # compact integer IDs, see `MPTimeSplit.load(compact=True)`
+        from mp_time_split.utils.compact import to_material_id_str
+
+        material_id = to_material_id_str(material_id)
+    # fixed-width str array, so that it can be memory-mapped as well
+    material_id = np.array([str(mid) for mid in material_id])
+    fpaths = []
+    for mode in modes:
+        if mode == mpt.mode:
+            trainval_splits, test_split = mpt.trainval_splits, mpt.test_split
+        else:
+            trainval_splits, test_split = mp_time_split(
+                mpt.data, n_cv_splits=len(mpt.folds), mode=mode
+            )
+        Path(export_dir, mode).mkdir(exist_ok=True, parents=True)
+        splits = dict(zip(mpt.folds, trainval_splits))
+        splits[TEST_FOLD] = test_split
+        for fold, split in splits.items():
+            for partition, index in zip(get_partition_names(fold), split):
+                index = np.asarray(index, dtype=np.int64)
+                for is_mid, values in [(False, index), (True, material_id[index])]:
+                    fpath = get_index_path(
+                        export_dir, mode, fold, partition, fmt=fmt, material_id=is_mid
+                    )
+                    _save(fpath, values, fmt)
+                    fpaths.append(fpath)
+    return fpaths
+
+
+def load_split_indices(
+    export_dir: str,
+    mode: str = "TimeSeriesSplit",
+    fold: Union[int, str] = 0,
+    material_id: bool = False,
+    mmap: bool = True,
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Load indices written by :func:`export_splits`, e.g. from a worker process.
+
+    Only numpy is imported, and ``.npy`` files are memory-mapped by default, so this
+    is cheap even for many short-lived processes.
+
+    Parameters
+    ----------
+    export_dir : str
+        Directory passed to :func:`export_splits`.
+    mode : str
+        Split mode, one of :data:`AVAILABLE_MODES`, by default "TimeSeriesSplit".
+    fold : Union[int, str]
+        Integer fold (train and validation indices) or ``"test"`` (train and test
+        indices), by default 0.
+    material_id : bool
+        Whether to load ``material_id``-s instead of positional indices, by default
+        False.
+    mmap : bool
+        Whether to memory-map ``.npy`` files, by default True.
+
+    Returns
+    -------
+    Tuple[np.ndarray, np.ndarray]
+        Train and held-out (val or test) indices or ``material_id``-s.
+    """
+    if mode not in AVAILABLE_MODES:
+        raise NotImplementedError(
+            f"mode={mode} not implemented. Use one of {AVAILABLE_MODES}"
+        )
+    arrays = []
+    for partition in get_partition_names(fold):
+        fpath = get_index_path(
+            export_dir, mode, fold, partition, material_id=material_id
+        )
+        if path.isfile(fpath):
+            arrays.append(np.load(fpath, mmap_mode="r" if mmap else None))
+        else:
+            fpath = get_index_path(
+                export_dir, mode, fold, partition, fmt="txt", material_id=material_id
+            )
+            arrays.append(
+                np.loadtxt(fpath, dtype=str if material_id else np.int64, ndmin=1)
+            )
+    return arrays[0], arrays[1]
@@ -0,0 +1,159 @@
+import pickle
+import socket
+import threading
+from concurrent.futures import Executor, Future
+from os import getpid, listdir, path, remove, rename
+from pathlib import Path
+from time import monotonic, sleep
+from typing import Dict, Optional
+from uuid import uuid4
+
+from mp_time_split.utils.data import atomic_write
+
+TASK_DIR = "tasks"
+RESULT_DIR = "results"
+
+
+def _dump_atomic(obj, fpath: str) -> None:
+    # temporary files contain a "." and are therefore never claimed by workers
+    with atomic_write(fpath) as f:
+        pickle.dump(obj, f)
+
+
+class FileQueueExecutor(Executor):
+    def __init__(self, queue_dir: str, poll_interval: float = 1.0) -> None:
+        """Executor that hands tasks to workers through files in a shared directory.
+
+        A stand-in for a cluster scheduler: tasks are pickled into
+        ``{queue_dir}/tasks`` and picked up by any number of
+        :func:`run_file_queue_worker` processes, e.g. one per node of a batch job,
+        which write their results to ``{queue_dir}/results``. ``fn`` and its
+        arguments must be picklable.
+
+        Parameters
+        ----------
+        queue_dir : str
+            Directory visible to the submitting process and all workers.
+        poll_interval : float
+            Seconds between checks for new results, by default 1.0.
+
+        Examples
+        --------
+        >>> executor = FileQueueExecutor("/shared/queue")
+        >>> future = executor.submit(pow, 2, 10)
+        On each node:
+        >>> run_file_queue_worker("/shared/queue")
+        """
+        self.queue_dir = queue_dir
+        self.poll_interval = poll_interval
+        Path(queue_dir, TASK_DIR).mkdir(exist_ok=True, parents=True)
+        Path(queue_dir, RESULT_DIR).mkdir(exist_ok=True, parents=True)
+        self._futures: Dict[str, Future] = {}
+        self._lock = threading.Lock()
+        self._poller: Optional[threading.Thread] = None
+        self._shutdown = False
+
+    def submit(self, fn, *args, **kwargs) -> Future:
+        if self._shutdown:
+            raise RuntimeError("cannot schedule new futures after shutdown")
+        task_id = uuid4().hex
+        future: Future = Future()
+        with self._lock:
+            self._futures[task_id] = future
+            _dump_atomic(
+                (fn, args, kwargs), path.join(self.queue_dir, TASK_DIR, task_id)
+            )
+            if self._poller is None or not self._poller.is_alive():
+                self._poller = threading.Thread(target=self._poll, daemon=True)
+                self._poller.start()
+        return future
+
+    def _poll(self) -> None:
+        while True:
+            with self._lock:
+                if not self._futures:
+                    self._poller = None
+                    return
+                task_ids = list(self._futures)
+            for task_id in task_ids:
+                result_path = path.join(self.queue_dir, RESULT_DIR, task_id)
+                if not path.isfile(result_path):
+                    continue
+                with open(result_path, "rb") as f:
+                    ok, value = pickle.load(f)
+                remove(result_path)
+                with self._lock:
+                    future = self._futures.pop(task_id)
+                if future.cancelled():
+                    continue
+                if ok:
+                    future.set_result(value)
+                else:
+                    future.set_exception(value)
+            sleep(self.poll_interval)
+
+    def shutdown(self, wait: bool = True, **kwargs) -> None:
+        self._shutdown = True
+        poller = self._poller
+        if wait and poller is not None:
+            poller.join()
+
+
+def run_file_queue_worker(
+    queue_dir: str,
+    poll_interval: float = 1.0,
+    max_tasks: Optional[int] = None,
+    idle_timeout: Optional[float] = None,
+) -> int:
+    """Run tasks submitted through a :class:`FileQueueExecutor`.
+
+    Tasks are claimed by atomically renaming their file, so several workers can share
+    one queue.
+
+    Parameters
+    ----------
+    queue_dir : str
+        Directory passed to :class:`FileQueueExecutor`.
+    poll_interval : float
+        Seconds between checks for new tasks, by default 1.0.
+    max_tasks : Optional[int]
+        Return after running this many tasks. If None, no limit. By default None.
+    idle_timeout : Optional[float]
+        Return after this many seconds without any task. If None, wait forever. By
+        default None.
+
+    Returns
+    -------
+    int
+        Number of tasks run.
+    """
+    task_dir = path.join(queue_dir, TASK_DIR)
+    result_dir = path.join(queue_dir, RESULT_DIR)
+    worker_id = f"{socket.gethostname()}-{getpid()}"
+    num_tasks = 0
+    last_active = monotonic()
+    while max_tasks is None or num_tasks < max_tasks:
+        task_ids = sorted(name for name in listdir(task_dir) if "." not in name)
+        for task_id in task_ids:
+            claimed_path = path.join(task_dir, f"{task_id}.{worker_id}")
+            try:
+                rename(path.join(task_dir, task_id), claimed_path)
+            except OSError:
+                # claimed by another worker in the meantime
+                continue
+            with open(claimed_path, "rb") as f:
+                fn, args, kwargs = pickle.load(f)
+            try:
+                result = (True, fn(*args, **kwargs))
+            except Exception as e:
+                result = (False, e)
+            _dump_atomic(result, path.join(result_dir, task_id))
+            remove(claimed_path)
+            num_tasks += 1
+            last_active = monotonic()
+            break
+        else:
+            if idle_timeout is not None and monotonic() - last_active > idle_timeout:
+                break
+            sleep(poll_interval)
+    return num_tasks
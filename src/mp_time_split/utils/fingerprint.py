@@ -0,0 +1,166 @@
+from collections import defaultdict
+from functools import partial
+from hashlib import sha1
+from typing import List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+from pymatgen.core import Structure
+from pymatgen.symmetry.analyzer import SpacegroupAnalyzer
+
+from mp_time_split.utils.data import load_or_compute_sidecar
+from mp_time_split.utils.parallel import parallel_map
+from mp_time_split.utils.symmetry import SYMMETRY_ERRORS, get_dataset_value
+
+
+def get_fingerprint(structure: Structure, symprec: float = 0.1) -> str:
+    """Get a canonical, symmetry-invariant fingerprint of a structure.
+
+    The fingerprint is the reduced formula followed by a hash of the spacegroup number
+    and the (species, site symmetry, multiplicity in the primitive cell) of each
+    symmetrically distinct site. It does not depend on the choice of cell, origin or
+    site ordering, and near-identical entries (e.g. the same polymorph relaxed
+    slightly differently) share a fingerprint, so matching fingerprints flag likely
+    duplicates without any pairwise structure comparisons.
+
+    Parameters
+    ----------
+    structure : Structure
+        Structure to fingerprint.
+    symprec : float
+        Symmetry tolerance passed to :class:`SpacegroupAnalyzer`, by default 0.1.
+
+    Returns
+    -------
+    str
+        Fingerprint of the form ``"{reduced_formula}:{hash}"``, e.g. ``"VN:3f6b..."``.
+        If the symmetry analysis fails, the spacegroup is treated as P1.
+    """
+    formula = structure.composition.reduced_formula
+    species = [str(sp) for sp in structure.species]
+    try:
+        dataset = SpacegroupAnalyzer(structure, symprec=symprec).get_symmetry_dataset()
+    except SYMMETRY_ERRORS:
+        number = 1
+        site_symmetries = ["1"] * len(structure)
+        orbits = range(len(structure))
+        primitive = range(len(structure))
+    else:
+        number = get_dataset_value(dataset, "number")
+        site_symmetries = get_dataset_value(dataset, "site_symmetry_symbols")
+        orbits = get_dataset_value(dataset, "equivalent_atoms")
+        primitive = get_dataset_value(dataset, "mapping_to_primitive")
+
+    orbit_sites = defaultdict(set)
+    for orbit, prim in zip(orbits, primitive):
+        orbit_sites[orbit].add(prim)
+    descriptor = sorted(
+        (species[orbit], site_symmetries[orbit], len(prim_sites))
+        for orbit, prim_sites in orbit_sites.items()
+    )
+    digest = sha1(f"{number}{descriptor}".encode()).hexdigest()[:16]
+    return f"{formula}:{digest}"
+
+
+def get_fingerprints(
+    structures: Sequence[Structure], symprec: float = 0.1, n_jobs: Optional[int] = None
+) -> List[str]:
+    """Compute :func:`get_fingerprint` for many structures across a process pool."""
+    return parallel_map(
+        partial(get_fingerprint, symprec=symprec),
+        structures,
+        n_jobs=n_jobs,
+    )
+
+
+def load_or_compute_fingerprints(
+    structures: pd.Series,
+    data_path: Optional[str] = None,
+    checksum: Optional[str] = None,
+    symprec: float = 0.1,
+    n_jobs: Optional[int] = None,
+) -> pd.Series:
+    """Load fingerprints stored next to a snapshot, computing and storing if absent.
+
+    Parameters
+    ----------
+    structures : pd.Series
+        Structures of the snapshot, e.g. ``mpt.data.structure``.
+    data_path : Optional[str]
+        Path to the snapshot. If None (e.g. for freshly fetched data), fingerprints
+        are computed but not stored. By default None.
+    checksum : Optional[str]
+        Checksum of the snapshot, by default None.
+    symprec : float
+        See :func:`get_fingerprint`, by default 0.1.
+    n_jobs : Optional[int]
+        See :func:`parallel_map`, by default None.
+
+    Returns
+    -------
+    pd.Series
+        Fingerprints with the same index as ``structures``.
+    """
+    stored = load_or_compute_sidecar(
+        lambda: {
+            "index": structures.index.tolist(),
+            "fingerprint": get_fingerprints(
+                structures.tolist(), symprec=symprec, n_jobs=n_jobs
+            ),
+        },
+        data_path,
+        checksum,
+        "fingerprint",
+        symprec=symprec,
+    )
+    return pd.Series(
+        stored["fingerprint"], index=stored["index"], name="fingerprint"
+    ).loc[structures.index]
+
+
+def get_leakage_report(
+    fingerprints: pd.Series,
+    material_id: pd.Series,
+    split: Tuple[np.ndarray, np.ndarray],
+    held_out_name: str = "val",
+) -> pd.DataFrame:
+    """Group entries that share a fingerprint across the partitions of a split.
+
+    Parameters
+    ----------
+    fingerprints : pd.Series
+        Fingerprint of every entry, see :func:`load_or_compute_fingerprints`.
+    material_id : pd.Series
+        Materials Project ID of every entry, aligned with ``fingerprints``.
+    split : Tuple[np.ndarray, np.ndarray]
+        Positional train and held-out indices, e.g. ``mpt.trainval_splits[fold]``.
+    held_out_name : str
+        Name of the held-out partition in the report, by default "val".
+
+    Returns
+    -------
+    pd.DataFrame
+        One row per leaked fingerprint, i.e. fingerprints occurring in both
+        partitions, with the list of ``material_id``-s in each partition as columns
+        ``"train"`` and ``held_out_name``. Empty if there is no leakage.
+    """
+    train_index, held_out_index = split
+    positions = np.concatenate((train_index, held_out_index))
+    df = pd.DataFrame(
+        {
+            "fingerprint": fingerprints.iloc[positions].values,
+            "partition": ["train"] * len(train_index)
+            + [held_out_name] * len(held_out_index),
+            "material_id": material_id.iloc[positions].values,
+        }
+    )
+    leaked = df.groupby("fingerprint")["partition"].transform("nunique") > 1
+    report = (
+        df[leaked]
+        .groupby(["fingerprint", "partition"])["material_id"]
+        .agg(list)
+        .unstack("partition")
+        .reindex(columns=["train", held_out_name])
+    )
+    report.columns.name = None
+    return report
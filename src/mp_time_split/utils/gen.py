@@ -1,23 +1,184 @@
-try:
-    from pyxtal import pyxtal
-except ImportError as e:
-    print(e)
-    print(
-        "Failed to import pyxtal. Try `pip install mp_time_split[pyxtal]` or `pip install pyxtal`"  # noqa: E501
-    )
+from concurrent.futures import ProcessPoolExecutor
+from itertools import product
+from os import path
+from pathlib import Path
+from typing import Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+from monty.serialization import dumpfn
+
+from mp_time_split.utils.parallel import get_n_jobs
+
+BATCH_NAME = "gen_batch_{:06d}.json.gz"
+
+
+def _gen_batch(task: Tuple) -> List:
+    """Generate one batch of random structures with its own random state.
+
+    Returns the structures, or the path of the file they were written to if
+    ``save_dir`` is given and ``return_structures`` is False.
+    """
+    try:
+        from pyxtal import pyxtal
+        from pyxtal.msg import Error as PyxtalError
+    except ImportError as e:
+        raise ImportError(
+            "Failed to import pyxtal. Try `pip install mp_time_split[pyxtal]` or `pip install pyxtal`"  # noqa: E501
+        ) from e
+
+    batch_id, n, grid, seed, max_attempts, save_dir, return_structures = task
+    rng = np.random.default_rng(seed)
+    crystal = pyxtal()
+    structures = []
+    while len(structures) < n:
+        for _ in range(max_attempts):
+            species, num_ions, group = grid[rng.integers(len(grid))]
+            try:
+                crystal.from_random(3, group, species, num_ions, random_state=rng)
+            except (PyxtalError, RuntimeError):
+                # incompatible composition/spacegroup or volume, or no valid structure
+                # within pyxtal's own attempts ("long time to generate structure")
+                continue
+            if crystal.valid:
+                structures.append(crystal.to_pymatgen())
+                break
+        else:
+            raise RuntimeError(
+                f"pyxtal failed to generate a valid structure in {max_attempts} attempts for the composition/spacegroup grid {grid}"  # noqa: E501
+            )
+
+    if save_dir is not None:
+        fpath = path.join(save_dir, BATCH_NAME.format(batch_id))
+        dumpfn(structures, fpath)
+        if not return_structures:
+            return fpath
+    return structures
 
 
 class DummyGenerator:
-    def __init__(self):
-        pass
+    def __init__(
+        self,
+        compositions: Sequence[Tuple[Sequence[str], Sequence[int]]] = (
+            (["Ba", "Ti", "O"], [1, 1, 3]),
+        ),
+        spacegroups: Sequence[int] = (99,),
+        seed: Optional[int] = None,
+        max_attempts: int = 10,
+    ):
+        """Random structure baseline based on ``pyxtal``.
+
+        Parameters
+        ----------
+        compositions : Sequence[Tuple[Sequence[str], Sequence[int]]]
+            Compositions as ``(species, num_ions)`` pairs, e.g. ``(["Ba", "Ti", "O"],
+            [1, 1, 3])``. By default BaTiO3 only.
+        spacegroups : Sequence[int]
+            International spacegroup numbers. Each structure is generated from a
+            random point of the ``compositions`` x ``spacegroups`` grid. By default
+            ``(99,)``.
+        seed : Optional[int]
+            Seed from which an independent seed is spawned per batch, so results are
+            reproducible regardless of the number of workers. By default None.
+        max_attempts : int
+            Number of grid points to try per structure before giving up (some
+            compositions are incompatible with some spacegroups), by default 10.
+        """
+        self.grid = [
+            (list(species), list(num_ions), group)
+            for (species, num_ions), group in product(compositions, spacegroups)
+        ]
+        self.seed = seed
+        self.max_attempts = max_attempts
 
     def fit(self, inputs):
         inputs
 
     def gen(self, n=100):
-        crystal = pyxtal()
-        structures = []
-        for _ in range(n):
-            crystal.from_random(3, 99, ["Ba", "Ti", "O"], [1, 1, 3])
-            structures.append(crystal.to_pymatgen())
-        return structures
+        return _gen_batch((0, n, self.grid, self.seed, self.max_attempts, None, True))
+
+    def _iter_batches(self, n, batch_size, n_jobs, save_dir, return_structures):
+        n_batches = -(-n // batch_size)
+        seeds = np.random.SeedSequence(self.seed).spawn(n_batches)
+        if save_dir is not None:
+            Path(save_dir).mkdir(exist_ok=True, parents=True)
+        tasks = (
+            (
+                i,
+                min(batch_size, n - i * batch_size),
+                self.grid,
+                seeds[i],
+                self.max_attempts,
+                save_dir,
+                return_structures,
+            )
+            for i in range(n_batches)
+        )
+
+        n_jobs = get_n_jobs(n_jobs)
+        if n_jobs == 1:
+            yield from map(_gen_batch, tasks)
+            return
+
+        # keep a bounded number of batches in flight so that memory does not grow
+        # with `n` when the consumer is slower than the workers
+        with ProcessPoolExecutor(max_workers=n_jobs) as executor:
+            futures = []
+            for task in tasks:
+                futures.append(executor.submit(_gen_batch, task))
+                if len(futures) >= 2 * n_jobs:
+                    yield futures.pop(0).result()
+            for future in futures:
+                yield future.result()
+
+    def gen_batches(
+        self,
+        n: int,
+        batch_size: int = 1000,
+        n_jobs: Optional[int] = None,
+        save_dir: Optional[str] = None,
+    ) -> Iterator[List]:
+        """Generate ``n`` structures in batches, optionally across processes.
+
+        Parameters
+        ----------
+        n : int
+            Total number of structures.
+        batch_size : int
+            Number of structures per batch, by default 1000.
+        n_jobs : Optional[int]
+            Number of worker processes, see :func:`parallel_map`. By default None.
+        save_dir : Optional[str]
+            If not None, each batch is also written to
+            ``{save_dir}/gen_batch_{batch_id:06d}.json.gz`` as soon as it is
+            generated. By default None.
+
+        Yields
+        ------
+        List[Structure]
+            Batches of structures, in order.
+
+        Examples
+        --------
+        >>> gen = DummyGenerator(
+        ...     compositions=[(["Ba", "Ti", "O"], [1, 1, 3]), (["Sr", "O"], [1, 1])],
+        ...     spacegroups=[99, 221],
+        ...     seed=42,
+        ... )
+        >>> for structures in gen.gen_batches(10_000, n_jobs=-1):
+        ...     ...
+        """
+        return self._iter_batches(n, batch_size, n_jobs, save_dir, True)
+
+    def gen_to_disk(
+        self,
+        n: int,
+        save_dir: str,
+        batch_size: int = 1000,
+        n_jobs: Optional[int] = None,
+    ) -> List[str]:
+        """Like :func:`gen_batches`, but only write to disk and return the file paths.
+
+        Structures are not sent back to the main process, so memory use does not
+        depend on ``n``. Load a batch via ``monty.serialization.loadfn(fpath)``.
+        """
+        return list(self._iter_batches(n, batch_size, n_jobs, save_dir, False))
@@ -0,0 +1,239 @@
+from functools import partial
+from typing import Dict, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+from pymatgen.core import Structure
+
+from mp_time_split.utils.data import atomic_write, load_or_compute_sidecar
+from mp_time_split.utils.parallel import parallel_map
+
+EDGE_ARRAYS = ["center", "neighbor", "image", "distance"]
+
+
+def get_neighbor_list(
+    structure: Structure, cutoff: float = 8.0, max_num_nbr: Optional[int] = 12
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """Get the neighbor list of a structure, keeping the nearest neighbors per site.
+
+    Parameters
+    ----------
+    structure : Structure
+        Structure to get the neighbor list for.
+    cutoff : float
+        Cutoff radius in Angstrom, by default 8.0.
+    max_num_nbr : Optional[int]
+        Maximum number of neighbors per site, closest first. If None, all neighbors
+        within ``cutoff`` are kept. By default 12.
+
+    Returns
+    -------
+    center, neighbor, image, distance : Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]
+        Site indices of the center and neighbor atoms, periodic image of the
+        neighbor and distance, sorted by center and then by distance.
+    """  # noqa: E501
+    center, neighbor, image, distance = structure.get_neighbor_list(cutoff)
+    order = np.lexsort((distance, center))
+    center, neighbor, image, distance = (
+        center[order],
+        neighbor[order],
+        image[order],
+        distance[order],
+    )
+    if max_num_nbr is not None and len(center) > 0:
+        # rank of each edge among the edges of its center
+        starts = np.flatnonzero(np.r_[True, center[1:] != center[:-1]])
+        counts = np.diff(np.r_[starts, len(center)])
+        rank = np.arange(len(center)) - np.repeat(starts, counts)
+        keep = rank < max_num_nbr
+        center, neighbor, image, distance = (
+            center[keep],
+            neighbor[keep],
+            image[keep],
+            distance[keep],
+        )
+    return (
+        center.astype(np.int32),
+        neighbor.astype(np.int32),
+        image.astype(np.int8),
+        distance.astype(np.float32),
+    )
+
+
+class NeighborGraphs:
+    def __init__(
+        self,
+        index: np.ndarray,
+        num_sites: np.ndarray,
+        edge_ptr: np.ndarray,
+        center: np.ndarray,
+        neighbor: np.ndarray,
+        image: np.ndarray,
+        distance: np.ndarray,
+        cutoff: float,
+        max_num_nbr: Optional[int],
+    ) -> None:
+        """Neighbor lists of many structures stored as flat CSR-style arrays.
+
+        The edges of the ``i``-th structure are ``edge_ptr[i]:edge_ptr[i + 1]`` of
+        ``center``, ``neighbor``, ``image`` and ``distance``. Site indices are local
+        to each structure.
+
+        Parameters
+        ----------
+        index : np.ndarray
+            Index (e.g. of ``mpt.data``) of each structure.
+        num_sites : np.ndarray
+            Number of sites of each structure.
+        edge_ptr : np.ndarray
+            Offsets of the edges of each structure, of length ``len(index) + 1``.
+        center, neighbor, image, distance : np.ndarray
+            Concatenated output of :func:`get_neighbor_list` for every structure.
+        cutoff : float
+            Cutoff radius used for the neighbor lists.
+        max_num_nbr : Optional[int]
+            Maximum number of neighbors per site used for the neighbor lists.
+        """
+        self.index = index
+        self.num_sites = num_sites
+        self.edge_ptr = edge_ptr
+        self.center = center
+        self.neighbor = neighbor
+        self.image = image
+        self.distance = distance
+        self.cutoff = cutoff
+        self.max_num_nbr = max_num_nbr
+
+    def __len__(self) -> int:
+        return len(self.index)
+
+    def __getitem__(self, i: int) -> Dict[str, np.ndarray]:
+        """Get the edge arrays of the ``i``-th structure (views, not copies)."""
+        start, stop = self.edge_ptr[i], self.edge_ptr[i + 1]
+        return {name: getattr(self, name)[start:stop] for name in EDGE_ARRAYS}
+
+    def take(self, positions: Sequence[int]) -> "NeighborGraphs":
+        """Select structures by position, e.g. with ``mpt.trainval_splits[fold][0]``."""
+        positions = np.asarray(positions, dtype=np.int64)
+        starts = self.edge_ptr[positions]
+        counts = self.edge_ptr[positions + 1] - starts
+        edge_ptr = np.zeros(len(positions) + 1, dtype=np.int64)
+        np.cumsum(counts, out=edge_ptr[1:])
+        edges = np.arange(edge_ptr[-1]) + np.repeat(starts - edge_ptr[:-1], counts)
+        return NeighborGraphs(
+            self.index[positions],
+            self.num_sites[positions],
+            edge_ptr,
+            *[getattr(self, name)[edges] for name in EDGE_ARRAYS],
+            cutoff=self.cutoff,
+            max_num_nbr=self.max_num_nbr,
+        )
+
+    def save(self, fpath: str) -> None:
+        """Save to an uncompressed ``.npz`` file."""
+        with atomic_write(fpath) as f:
+            np.savez(
+                f,
+                index=self.index,
+                num_sites=self.num_sites,
+                edge_ptr=self.edge_ptr,
+                cutoff=self.cutoff,
+                max_num_nbr=-1 if self.max_num_nbr is None else self.max_num_nbr,
+                **{name: getattr(self, name) for name in EDGE_ARRAYS},
+            )
+
+    @classmethod
+    def load(cls, fpath: str) -> "NeighborGraphs":
+        with np.load(fpath) as arrays:
+            max_num_nbr = int(arrays["max_num_nbr"])
+            return cls(
+                arrays["index"],
+                arrays["num_sites"],
+                arrays["edge_ptr"],
+                *[arrays[name] for name in EDGE_ARRAYS],
+                cutoff=float(arrays["cutoff"]),
+                max_num_nbr=None if max_num_nbr < 0 else max_num_nbr,
+            )
+
+    @classmethod
+    def from_structures(
+        cls,
+        structures: pd.Series,
+        cutoff: float = 8.0,
+        max_num_nbr: Optional[int] = 12,
+        n_jobs: Optional[int] = None,
+    ) -> "NeighborGraphs":
+        """Compute :func:`get_neighbor_list` for many structures across processes."""
+        neighbor_lists = parallel_map(
+            partial(get_neighbor_list, cutoff=cutoff, max_num_nbr=max_num_nbr),
+            structures.tolist(),
+            n_jobs=n_jobs,
+        )
+        counts = [len(nl[0]) for nl in neighbor_lists]
+        edge_ptr = np.zeros(len(counts) + 1, dtype=np.int64)
+        np.cumsum(counts, out=edge_ptr[1:])
+        edges = [
+            np.concatenate([nl[i] for nl in neighbor_lists])
+            if neighbor_lists
+            else np.empty(0)
+            for i in range(len(EDGE_ARRAYS))
+        ]
+        return cls(
+            np.asarray(structures.index),
+            np.array([len(s) for s in structures], dtype=np.int32),
+            edge_ptr,
+            *edges,
+            cutoff=cutoff,
+            max_num_nbr=max_num_nbr,
+        )
+
+
+def load_or_compute_neighbor_graphs(
+    structures: pd.Series,
+    data_path: Optional[str] = None,
+    checksum: Optional[str] = None,
+    cutoff: float = 8.0,
+    max_num_nbr: Optional[int] = 12,
+    n_jobs: Optional[int] = None,
+) -> NeighborGraphs:
+    """Load neighbor lists stored next to a snapshot, computing and storing if absent.
+
+    Parameters
+    ----------
+    structures : pd.Series
+        Structures of the snapshot, e.g. ``mpt.data.structure``.
+    data_path : Optional[str]
+        Path to the snapshot. If None (e.g. for freshly fetched data), neighbor lists
+        are computed but not stored. By default None.
+    checksum : Optional[str]
+        Checksum of the snapshot, by default None.
+    cutoff : float
+        See :func:`get_neighbor_list`, by default 8.0.
+    max_num_nbr : Optional[int]
+        See :func:`get_neighbor_list`, by default 12.
+    n_jobs : Optional[int]
+        See :func:`parallel_map`, by default None.
+
+    Returns
+    -------
+    NeighborGraphs
+        Neighbor lists in the same order as ``structures``.
+    """
+    graphs = load_or_compute_sidecar(
+        lambda: NeighborGraphs.from_structures(
+            structures, cutoff=cutoff, max_num_nbr=max_num_nbr, n_jobs=n_jobs
+        ),
+        data_path,
+        checksum,
+        "neighbors",
+        ext=".npz",
+        load=NeighborGraphs.load,
+        save=NeighborGraphs.save,
+        cutoff=cutoff,
+        max_num_nbr=max_num_nbr,
+    )
+    positions = pd.Index(graphs.index).get_indexer(structures.index)
+    if (positions < 0).any():
+        missing = structures.index[positions < 0].tolist()
+        raise KeyError(f"{missing} not in the stored neighbor lists")
+    return graphs.take(positions)
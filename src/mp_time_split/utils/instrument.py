@@ -0,0 +1,173 @@
+import json
+import threading
+import tracemalloc
+from contextlib import contextmanager
+from contextvars import ContextVar
+from time import perf_counter, time
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+try:
+    import resource
+except ImportError:  # pragma: no cover, e.g. Windows
+    resource = None
+
+PHASES = [
+    "download",
+    "verify",
+    "decompress",
+    "decode",
+    "filter",
+    "split",
+    "summary_search",
+    "provenance_fetch",
+    "bibtex_parse",
+    "request",
+    "store_add",
+    "store_load",
+]
+
+_hooks: List[Callable[[dict], None]] = []
+# records of the enclosing phases, local to each thread and asyncio task so that
+# phases of concurrent coroutines on the same event loop don't nest into each other
+_stack: ContextVar[Tuple[dict, ...]] = ContextVar("phase_stack", default=())
+
+
+def add_hook(hook: Callable[[dict], None]) -> None:
+    """Register a callable that receives the record of every finished phase.
+
+    A record is a dict with at least ``"phase"``, ``"start"`` (UNIX time) and
+    ``"wall_time"`` (seconds), and where applicable ``"bytes"``, ``"items"``,
+    ``"peak_memory"`` (bytes allocated by Python during the phase, only while
+    :mod:`tracemalloc` is tracing) and ``"max_rss"`` (peak resident set size of the
+    process so far, in kilobytes on Linux). Hooks may be called from worker threads.
+    """
+    _hooks.append(hook)
+
+
+def remove_hook(hook: Callable[[dict], None]) -> None:
+    _hooks.remove(hook)
+
+
+@contextmanager
+def phase(name: str, **info) -> Iterator[dict]:
+    """Time a phase and pass its record to the registered hooks.
+
+    Yields the record so that the instrumented code can add e.g. ``"bytes"`` or
+    ``"items"``. Does next to nothing if no hook is registered.
+
+    Examples
+    --------
+    >>> with phase("decode", bytes=nbytes) as record:
+    ...     df = decode(data)
+    ...     record["items"] = len(df)
+    """
+    record = {"phase": name, **info}
+    if not _hooks:
+        yield record
+        return
+
+    stack = _stack.get()
+    tracing = tracemalloc.is_tracing()
+    if tracing:
+        # the peak so far belongs to the enclosing phase
+        peak = tracemalloc.get_traced_memory()[1]
+        if stack:
+            stack[-1]["peak_memory"] = max(stack[-1].get("peak_memory", 0), peak)
+        if hasattr(tracemalloc, "reset_peak"):
+            tracemalloc.reset_peak()
+        record["peak_memory"] = 0
+    token = _stack.set(stack + (record,))
+    record["start"] = time()
+    start = perf_counter()
+    try:
+        yield record
+    finally:
+        record["wall_time"] = perf_counter() - start
+        _stack.reset(token)
+        if tracing and tracemalloc.is_tracing():
+            peak = max(record["peak_memory"], tracemalloc.get_traced_memory()[1])
+            record["peak_memory"] = peak
+            if stack:
+                stack[-1]["peak_memory"] = max(stack[-1].get("peak_memory", 0), peak)
+        if resource is not None:
+            record["max_rss"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        for hook in list(_hooks):
+            hook(record)
+
+
+class Collector:
+    def __init__(self, trace_memory: bool = False) -> None:
+        """Built-in hook collecting the records of all phases of a run.
+
+        Parameters
+        ----------
+        trace_memory : bool
+            Whether to run :mod:`tracemalloc` while registered (see :func:`collect`),
+            which records the peak memory of each phase at the cost of slowing down
+            allocations. By default False.
+        """
+        self.trace_memory = trace_memory
+        self.records: List[dict] = []
+        self._lock = threading.Lock()
+
+    def __call__(self, record: dict) -> None:
+        with self._lock:
+            self.records.append(dict(record))
+
+    def summary(self) -> Dict[str, dict]:
+        """Aggregate the records per phase.
+
+        Returns
+        -------
+        Dict[str, dict]
+            For each phase, the ``"count"``, total ``"wall_time"``, ``"bytes"`` and
+            ``"items"`` and the maximum ``"peak_memory"`` (where recorded).
+        """
+        summary: Dict[str, dict] = {}
+        for record in self.records:
+            agg = summary.setdefault(record["phase"], {"count": 0, "wall_time": 0.0})
+            agg["count"] += 1
+            agg["wall_time"] += record["wall_time"]
+            for key in ["bytes", "items"]:
+                if key in record:
+                    agg[key] = agg.get(key, 0) + record[key]
+            if "peak_memory" in record:
+                agg["peak_memory"] = max(
+                    agg.get("peak_memory", 0), record["peak_memory"]
+                )
+        return summary
+
+    def to_json(self, fpath: Optional[str] = None) -> str:
+        """Export records and :func:`summary` as JSON, optionally to a file."""
+        with self._lock:
+            records = list(self.records)
+        out = json.dumps(
+            {"records": records, "summary": self.summary()}, indent=2, default=str
+        )
+        if fpath is not None:
+            with open(fpath, "w") as f:
+                f.write(out)
+        return out
+
+
+@contextmanager
+def collect(trace_memory: bool = False) -> Iterator[Collector]:
+    """Register a :class:`Collector` for the duration of the ``with`` block.
+
+    Examples
+    --------
+    >>> with collect(trace_memory=True) as collector:
+    ...     mpt.load()
+    >>> collector.to_json("load_metrics.json")
+    """
+    collector = Collector(trace_memory=trace_memory)
+    started_tracing = trace_memory and not tracemalloc.is_tracing()
+    if started_tracing:
+        tracemalloc.start()
+    add_hook(collector)
+    try:
+        yield collector
+    finally:
+        remove_hook(collector)
+        if started_tracing:
+            tracemalloc.stop()
@@ -0,0 +1,289 @@
+from collections import defaultdict
+from functools import partial
+from typing import Dict, Hashable, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+import pandas as pd
+from pymatgen.analysis.structure_matcher import StructureMatcher
+from pymatgen.core import Structure
+from pymatgen.symmetry.analyzer import SpacegroupAnalyzer
+
+from mp_time_split.utils.constants import TEST_FOLD
+from mp_time_split.utils.parallel import parallel_map
+from mp_time_split.utils.symmetry import SYMMETRY_ERRORS, get_dataset_value
+
+# `StructureMatcher` defaults that bucketing relies on: with other values, entries
+# with different reduced formulas, spacegroups or primitive cells can match
+BUCKET_MATCHER_DEFAULTS = {
+    "primitive_cell": True,
+    "attempt_supercell": False,
+    "allow_subset": False,
+    "comparator": None,
+    "ignored_species": (),
+}
+
+
+def get_bucket_key(structure: Structure, symprec: Optional[float] = 0.1) -> Tuple:
+    """Get the key of the bucket that `structure` is matched within.
+
+    The key is the reduced formula, optionally followed by the spacegroup number and
+    the number of sites in the primitive cell (i.e. a lattice bucket). Two structures
+    with different reduced formulas never match under the default
+    :class:`StructureMatcher` comparator, so the formula part of the key is exact. The
+    spacegroup and lattice parts depend on ``symprec`` and trade a small amount of
+    recall for far fewer :func:`StructureMatcher.fit` calls.
+
+    Parameters
+    ----------
+    structure : Structure
+        Structure to get the bucket key for.
+    symprec : Optional[float]
+        Symmetry tolerance passed to :class:`SpacegroupAnalyzer`. If None, only the
+        reduced formula is used. By default 0.1.
+
+    Returns
+    -------
+    Tuple
+        ``(reduced_formula,)`` if ``symprec is None``, otherwise ``(reduced_formula,
+        spacegroup_number, num_primitive_sites)``. The last two entries are None if
+        the symmetry analysis failed.
+    """
+    formula = structure.composition.reduced_formula
+    if symprec is None:
+        return (formula,)
+    try:
+        dataset = SpacegroupAnalyzer(structure, symprec=symprec).get_symmetry_dataset()
+    except SYMMETRY_ERRORS:
+        return (formula, None, None)
+    number = int(get_dataset_value(dataset, "number"))
+    mapping = get_dataset_value(dataset, "mapping_to_primitive")
+    return (formula, number, len(set(mapping)))
+
+
+def _is_default(value, default) -> bool:
+    if default is None:
+        return value is None
+    if isinstance(default, tuple):
+        return len(value) == 0
+    return value == default
+
+
+def _match_bucket(task: Tuple[List[Structure], List[Structure], dict]) -> List[int]:
+    """Return positions of the references in a bucket matched by any candidate."""
+    references, candidates, matcher_kwargs = task
+    sm = StructureMatcher(**matcher_kwargs)
+    matched = []
+    for i, ref in enumerate(references):
+        for cand in candidates:
+            if sm.fit(ref, cand):
+                matched.append(i)
+                break
+    return matched
+
+
+class RediscoveryMatcher:
+    def __init__(
+        self,
+        references: Sequence[Structure],
+        symprec: Optional[float] = 0.1,
+        n_jobs: Optional[int] = None,
+        max_bucket_size: int = 1000,
+        **matcher_kwargs,
+    ) -> None:
+        """Match generated candidates against a fixed set of reference structures.
+
+        References are indexed once by their bucket key (see :func:`get_bucket_key`).
+        Candidates are first prefiltered by reduced formula, which is cheap, and only
+        the survivors go through symmetry analysis. :class:`StructureMatcher` is then
+        only run within buckets, and buckets are spread across a process pool.
+
+        Parameters
+        ----------
+        references : Sequence[Structure]
+            Held-out structures to be rediscovered, e.g. ``test_inputs`` from
+            :func:`MPTimeSplit.get_test_data`.
+        symprec : Optional[float]
+            Symmetry tolerance used for the spacegroup and lattice buckets. If None,
+            buckets are defined by reduced formula only. By default 0.1.
+        n_jobs : Optional[int]
+            Number of worker processes, see :func:`parallel_map`. By default None.
+        max_bucket_size : int
+            Maximum number of candidates per matching task. Larger buckets are split
+            into several tasks to balance the load across workers. By default 1000.
+        matcher_kwargs : dict, optional
+            Keyword arguments passed to :class:`StructureMatcher`, e.g. ``ltol``,
+            ``stol`` or ``angle_tol``. Arguments that let entries of different
+            buckets match (see :data:`BUCKET_MATCHER_DEFAULTS`) are not supported.
+        """
+        unsupported = [
+            name
+            for name, default in BUCKET_MATCHER_DEFAULTS.items()
+            if name in matcher_kwargs and not _is_default(matcher_kwargs[name], default)
+        ]
+        if unsupported:
+            raise ValueError(
+                f"{unsupported} would let structures of different buckets match. Use StructureMatcher directly for such comparisons."  # noqa: E501
+            )
+        self.references = list(references)
+        self.symprec = symprec
+        self.n_jobs = n_jobs
+        self.max_bucket_size = max_bucket_size
+        self.matcher_kwargs = matcher_kwargs
+
+        keys = parallel_map(
+            partial(get_bucket_key, symprec=symprec),
+            self.references,
+            n_jobs=n_jobs,
+        )
+        self.index: Dict[Hashable, List[int]] = defaultdict(list)
+        self.formula_index: Dict[str, List[int]] = defaultdict(list)
+        for i, key in enumerate(keys):
+            self.index[key].append(i)
+            self.formula_index[key[0]].append(i)
+
+    def match(self, candidates: Sequence[Structure]) -> np.ndarray:
+        """Determine which references are matched by at least one candidate.
+
+        Parameters
+        ----------
+        candidates : Sequence[Structure]
+            Generated structures.
+
+        Returns
+        -------
+        np.ndarray
+            Boolean array with one entry per reference.
+        """
+        # composition hash prefilter, no symmetry analysis needed
+        candidates = [
+            c for c in candidates if c.composition.reduced_formula in self.formula_index
+        ]
+        keys = parallel_map(
+            partial(get_bucket_key, symprec=self.symprec),
+            candidates,
+            n_jobs=self.n_jobs,
+        )
+
+        buckets: Dict[Hashable, List[int]] = defaultdict(list)
+        for i, key in enumerate(keys):
+            buckets[key].append(i)
+
+        tasks = []
+        task_ref_ids = []
+        for key, cand_ids in buckets.items():
+            if key in self.index:
+                ref_ids = self.index[key]
+            elif None in key:
+                # symmetry analysis failed, fall back to the formula bucket
+                ref_ids = self.formula_index[key[0]]
+            else:
+                continue
+            refs = [self.references[i] for i in ref_ids]
+            for start in range(0, len(cand_ids), self.max_bucket_size):
+                stop = start + self.max_bucket_size
+                cands = [candidates[i] for i in cand_ids[start:stop]]
+                tasks.append((refs, cands, self.matcher_kwargs))
+                task_ref_ids.append(ref_ids)
+
+        matched = np.zeros(len(self.references), dtype=bool)
+        results = parallel_map(_match_bucket, tasks, n_jobs=self.n_jobs)
+        for ref_ids, positions in zip(task_ref_ids, results):
+            matched[[ref_ids[p] for p in positions]] = True
+        return matched
+
+
+def get_rediscovery_counts(
+    mpt,
+    candidates: Union[Sequence[Structure], Dict[Union[int, str], Sequence[Structure]]],
+    folds: Optional[List[Union[int, str]]] = None,
+    symprec: Optional[float] = 0.1,
+    n_jobs: Optional[int] = None,
+    **matcher_kwargs,
+) -> pd.DataFrame:
+    """Count held-out entries rediscovered by generated structures per fold and year.
+
+    Parameters
+    ----------
+    mpt : MPTimeSplit
+        Instance on which :func:`MPTimeSplit.load` or :func:`MPTimeSplit.fetch_data`
+        has been run.
+    candidates : Union[Sequence[Structure], Dict[Union[int, str], Sequence[Structure]]]
+        Generated structures. Either a single sequence used for every fold or a
+        dictionary mapping each fold (and ``"test"``) to its own candidates, e.g. when
+        a separate model was trained on each fold.
+    folds : Optional[List[Union[int, str]]]
+        Folds to evaluate. Integer folds use the validation data of
+        :func:`MPTimeSplit.get_train_and_val_data` as references and ``"test"`` uses
+        the test data of :func:`MPTimeSplit.get_test_data`. If None, all of
+        ``mpt.folds`` followed by ``"test"``. By default None.
+    symprec : Optional[float]
+        See :class:`RediscoveryMatcher`, by default 0.1.
+    n_jobs : Optional[int]
+        See :class:`RediscoveryMatcher`, by default None.
+    matcher_kwargs : dict, optional
+        Keyword arguments passed to :class:`StructureMatcher`, see
+        :class:`RediscoveryMatcher`.
+
+    Returns
+    -------
+    pd.DataFrame
+        One row per fold and year with columns ``["fold", "year", "num_references",
+        "num_matched"]``.
+
+    Examples
+    --------
+    >>> mpt = MPTimeSplit()
+    >>> mpt.load()
+    >>> counts = get_rediscovery_counts(mpt, gen_structures, n_jobs=-1)
+    """
+    if folds is None:
+        folds = list(mpt.folds) + [TEST_FOLD]
+
+    held_out = {}
+    for fold in folds:
+        if fold == TEST_FOLD:
+            _, inputs, _, _ = mpt.get_test_data()
+        else:
+            _, inputs, _, _ = mpt.get_train_and_val_data(fold)
+        held_out[fold] = inputs
+
+    if isinstance(candidates, dict):
+        matched = {}
+        for fold in folds:
+            matcher = RediscoveryMatcher(
+                held_out[fold], symprec=symprec, n_jobs=n_jobs, **matcher_kwargs
+            )
+            matched[fold] = pd.Series(
+                matcher.match(candidates[fold]), index=held_out[fold].index
+            )
+    else:
+        # the same candidates are used for every fold, so match the union of the
+        # held-out entries only once
+        union_index = pd.Index([])
+        for inputs in held_out.values():
+            union_index = union_index.union(inputs.index, sort=False)
+        matcher = RediscoveryMatcher(
+            mpt.inputs.loc[union_index],
+            symprec=symprec,
+            n_jobs=n_jobs,
+            **matcher_kwargs,
+        )
+        union_matched = pd.Series(matcher.match(candidates), index=union_index)
+        matched = {fold: union_matched.loc[held_out[fold].index] for fold in folds}
+
+    year = mpt.data["year"] if "year" in mpt.data else None
+    counts = []
+    for fold in folds:
+        fold_df = pd.DataFrame(
+            {
+                "year": None if year is None else year.loc[matched[fold].index],
+                "matched": matched[fold],
+            }
+        )
+        fold_counts = fold_df.groupby("year", dropna=False)["matched"].agg(
+            num_references="size", num_matched="sum"
+        )
+        fold_counts.insert(0, "fold", fold)
+        counts.append(fold_counts.reset_index())
+    counts = pd.concat(counts, ignore_index=True)
+    return counts[["fold", "year", "num_references", "num_matched"]]
@@ -0,0 +1,69 @@
+from concurrent.futures import ProcessPoolExecutor
+from os import cpu_count
+from typing import Callable, Iterable, Iterator, List, Optional
+
+
+def get_n_jobs(n_jobs: Optional[int] = None) -> int:
+    """Resolve ``n_jobs`` to a positive number of workers.
+
+    Follows the ``scikit-learn`` convention, i.e. ``None`` means one worker and
+    negative values count backwards from the number of CPUs (``-1`` uses all CPUs).
+    """
+    if n_jobs is None or n_jobs == 0:
+        return 1
+    if n_jobs < 0:
+        return max((cpu_count() or 1) + 1 + n_jobs, 1)
+    return n_jobs
+
+
+def parallel_imap(
+    func: Callable,
+    iterable: Iterable,
+    n_jobs: Optional[int] = None,
+    chunksize: Optional[int] = None,
+) -> Iterator:
+    """Lazily apply ``func`` to every item of ``iterable``, optionally across processes.
+
+    Results are yielded in the same order as ``iterable`` as soon as they are
+    available, e.g. to report progress with ``tqdm``. See :func:`parallel_map` for
+    the parameters.
+    """
+    n_jobs = get_n_jobs(n_jobs)
+    if n_jobs == 1:
+        yield from map(func, iterable)
+        return
+    items = list(iterable)
+    if chunksize is None:
+        chunksize = max(len(items) // (4 * n_jobs), 1)
+    with ProcessPoolExecutor(max_workers=n_jobs) as executor:
+        yield from executor.map(func, items, chunksize=chunksize)
+
+
+def parallel_map(
+    func: Callable,
+    iterable: Iterable,
+    n_jobs: Optional[int] = None,
+    chunksize: Optional[int] = None,
+) -> List:
+    """Apply ``func`` to every item of ``iterable``, optionally across processes.
+
+    Parameters
+    ----------
+    func : Callable
+        Picklable function (i.e. defined at module level) taking a single item.
+    iterable : Iterable
+        Items to map over.
+    n_jobs : Optional[int]
+        Number of worker processes. ``None`` or ``1`` runs serially in the current
+        process and ``-1`` uses all CPUs. By default None.
+    chunksize : Optional[int]
+        Number of items sent to a worker at a time. If None, the items are split
+        into about four chunks per worker, which keeps the inter-process overhead low
+        while still balancing the load. By default None.
+
+    Returns
+    -------
+    List
+        Results of ``func`` in the same order as ``iterable``.
+    """
+    return list(parallel_imap(func, iterable, n_jobs=n_jobs, chunksize=chunksize))
@@ -0,0 +1,174 @@
+from hashlib import sha1
+from typing import Iterable, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+from typing_extensions import Literal
+
+from mp_time_split.utils.data import (
+    atomic_write,
+    get_excluded_elements,
+    load_or_compute_sidecar,
+)
+
+# atomic numbers 1-118 fit in two 64-bit words
+NUM_MASK_WORDS = 2
+
+
+def _get_atomic_number(symbol: str) -> int:
+    from pymatgen.core import Element
+
+    return Element(symbol).Z
+
+
+def get_element_mask(atomic_numbers: Iterable[int]) -> np.ndarray:
+    """Bitmask with bit ``Z - 1`` set for each atomic number ``Z``.
+
+    Returns
+    -------
+    np.ndarray
+        Array of :data:`NUM_MASK_WORDS` ``uint64`` words.
+    """
+    mask = np.zeros(NUM_MASK_WORDS, dtype=np.uint64)
+    for z in atomic_numbers:
+        word, bit = divmod(int(z) - 1, 64)
+        mask[word] |= np.uint64(1) << np.uint64(bit)
+    return mask
+
+
+def get_symbols_mask(symbols: Iterable[str]) -> np.ndarray:
+    """Like :func:`get_element_mask`, for element symbols, e.g. ``["V", "N"]``."""
+    return get_element_mask(_get_atomic_number(symbol) for symbol in symbols)
+
+
+def get_filter_key(
+    num_sites: Optional[Tuple[int, int]] = None,
+    elements: Optional[List[str]] = None,
+    exclude_elements: Optional[Union[List[str], str]] = None,
+) -> Optional[str]:
+    """Short key identifying a filter, or None if nothing is filtered out."""
+    if num_sites is None and not elements and not exclude_elements:
+        return None
+    if exclude_elements is not None and not isinstance(exclude_elements, str):
+        exclude_elements = sorted(exclude_elements)
+    params = (
+        None if num_sites is None else tuple(num_sites),
+        None if elements is None else sorted(elements),
+        exclude_elements,
+    )
+    return sha1(repr(params).encode()).hexdigest()[:8]
+
+
+class SnapshotIndex:
+    def __init__(self, element_masks: np.ndarray, num_sites: np.ndarray) -> None:
+        """Per-entry indexes for filtering a snapshot without decoding structures.
+
+        Parameters
+        ----------
+        element_masks : np.ndarray
+            ``(num_entries, NUM_MASK_WORDS)`` ``uint64`` bitmasks of the elements of
+            each entry, see :func:`get_element_mask`.
+        num_sites : np.ndarray
+            Number of sites of each entry.
+        """
+        self.element_masks = element_masks
+        self.num_sites = num_sites
+        # sorted copy for range queries via binary search
+        self.num_sites_order = np.argsort(num_sites, kind="stable")
+        self.sorted_num_sites = num_sites[self.num_sites_order]
+
+    def __len__(self) -> int:
+        return len(self.num_sites)
+
+    @classmethod
+    def from_structures(cls, structures: Sequence) -> "SnapshotIndex":
+        element_masks = np.zeros((len(structures), NUM_MASK_WORDS), dtype=np.uint64)
+        num_sites = np.empty(len(structures), dtype=np.int32)
+        for i, s in enumerate(structures):
+            element_masks[i] = get_element_mask(e.Z for e in s.composition.elements)
+            num_sites[i] = len(s)
+        return cls(element_masks, num_sites)
+
+    def save(self, fpath: str) -> None:
+        """Save to an uncompressed ``.npz`` file."""
+        with atomic_write(fpath) as f:
+            np.savez(f, element_masks=self.element_masks, num_sites=self.num_sites)
+
+    @classmethod
+    def load(cls, fpath: str) -> "SnapshotIndex":
+        with np.load(fpath) as npz:
+            return cls(npz["element_masks"], npz["num_sites"])
+
+    def select(
+        self,
+        num_sites: Optional[Tuple[int, int]] = None,
+        elements: Optional[List[str]] = None,
+        exclude_elements: Optional[
+            Union[List[str], Literal["noble", "radioactive", "noble+radioactive"]]
+        ] = None,
+    ) -> np.ndarray:
+        """Boolean mask of the entries matching all filters.
+
+        The filters have the same meaning as for :func:`MPTimeSplit.fetch_data`.
+
+        Parameters
+        ----------
+        num_sites : Optional[Tuple[int, int]]
+            Inclusive range of the number of sites, by default None.
+        elements : Optional[List[str]]
+            Elements that must all be present, by default None.
+        exclude_elements : Optional[Union[List[str], str]]
+            Elements that must all be absent, or one of "noble", "radioactive" or
+            "noble+radioactive", by default None.
+        """
+        selected = np.ones(len(self), dtype=bool)
+        if num_sites is not None:
+            lo, hi = num_sites
+            start = np.searchsorted(self.sorted_num_sites, lo, side="left")
+            stop = np.searchsorted(self.sorted_num_sites, hi, side="right")
+            in_range = np.zeros(len(self), dtype=bool)
+            in_range[self.num_sites_order[start:stop]] = True
+            selected &= in_range
+        if elements:
+            query = get_symbols_mask(elements)
+            selected &= np.all((self.element_masks & query) == query, axis=1)
+        excluded = get_excluded_elements(exclude_elements)
+        if excluded:
+            query = get_symbols_mask(excluded)
+            selected &= np.all((self.element_masks & query) == 0, axis=1)
+        return selected
+
+
+def load_or_compute_snapshot_index(
+    structures: Sequence,
+    data_path: Optional[str] = None,
+    checksum: Optional[str] = None,
+) -> SnapshotIndex:
+    """Get the :class:`SnapshotIndex` of a snapshot, stored next to it if possible.
+
+    Storing is best effort: if the directory of the snapshot is not writable (e.g.
+    the packaged dummy snapshot in a read-only install), a warning is issued and the
+    index is only kept in memory.
+
+    Parameters
+    ----------
+    structures : Sequence[Structure]
+        Structures of the whole snapshot.
+    data_path : Optional[str]
+        Path of the snapshot. If None, nothing is stored. By default None.
+    checksum : Optional[str]
+        Checksum of the snapshot, by default None.
+    """
+
+    def load(fpath: str) -> Optional[SnapshotIndex]:
+        index = SnapshotIndex.load(fpath)
+        return index if len(index) == len(structures) else None
+
+    return load_or_compute_sidecar(
+        lambda: SnapshotIndex.from_structures(structures),
+        data_path,
+        checksum,
+        "index",
+        ext=".npz",
+        load=load,
+        save=SnapshotIndex.save,
+    )
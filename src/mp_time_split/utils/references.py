@@ -0,0 +1,157 @@
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+REFERENCE_COLUMNS = ["references", "discovery"]
+# stands in for a missing discovery year
+NO_YEAR = -1
+
+
+def _to_csr(
+    rows: Sequence[Optional[Sequence[str]]],
+) -> Tuple[List[str], np.ndarray, np.ndarray]:
+    """Deduplicate the strings of all rows into a table plus CSR-style index arrays."""
+    table: Dict[str, int] = {}
+    ptr = np.zeros(len(rows) + 1, dtype=np.int64)
+    ids = []
+    for i, row in enumerate(rows):
+        for value in row or []:
+            ids.append(table.setdefault(value, len(table)))
+        ptr[i + 1] = len(ids)
+    return list(table), ptr, np.array(ids, dtype=np.int32)
+
+
+class ReferenceTable:
+    def __init__(
+        self,
+        references: List[str],
+        reference_ptr: np.ndarray,
+        reference_ids: np.ndarray,
+        authors: List[str],
+        author_ptr: np.ndarray,
+        author_ids: np.ndarray,
+        year: np.ndarray,
+    ) -> None:
+        """Normalized ``references`` and ``discovery`` columns of a snapshot.
+
+        Each distinct bibtex string and author name is stored once. The references of
+        the ``i``-th row are ``references[reference_ids[reference_ptr[i]:reference_ptr[i
+        + 1]]]``, and likewise for the authors of its earliest report. Rows are in the
+        same order as the DataFrame they were taken from.
+
+        Parameters
+        ----------
+        references : List[str]
+            Unique bibtex strings.
+        reference_ptr, reference_ids : np.ndarray
+            Offsets (of length ``num_rows + 1``) and indices into ``references``.
+        authors : List[str]
+            Unique author names.
+        author_ptr, author_ids : np.ndarray
+            Offsets (of length ``num_rows + 1``) and indices into ``authors``.
+        year : np.ndarray
+            Discovery year of each row, :data:`NO_YEAR` if there is none.
+        """  # noqa: E501
+        self.references = references
+        self.reference_ptr = reference_ptr
+        self.reference_ids = reference_ids
+        self.authors = authors
+        self.author_ptr = author_ptr
+        self.author_ids = author_ids
+        self.year = year
+
+    def __len__(self) -> int:
+        return len(self.year)
+
+    @classmethod
+    def from_columns(
+        cls, references: Sequence[List[str]], discovery: Sequence[dict]
+    ) -> "ReferenceTable":
+        """Normalize the ``references`` and ``discovery`` columns of a snapshot."""
+        unique_references, reference_ptr, reference_ids = _to_csr(references)
+        authors, author_ptr, author_ids = _to_csr([d["authors"] for d in discovery])
+        year = np.array(
+            [NO_YEAR if d["year"] is None else d["year"] for d in discovery],
+            dtype=np.int16,
+        )
+        return cls(
+            unique_references,
+            reference_ptr,
+            reference_ids,
+            authors,
+            author_ptr,
+            author_ids,
+            year,
+        )
+
+    def get_references(self, i: int) -> List[str]:
+        """Bibtex strings of the ``i``-th row, as in the ``references`` column."""
+        start, stop = self.reference_ptr[i], self.reference_ptr[i + 1]
+        return [self.references[j] for j in self.reference_ids[start:stop]]
+
+    def get_discovery(self, i: int) -> dict:
+        """Earliest bib info of the ``i``-th row, as in the ``discovery`` column."""
+        if self.year[i] == NO_YEAR:
+            return dict(year=None, authors=None, num_authors=None)
+        start, stop = self.author_ptr[i], self.author_ptr[i + 1]
+        authors = [self.authors[j] for j in self.author_ids[start:stop]]
+        return {
+            "year": int(self.year[i]),
+            "authors": authors,
+            "num_authors": len(authors),
+        }
+
+    def to_columns(self) -> Tuple[List[List[str]], List[dict]]:
+        """Rebuild the ``references`` and ``discovery`` columns."""
+        return (
+            [self.get_references(i) for i in range(len(self))],
+            [self.get_discovery(i) for i in range(len(self))],
+        )
+
+    def as_dict(self) -> dict:
+        return {
+            "references": self.references,
+            "reference_ptr": self.reference_ptr.tolist(),
+            "reference_ids": self.reference_ids.tolist(),
+            "authors": self.authors,
+            "author_ptr": self.author_ptr.tolist(),
+            "author_ids": self.author_ids.tolist(),
+            "year": self.year.tolist(),
+        }
+
+    @classmethod
+    def from_dict(cls, d: dict) -> "ReferenceTable":
+        return cls(
+            d["references"],
+            np.array(d["reference_ptr"], dtype=np.int64),
+            np.array(d["reference_ids"], dtype=np.int32),
+            d["authors"],
+            np.array(d["author_ptr"], dtype=np.int64),
+            np.array(d["author_ids"], dtype=np.int32),
+            np.array(d["year"], dtype=np.int16),
+        )
+
+
+def normalize_references(df: pd.DataFrame) -> Tuple[pd.DataFrame, ReferenceTable]:
+    """Move the ``references`` and ``discovery`` columns of ``df`` to a table.
+
+    Returns
+    -------
+    Tuple[pd.DataFrame, ReferenceTable]
+        ``df`` without :data:`REFERENCE_COLUMNS` and the table holding them, with rows
+        in the same order.
+    """
+    table = ReferenceTable.from_columns(df["references"], df["discovery"])
+    return df.drop(columns=REFERENCE_COLUMNS), table
+
+
+def denormalize_references(df: pd.DataFrame, table: ReferenceTable) -> pd.DataFrame:
+    """Inverse of :func:`normalize_references`."""
+    references, discovery = table.to_columns()
+    # keep the original column order, i.e. references and discovery before year
+    position = df.columns.get_loc("year") if "year" in df else len(df.columns)
+    df = df.copy(deep=False)
+    df.insert(position, "references", references)
+    df.insert(position + 1, "discovery", discovery)
+    return df
@@ -0,0 +1,305 @@
+from multiprocessing import shared_memory
+from typing import Dict, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+
+from mp_time_split.utils.constants import TEST_FOLD
+
+STRUCTURE_ARRAYS = ["lattice", "site_ptr", "atomic_numbers", "frac_coords"]
+
+
+def encode_structures(structures: Sequence) -> Dict[str, np.ndarray]:
+    """Encode ordered structures as flat arrays.
+
+    The sites of the ``i``-th structure are ``site_ptr[i]:site_ptr[i + 1]`` of
+    ``atomic_numbers`` and ``frac_coords``. Oxidation states and site properties are
+    not kept.
+
+    Parameters
+    ----------
+    structures : Sequence[Structure]
+        Ordered structures, e.g. ``mpt.inputs``.
+
+    Returns
+    -------
+    Dict[str, np.ndarray]
+        Arrays named as in :data:`STRUCTURE_ARRAYS`.
+    """
+    num_sites = [len(s) for s in structures]
+    site_ptr = np.zeros(len(num_sites) + 1, dtype=np.int64)
+    np.cumsum(num_sites, out=site_ptr[1:])
+    lattice = np.empty((len(num_sites), 3, 3), dtype=np.float64)
+    atomic_numbers = np.empty(site_ptr[-1], dtype=np.uint8)
+    frac_coords = np.empty((site_ptr[-1], 3), dtype=np.float64)
+    for i, s in enumerate(structures):
+        if not s.is_ordered:
+            raise ValueError(f"structure {i} is disordered, which is not supported")
+        start, stop = site_ptr[i], site_ptr[i + 1]
+        lattice[i] = s.lattice.matrix
+        atomic_numbers[start:stop] = [site.specie.Z for site in s]
+        frac_coords[start:stop] = s.frac_coords
+    return {
+        "lattice": lattice,
+        "site_ptr": site_ptr,
+        "atomic_numbers": atomic_numbers,
+        "frac_coords": frac_coords,
+    }
+
+
+def decode_structure(arrays: Dict[str, np.ndarray], i: int):
+    """Rebuild the ``i``-th :class:`Structure` from :func:`encode_structures` arrays."""
+    from pymatgen.core import Lattice, Structure
+
+    start, stop = arrays["site_ptr"][i], arrays["site_ptr"][i + 1]
+    return Structure(
+        Lattice(np.array(arrays["lattice"][i])),
+        arrays["atomic_numbers"][start:stop].tolist(),
+        np.array(arrays["frac_coords"][start:stop]),
+    )
+
+
+def _attach(name: str) -> shared_memory.SharedMemory:
+    try:
+        # Python 3.13+, don't let workers unlink segments they didn't create
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:
+        return shared_memory.SharedMemory(name=name)
+
+
+class StructureView(Sequence):
+    def __init__(
+        self, snapshot: "SharedSnapshot", positions: Optional[np.ndarray] = None
+    ):
+        """Sequence of structures decoded on access from a :class:`SharedSnapshot`."""
+        self.snapshot = snapshot
+        self.positions = positions
+
+    def __len__(self) -> int:
+        if self.positions is None:
+            return len(self.snapshot)
+        return len(self.positions)
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            positions = np.arange(len(self))[i]
+            if self.positions is not None:
+                positions = self.positions[positions]
+            return StructureView(self.snapshot, positions)
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError(f"index {i} out of range")
+        pos = i if self.positions is None else int(self.positions[i])
+        return decode_structure(self.snapshot.arrays, pos)
+
+
+class SharedSnapshot:
+    def __init__(
+        self,
+        specs: Dict[str, Tuple[str, Tuple[int, ...], str]],
+        target: str,
+        folds: List[int],
+        owner: bool = False,
+    ) -> None:
+        """Handle to snapshot arrays placed in ``multiprocessing.shared_memory``.
+
+        Create via :func:`from_mpt` (or :func:`MPTimeSplit.to_shared_memory`) in the
+        main process and pass the handle to workers, e.g. as an argument of
+        ``ProcessPoolExecutor.submit``. Only segment names, shapes and dtypes are
+        pickled, and workers attach to the segments on first access, so memory per
+        worker does not grow with the size of the snapshot.
+
+        Parameters
+        ----------
+        specs : Dict[str, Tuple[str, Tuple[int, ...], str]]
+            Mapping of array name to ``(segment_name, shape, dtype)``.
+        target : str
+            Name of the output column, see :class:`MPTimeSplit`.
+        folds : List[int]
+            Integer folds, see :class:`MPTimeSplit`.
+        owner : bool
+            Whether this handle created (and should unlink) the segments, by default
+            False.
+        """
+        self.specs = specs
+        self.target = target
+        self.folds = folds
+        self.owner = owner
+        self._segments: Optional[Dict[str, shared_memory.SharedMemory]] = None
+        self._arrays: Optional[Dict[str, np.ndarray]] = None
+
+    @classmethod
+    def from_arrays(
+        cls, arrays: Dict[str, np.ndarray], target: str, folds: List[int]
+    ) -> "SharedSnapshot":
+        """Copy ``arrays`` into new shared memory segments."""
+        specs = {}
+        segments = {}
+        shared_arrays = {}
+        try:
+            for name, array in arrays.items():
+                array = np.ascontiguousarray(array)
+                shm = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+                segments[name] = shm
+                shared = np.ndarray(array.shape, dtype=array.dtype, buffer=shm.buf)
+                shared[...] = array
+                shared_arrays[name] = shared
+                specs[name] = (shm.name, array.shape, array.dtype.str)
+        except Exception:
+            for shm in segments.values():
+                shm.close()
+                shm.unlink()
+            raise
+        snapshot = cls(specs, target=target, folds=folds, owner=True)
+        snapshot._segments = segments
+        snapshot._arrays = shared_arrays
+        return snapshot
+
+    @classmethod
+    def from_mpt(cls, mpt, columns: Optional[List[str]] = None) -> "SharedSnapshot":
+        """Place the data and splits of a loaded :class:`MPTimeSplit` in shared memory.
+
+        Parameters
+        ----------
+        mpt : MPTimeSplit
+            Instance on which :func:`MPTimeSplit.load` or :func:`MPTimeSplit.fetch_data`
+            has been run.
+        columns : Optional[List[str]]
+            Columns of ``mpt.data`` to share in addition to the structures and the
+            target. Must be numeric, boolean or string (e.g. ``"material_id"``). If
+            None, all numeric and boolean columns plus ``"material_id"``. By default
+            None.
+        """  # noqa: E501
+        if mpt.data is None:
+            raise NameError("`fetch_data()` or `load()` must be run first.")
+        data = mpt.data
+        if columns is None:
+            columns = [
+                name
+                for name, dtype in data.dtypes.items()
+                if dtype.kind in "biuf" or name == "material_id"
+            ]
+        if mpt.target not in columns:
+            columns = columns + [mpt.target]
+
+        arrays = encode_structures(mpt.inputs)
+        arrays["index"] = np.asarray(data.index)
+        for name in columns:
+            values = data[name]
+            if values.dtype.kind in "biuf":
+                arrays[f"column/{name}"] = values.to_numpy()
+            else:
+                arrays[f"column/{name}"] = np.array([str(v) for v in values])
+        for fold, split in zip(mpt.folds, mpt.trainval_splits):
+            arrays[f"split/{fold}/train"] = np.asarray(split[0], dtype=np.int64)
+            arrays[f"split/{fold}/val"] = np.asarray(split[1], dtype=np.int64)
+        arrays[f"split/{TEST_FOLD}/train"] = np.asarray(mpt.test_split[0], np.int64)
+        arrays[f"split/{TEST_FOLD}/test"] = np.asarray(mpt.test_split[1], np.int64)
+        return cls.from_arrays(arrays, target=mpt.target, folds=list(mpt.folds))
+
+    def __getstate__(self) -> dict:
+        state = self.__dict__.copy()
+        state["_segments"] = None
+        state["_arrays"] = None
+        state["owner"] = False
+        return state
+
+    @property
+    def arrays(self) -> Dict[str, np.ndarray]:
+        """Read-only views of the shared arrays, attaching on first access."""
+        if self._arrays is None:
+            segments = {}
+            arrays = {}
+            for name, (shm_name, shape, dtype) in self.specs.items():
+                shm = _attach(shm_name)
+                segments[name] = shm
+                array = np.ndarray(shape, dtype=np.dtype(dtype), buffer=shm.buf)
+                array.flags.writeable = False
+                arrays[name] = array
+            self._segments = segments
+            self._arrays = arrays
+        return self._arrays
+
+    def __len__(self) -> int:
+        return self.specs["index"][1][0]
+
+    @property
+    def columns(self) -> List[str]:
+        prefix = "column/"
+        return [name[len(prefix) :] for name in self.specs if name.startswith(prefix)]
+
+    def get_column(self, name: str) -> np.ndarray:
+        return self.arrays[f"column/{name}"]
+
+    @property
+    def index(self) -> np.ndarray:
+        return self.arrays["index"]
+
+    @property
+    def inputs(self) -> StructureView:
+        return StructureView(self)
+
+    @property
+    def outputs(self) -> np.ndarray:
+        return self.get_column(self.target)
+
+    def get_split(self, fold: Union[int, str]) -> Tuple[np.ndarray, np.ndarray]:
+        """Positional train and held-out indices of an integer fold or ``"test"``."""
+        held_out = TEST_FOLD if fold == TEST_FOLD else "val"
+        if f"split/{fold}/train" not in self.specs:
+            raise ValueError(f"fold={fold} should be one of {self.folds + [TEST_FOLD]}")
+        return (
+            self.arrays[f"split/{fold}/train"],
+            self.arrays[f"split/{fold}/{held_out}"],
+        )
+
+    def get_train_and_val_data(self, fold: int):
+        """Like :func:`MPTimeSplit.get_train_and_val_data`, with lazy structures."""
+        if fold not in self.folds:
+            raise ValueError(f"fold={fold} should be one of {self.folds}")
+        return self._get_data(fold)
+
+    def get_test_data(self):
+        """Like :func:`MPTimeSplit.get_test_data`, with lazy structures."""
+        return self._get_data(TEST_FOLD)
+
+    def _get_data(self, fold):
+        train_index, held_out_index = self.get_split(fold)
+        return (
+            StructureView(self, train_index),
+            StructureView(self, held_out_index),
+            self.outputs[train_index],
+            self.outputs[held_out_index],
+        )
+
+    def close(self) -> None:
+        """Detach from the segments in this process."""
+        self._arrays = None
+        if self._segments is not None:
+            for shm in self._segments.values():
+                try:
+                    shm.close()
+                except BufferError:
+                    # views are still referenced elsewhere, released once collected
+                    pass
+            self._segments = None
+
+    def unlink(self) -> None:
+        """Free the segments, only once all processes are done with them."""
+        if self._segments is None:
+            self._segments = {
+                name: _attach(shm_name) for name, (shm_name, _, _) in self.specs.items()
+            }
+        segments = self._segments
+        self.close()
+        for shm in segments.values():
+            shm.unlink()
+
+    def __enter__(self) -> "SharedSnapshot":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        if self.owner:
+            self.unlink()
+        else:
+            self.close()
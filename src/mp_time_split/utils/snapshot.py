@@ -0,0 +1,93 @@
+import json
+from pathlib import Path
+from typing import Optional, Tuple
+
+import pandas as pd
+from monty.json import MontyDecoder, MontyEncoder
+
+from mp_time_split.utils.codecs import (
+    compress,
+    decompress,
+    detect_codec,
+    get_codec_from_path,
+)
+from mp_time_split.utils.instrument import phase
+from mp_time_split.utils.references import ReferenceTable, normalize_references
+
+SPLIT_KEYS = {"data", "columns", "index"}
+
+
+def write_snapshot(
+    df: pd.DataFrame,
+    fpath: str,
+    normalize: bool = False,
+    codec: Optional[str] = None,
+    n_jobs: Optional[int] = None,
+) -> Optional[ReferenceTable]:
+    """Store a snapshot as (optionally compressed) JSON.
+
+    Parameters
+    ----------
+    df : pd.DataFrame
+        Snapshot as returned by :func:`MPTimeSplit.fetch_data`.
+    fpath : str
+        Path to write to.
+    normalize : bool
+        Whether to store the ``references`` and ``discovery`` columns as a
+        :class:`ReferenceTable` under an additional ``"reference_table"`` key, which
+        makes the file considerably smaller. Otherwise, the file is the same as
+        written by :func:`matminer.utils.io.store_dataframe_as_json` with
+        ``orient="split"``. By default False.
+    codec : Optional[str]
+        Name of the compression codec, e.g. "bgzf" (gzip-compatible blocks) or "zstd",
+        see :data:`mp_time_split.utils.codecs.CODECS`. If None, inferred from the
+        extension of `fpath`, e.g. "gzip" for ``.gz``. By default None.
+    n_jobs : Optional[int]
+        Number of threads compressing blocks, by default None.
+
+    Returns
+    -------
+    Optional[ReferenceTable]
+        The reference table if ``normalize``, otherwise None.
+    """
+    table = None
+    if normalize:
+        df, table = normalize_references(df)
+    d = df.to_dict(orient="split")
+    if table is not None:
+        d["reference_table"] = table.as_dict()
+    if codec is None:
+        codec = get_codec_from_path(fpath)
+    data = json.dumps(d, cls=MontyEncoder).encode()
+    Path(fpath).write_bytes(compress(data, codec, n_jobs=n_jobs))
+    return table
+
+
+def read_snapshot(
+    fpath: str, n_jobs: Optional[int] = None
+) -> Tuple[pd.DataFrame, Optional[ReferenceTable]]:
+    """Read a snapshot written by :func:`write_snapshot` or matminer.
+
+    The compression codec is detected from the first bytes of the file, and blocks of
+    "bgzf" and "zstd" files are decompressed across `n_jobs` threads (see
+    :func:`mp_time_split.utils.codecs.decompress`).
+
+    Returns
+    -------
+    Tuple[pd.DataFrame, Optional[ReferenceTable]]
+        The snapshot and its reference table, which is None unless the file was
+        written with ``normalize=True``. In that case the DataFrame doesn't have
+        ``references`` and ``discovery`` columns (see
+        :func:`mp_time_split.utils.references.denormalize_references`).
+    """
+    data = Path(fpath).read_bytes()
+    codec = detect_codec(data[:64])
+    with phase("decompress", bytes=len(data), codec=codec):
+        data = decompress(data, codec, n_jobs=n_jobs)
+    d = json.loads(data, cls=MontyDecoder)
+    table = None
+    if "reference_table" in d:
+        table = ReferenceTable.from_dict(d.pop("reference_table"))
+    if set(d) != SPLIT_KEYS:
+        raise ValueError(f"expected keys {SPLIT_KEYS} in {fpath}, got {set(d)}")
+    return pd.DataFrame(**d), table
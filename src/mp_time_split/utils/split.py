@@ -6,7 +6,7 @@ from sklearn.model_selection._split import _BaseKFold
 from sklearn.utils import indexable
 from sklearn.utils.validation import _num_samples
 
-AVAILABLE_MODES = ["TimeSeriesSplit", "TimeSeriesOverflowSplit", "TimeKFold"]
+from mp_time_split.utils.constants import AVAILABLE_MODES, TEST_FOLD  # noqa: F401
 
 
 def mp_time_split(
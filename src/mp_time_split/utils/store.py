@@ -0,0 +1,223 @@
+import gzip
+import json
+from concurrent.futures import ThreadPoolExecutor
+from hashlib import sha256
+from os import listdir, path, remove
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import pandas as pd
+from monty.json import MontyDecoder, MontyEncoder
+
+from mp_time_split.utils.data import atomic_write
+from mp_time_split.utils.instrument import phase
+from mp_time_split.utils.parallel import get_n_jobs
+
+OBJECT_DIR = "objects"
+VERSION_DIR = "versions"
+REF_DIR = "refs"
+
+
+def _strip_versions(obj):
+    if isinstance(obj, dict):
+        return {k: _strip_versions(v) for k, v in obj.items() if k != "@version"}
+    if isinstance(obj, list):
+        return [_strip_versions(v) for v in obj]
+    return obj
+
+
+class _CanonicalEncoder(MontyEncoder):
+    # the version of the package that serialized an object (e.g. pymatgen) is not
+    # part of its contents, and decoding does not need it
+    def default(self, o):
+        return _strip_versions(super().default(o))
+
+
+def _encode_entry(entry: dict) -> Tuple[str, bytes]:
+    # canonical JSON so that equal entries of different snapshots (or written with
+    # different package versions) share a blob
+    data = json.dumps(
+        entry, cls=_CanonicalEncoder, sort_keys=True, separators=(",", ":")
+    ).encode()
+    return sha256(data).hexdigest(), data
+
+
+def _write_bytes(fpath: str, data: bytes) -> None:
+    with atomic_write(fpath) as f:
+        f.write(data)
+
+
+class SnapshotStore:
+    def __init__(self, store_dir: str) -> None:
+        """Content-addressed store of snapshot versions on the local disk.
+
+        Each entry (row) of a snapshot is stored once as a gzipped JSON blob named
+        after the SHA-256 of its contents, and a version is a manifest listing the
+        blobs of its rows. Entries shared by several versions, e.g. consecutive
+        snapshots or a custom snapshot derived from the full one, therefore take up
+        disk space only once.
+
+        Parameters
+        ----------
+        store_dir : str
+            Directory holding ``objects/{hash[:2]}/{hash[2:]}.json.gz``,
+            ``versions/{version}.json`` and ``refs/{name}``, where a ref is a name
+            pointing to a version (see :func:`set_ref`).
+
+        Examples
+        --------
+        >>> store = SnapshotStore("data/store")
+        >>> store.add(expt_df, "57da7fa4d96ffbbc0dd359b1b7423f31")
+        >>> expt_df = store.load("57da7fa4d96ffbbc0dd359b1b7423f31")
+        """
+        self.store_dir = store_dir
+        Path(store_dir, OBJECT_DIR).mkdir(exist_ok=True, parents=True)
+        Path(store_dir, VERSION_DIR).mkdir(exist_ok=True, parents=True)
+        Path(store_dir, REF_DIR).mkdir(exist_ok=True, parents=True)
+
+    def get_object_path(self, key: str) -> str:
+        return path.join(self.store_dir, OBJECT_DIR, key[:2], f"{key[2:]}.json.gz")
+
+    def get_manifest_path(self, version: str) -> str:
+        return path.join(self.store_dir, VERSION_DIR, f"{version}.json")
+
+    def set_ref(self, name: str, version: str) -> None:
+        """Point ``name`` (e.g. ``"dummy"``) to a stored version."""
+        _write_bytes(path.join(self.store_dir, REF_DIR, name), version.encode())
+
+    def resolve(self, version: str) -> str:
+        """Resolve a ref to its version. Other names are returned as is."""
+        ref_path = path.join(self.store_dir, REF_DIR, version)
+        if path.isfile(ref_path):
+            return Path(ref_path).read_text()
+        return version
+
+    def __contains__(self, version: str) -> bool:
+        return path.isfile(self.get_manifest_path(self.resolve(version)))
+
+    def versions(self) -> List[str]:
+        """Names of the stored versions."""
+        version_dir = path.join(self.store_dir, VERSION_DIR)
+        return sorted(
+            name[: -len(".json")]
+            for name in listdir(version_dir)
+            if name.endswith(".json")
+        )
+
+    def add(self, df: pd.DataFrame, version: Optional[str] = None) -> str:
+        """Store a snapshot, writing only entries not already in the store.
+
+        Parameters
+        ----------
+        df : pd.DataFrame
+            Snapshot as returned by :func:`MPTimeSplit.load` (without
+            ``normalize_references``) or :func:`MPTimeSplit.fetch_data`.
+        version : Optional[str]
+            Name of the version, e.g. the md5 checksum of the snapshot file. If None,
+            the SHA-256 of the manifest is used. An existing version of the same name
+            is replaced. By default None.
+
+        Returns
+        -------
+        str
+            Name of the version.
+        """
+        with phase("store_add", items=len(df)) as record:
+            columns = list(df.columns)
+            keys = []
+            num_written = 0
+            for values in df.itertuples(index=False, name=None):
+                key, data = _encode_entry(dict(zip(columns, values)))
+                keys.append(key)
+                fpath = self.get_object_path(key)
+                if not path.isfile(fpath):
+                    _write_bytes(fpath, gzip.compress(data))
+                    num_written += 1
+            record["written"] = num_written
+            manifest = {
+                "columns": columns,
+                "index": df.index.tolist(),
+                "entries": keys,
+            }
+            manifest_data = json.dumps(manifest, cls=MontyEncoder).encode()
+            if version is None:
+                version = sha256(manifest_data).hexdigest()
+            _write_bytes(self.get_manifest_path(version), manifest_data)
+        return version
+
+    def read_manifest(self, version: str) -> dict:
+        if version not in self:
+            raise KeyError(f"version {version} not in {self.store_dir}")
+        with open(self.get_manifest_path(self.resolve(version))) as f:
+            return json.load(f)
+
+    def _read_entry(self, key: str) -> dict:
+        with open(self.get_object_path(key), "rb") as f:
+            data = gzip.decompress(f.read())
+        if sha256(data).hexdigest() != key:
+            raise ValueError(f"object {key} in {self.store_dir} is corrupted")
+        return json.loads(data, cls=MontyDecoder)
+
+    def load(self, version: str, n_jobs: Optional[int] = None) -> pd.DataFrame:
+        """Rebuild a stored snapshot.
+
+        Parameters
+        ----------
+        version : str
+            Name of the version (see :func:`versions`) or a ref.
+        n_jobs : Optional[int]
+            Number of threads reading and decoding entries. If None, 1 (following
+            the scikit-learn convention). By default None.
+
+        Returns
+        -------
+        pd.DataFrame
+            Snapshot with the same columns, index and row order as when added.
+        """
+        manifest = self.read_manifest(version)
+        keys = manifest["entries"]
+        # entries repeated within a version are read only once
+        unique_keys = list(dict.fromkeys(keys))
+        with phase("store_load", items=len(keys)) as record:
+            n_jobs = get_n_jobs(n_jobs)
+            if n_jobs == 1:
+                values = [self._read_entry(key) for key in unique_keys]
+            else:
+                with ThreadPoolExecutor(max_workers=n_jobs) as executor:
+                    values = list(executor.map(self._read_entry, unique_keys))
+            entries: Dict[str, dict] = dict(zip(unique_keys, values))
+            record["unique"] = len(unique_keys)
+            columns = manifest["columns"]
+            df = pd.DataFrame(
+                [[entries[key][name] for name in columns] for key in keys],
+                columns=columns,
+                index=manifest["index"],
+            )
+        return df
+
+    def remove(self, version: str) -> None:
+        """Delete a version and refs to it. Its entries remain until :func:`gc`."""
+        version = self.resolve(version)
+        remove(self.get_manifest_path(version))
+        for ref_path in Path(self.store_dir, REF_DIR).iterdir():
+            if ref_path.suffix != ".tmp" and ref_path.read_text() == version:
+                ref_path.unlink()
+
+    def gc(self) -> int:
+        """Delete entries that are not part of any version.
+
+        Returns
+        -------
+        int
+            Number of deleted entries.
+        """
+        referenced = set()
+        for version in self.versions():
+            referenced.update(self.read_manifest(version)["entries"])
+        num_removed = 0
+        for fpath in Path(self.store_dir, OBJECT_DIR).glob("*/*.json.gz"):
+            key = fpath.parent.name + fpath.name[: -len(".json.gz")]
+            if key not in referenced:
+                fpath.unlink()
+                num_removed += 1
+        return num_removed
@@ -0,0 +1,167 @@
+from functools import partial
+from typing import List, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+from pymatgen.core import Structure
+from pymatgen.core.operations import SymmOp
+from pymatgen.symmetry.analyzer import SpacegroupAnalyzer, SpacegroupOperations
+from pymatgen.symmetry.structure import SymmetrizedStructure
+
+from mp_time_split.utils.data import load_or_compute_sidecar
+from mp_time_split.utils.parallel import parallel_map
+
+try:
+    from spglib.error import SpglibError
+except ImportError:  # older spglib, whose failures pymatgen raises as ValueError
+    SpglibError = ValueError
+
+# raised by `SpacegroupAnalyzer` if the symmetry cannot be determined
+SYMMETRY_ERRORS = (ValueError, SpglibError)
+
+SYMMETRY_COLUMNS = [
+    "spacegroup_number",
+    "spacegroup_symbol",
+    "crystal_system",
+    "symmetrized_structure",
+]
+
+
+def get_dataset_value(dataset, name: str):
+    """Get a field of a spglib symmetry dataset, e.g. ``"number"``.
+
+    Depending on the spglib and pymatgen versions,
+    :func:`SpacegroupAnalyzer.get_symmetry_dataset` returns a dict or an object with
+    attributes.
+    """
+    if isinstance(dataset, dict):
+        return dataset[name]
+    return getattr(dataset, name)
+
+
+def get_symmetry_info(structure: Structure, symprec: float = 0.1) -> Optional[dict]:
+    """Run :class:`SpacegroupAnalyzer` and keep a compact, JSON-friendly result.
+
+    Parameters
+    ----------
+    structure : Structure
+        Structure to analyze.
+    symprec : float
+        Symmetry tolerance passed to :class:`SpacegroupAnalyzer`, by default 0.1.
+
+    Returns
+    -------
+    Optional[dict]
+        Dictionary with keys ``["spacegroup_number", "spacegroup_symbol",
+        "crystal_system", "rotations", "translations", "equivalent_atoms",
+        "wyckoffs"]`` or None if the symmetry analysis failed. Together with the
+        original structure, this is enough to rebuild the
+        :class:`SymmetrizedStructure` (see :func:`to_symmetrized_structure`).
+    """
+    try:
+        sga = SpacegroupAnalyzer(structure, symprec=symprec)
+        dataset = sga.get_symmetry_dataset()
+    except SYMMETRY_ERRORS:
+        return None
+    arrays = {
+        name: np.asarray(get_dataset_value(dataset, name)).tolist()
+        for name in ["rotations", "translations", "equivalent_atoms", "wyckoffs"]
+    }
+    return {
+        "spacegroup_number": int(get_dataset_value(dataset, "number")),
+        "spacegroup_symbol": sga.get_space_group_symbol(),
+        "crystal_system": sga.get_crystal_system(),
+        **arrays,
+    }
+
+
+def to_symmetrized_structure(
+    structure: Structure, info: Optional[dict]
+) -> Optional[SymmetrizedStructure]:
+    """Rebuild a :class:`SymmetrizedStructure` from :func:`get_symmetry_info` output.
+
+    Equivalent to :func:`SpacegroupAnalyzer.get_symmetrized_structure` without
+    rerunning the symmetry analysis.
+    """
+    if info is None:
+        return None
+    symmops = [
+        SymmOp.from_rotation_and_translation(rot, trans)
+        for rot, trans in zip(info["rotations"], info["translations"])
+    ]
+    spacegroup = SpacegroupOperations(
+        info["spacegroup_symbol"], info["spacegroup_number"], symmops
+    )
+    return SymmetrizedStructure(
+        structure, spacegroup, info["equivalent_atoms"], info["wyckoffs"]
+    )
+
+
+def get_symmetry_infos(
+    structures: Sequence[Structure], symprec: float = 0.1, n_jobs: Optional[int] = None
+) -> List[Optional[dict]]:
+    """Compute :func:`get_symmetry_info` for many structures across a process pool."""
+    return parallel_map(
+        partial(get_symmetry_info, symprec=symprec),
+        structures,
+        n_jobs=n_jobs,
+    )
+
+
+def load_or_compute_symmetry(
+    structures: pd.Series,
+    data_path: Optional[str] = None,
+    checksum: Optional[str] = None,
+    symprec: float = 0.1,
+    n_jobs: Optional[int] = None,
+) -> pd.DataFrame:
+    """Load symmetry info stored next to a snapshot, computing and storing if absent.
+
+    Parameters
+    ----------
+    structures : pd.Series
+        Structures of the snapshot, e.g. ``mpt.data.structure``.
+    data_path : Optional[str]
+        Path to the snapshot. If None (e.g. for freshly fetched data), symmetry info
+        is computed but not stored. By default None.
+    checksum : Optional[str]
+        Checksum of the snapshot, by default None.
+    symprec : float
+        See :func:`get_symmetry_info`, by default 0.1.
+    n_jobs : Optional[int]
+        See :func:`parallel_map`, by default None.
+
+    Returns
+    -------
+    pd.DataFrame
+        DataFrame with the same index as ``structures`` and :data:`SYMMETRY_COLUMNS`
+        as columns.
+    """
+    stored = load_or_compute_sidecar(
+        lambda: {
+            "index": structures.index.tolist(),
+            "symmetry": get_symmetry_infos(
+                structures.tolist(), symprec=symprec, n_jobs=n_jobs
+            ),
+        },
+        data_path,
+        checksum,
+        "symmetry",
+        symprec=symprec,
+    )
+    infos = pd.Series(stored["symmetry"], index=stored["index"])
+    infos = infos.loc[structures.index].tolist()
+
+    return pd.DataFrame(
+        [
+            [
+                None if info is None else info["spacegroup_number"],
+                None if info is None else info["spacegroup_symbol"],
+                None if info is None else info["crystal_system"],
+                to_symmetrized_structure(structure, info),
+            ]
+            for structure, info in zip(structures, infos)
+        ],
+        index=structures.index,
+        columns=SYMMETRY_COLUMNS,
+    )
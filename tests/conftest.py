@@ -7,4 +7,102 @@
     - https://docs.pytest.org/en/stable/writing_plugins.html
 """
 
-# import pytest
+from os import path
+from types import SimpleNamespace
+
+import pytest
+from matminer.utils.io import load_dataframe_from_json
+
+from mp_time_split.core import get_data_home
+from mp_time_split.utils.data import DUMMY_SNAPSHOT_NAME
+
+
+class _DummyRoute:
+    def __init__(self, docs):
+        self.docs = docs
+        self.requested_ids = []
+
+    def search(
+        self, num_sites=None, num_elements=None, material_ids=None, **search_kwargs
+    ):
+        docs = self.docs
+        if num_sites is not None:
+            docs = [d for d in docs if num_sites[0] <= d.nsites <= num_sites[1]]
+        if num_elements is not None:
+            docs = [
+                d for d in docs if num_elements[0] <= d.nelements <= num_elements[1]
+            ]
+        if material_ids is not None:
+            self.requested_ids.extend(material_ids)
+            docs = [d for d in docs if d.material_id in material_ids]
+        return docs
+
+    def get_data_by_id(self, material_id):
+        return next(d for d in self.docs if d.material_id == material_id)
+
+    def count(self):
+        return 10 * len(self.docs)
+
+
+class DummyClient:
+    """Offline client serving the dummy snapshot plus a few theoretical entries."""
+
+    def __init__(self):
+        df = load_dataframe_from_json(
+            path.join(get_data_home(), DUMMY_SNAPSHOT_NAME), pbar=False
+        )
+        summary = []
+        provenance = []
+        for i, (_, row) in enumerate(df.iterrows()):
+            for theoretical in [False, True]:
+                mid = row.material_id if not theoretical else f"mvc-{i}"
+                summary.append(
+                    SimpleNamespace(
+                        structure=row.structure,
+                        material_id=mid,
+                        theoretical=theoretical,
+                        energy_above_hull=row.energy_above_hull,
+                        formation_energy_per_atom=row.formation_energy_per_atom,
+                        nsites=len(row.structure),
+                        nelements=len(row.structure.composition),
+                        last_updated="2022-01-01 00:00:00",
+                    )
+                )
+                provenance.append(
+                    SimpleNamespace(
+                        material_id=mid,
+                        references=row.references if not theoretical else [],
+                    )
+                )
+        self.summary = _DummyRoute(summary)
+        self.provenance = _DummyRoute(provenance)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+@pytest.fixture
+def dummy_client():
+    return DummyClient()
+
+
+@pytest.fixture
+def dict_symmetry_datasets(monkeypatch):
+    """Call to make symmetry datasets dicts, as in older spglib/pymatgen versions."""
+    from pymatgen.symmetry.analyzer import SpacegroupAnalyzer
+
+    get_symmetry_dataset = SpacegroupAnalyzer.get_symmetry_dataset
+
+    def get_dict_dataset(self):
+        dataset = get_symmetry_dataset(self)
+        return dataset if isinstance(dataset, dict) else dict(vars(dataset))
+
+    def use_dict_datasets():
+        monkeypatch.setattr(
+            SpacegroupAnalyzer, "get_symmetry_dataset", get_dict_dataset
+        )
+
+    return use_dict_datasets
@@ -1,17 +1,36 @@
+import json
+import subprocess
 import sys
-from os import path
+import threading
+from os import listdir, path
+from pathlib import Path
+from shutil import copy
+from types import SimpleNamespace
 
+import numpy as np
+import pandas as pd
 import pytest
 from matminer.utils.io import load_dataframe_from_json
+from monty.serialization import loadfn
+from pymatgen.core import Lattice, Structure
+from pymatgen.symmetry.analyzer import SpacegroupAnalyzer
 
-from mp_time_split.core import MPTimeSplit, get_data_home
+from mp_time_split.core import MPTimeSplit, get_data_home, get_snapshot_path
 from mp_time_split.utils.data import DUMMY_SNAPSHOT_NAME
+from mp_time_split.utils.fingerprint import get_fingerprint
+from mp_time_split.utils.gen import DummyGenerator
+from mp_time_split.utils.graph import get_neighbor_list
+from mp_time_split.utils.match import get_rediscovery_counts
 
 dummy_data_path = path.join(get_data_home(), DUMMY_SNAPSHOT_NAME)
 
 num_sites = (1, 2)
 elements = ["V"]
 
+# seconds, measured in a fresh interpreter
+IMPORT_TIME_BUDGET = 1.0
+HEAVY_MODULES = ["pandas", "pybtex", "matminer", "sklearn", "pymatgen", "pyxtal"]
+
 
 # def test_data_snapshot():
 #     dummy_expt_df_check = load_dataframe_from_json(dummy_data_path)
@@ -69,6 +88,1125 @@ def test_load():
     return data
 
 
+@pytest.mark.parametrize("n_jobs", [1, 2])
+def test_get_rediscovery_counts(n_jobs):
+    mpt = MPTimeSplit(num_sites=num_sites, elements=elements)
+    mpt.load(dummy=True)
+    _, test_inputs, _, _ = mpt.get_test_data()
+    candidates = [s.copy() for s in test_inputs]
+    for s in candidates:
+        s.perturb(0.01)
+    candidates.append(
+        Structure(Lattice.cubic(4.0), ["Ba", "O"], [[0, 0, 0], [0.5] * 3])
+    )
+    counts = get_rediscovery_counts(mpt, candidates, n_jobs=n_jobs)
+    test_counts = counts[counts.fold == "test"]
+    assert test_counts.num_matched.sum() == len(test_inputs)
+    assert test_counts.num_references.sum() == len(test_inputs)
+    assert set(counts.fold) == set(mpt.folds + ["test"])
+
+
+def test_get_bucket_key(monkeypatch, dict_symmetry_datasets):
+    from mp_time_split.utils.match import RediscoveryMatcher, get_bucket_key
+
+    s = Structure(Lattice.cubic(3.0), ["V", "N"], [[0, 0, 0], [0.5, 0.5, 0.5]])
+    key = get_bucket_key(s * (2, 1, 1))
+    assert key == ("VN", 221, 2)
+
+    dict_symmetry_datasets()
+    assert get_bucket_key(s * (2, 1, 1)) == key
+
+    # failed symmetry analysis falls back to the formula bucket, other errors raise
+    def fail(error):
+        def get_symmetry_dataset(self):
+            raise error
+
+        monkeypatch.setattr(
+            SpacegroupAnalyzer, "get_symmetry_dataset", get_symmetry_dataset
+        )
+
+    fail(ValueError("Symmetry detection failed"))
+    assert get_bucket_key(s) == ("VN", None, None)
+    fail(AttributeError("number"))
+    with pytest.raises(AttributeError):
+        get_bucket_key(s)
+
+    with pytest.raises(ValueError, match="allow_subset"):
+        RediscoveryMatcher([s], allow_subset=True)
+    RediscoveryMatcher([s], symprec=None, ltol=0.3, primitive_cell=True)
+
+
+@pytest.fixture
+def dummy_save_dir(tmp_path):
+    # copy the packaged dummy snapshot to avoid writing derived files into the package
+    copy(dummy_data_path + ".gz", tmp_path)
+    return str(tmp_path)
+
+
+def test_get_fingerprint():
+    s = Structure(Lattice.cubic(3.0), ["V", "N"], [[0, 0, 0], [0.5, 0.5, 0.5]])
+    supercell = s * (2, 1, 1)
+    supercell.perturb(0.001)
+    assert get_fingerprint(s) == get_fingerprint(supercell)
+    rocksalt = Structure.from_spacegroup(
+        "Fm-3m", Lattice.cubic(4.1), ["V", "N"], [[0, 0, 0], [0.5, 0.5, 0.5]]
+    )
+    assert get_fingerprint(s) != get_fingerprint(rocksalt)
+
+
+def test_get_fingerprint_dataset(monkeypatch, dict_symmetry_datasets):
+    s = Structure(Lattice.cubic(3.0), ["V", "N"], [[0, 0, 0], [0.5, 0.5, 0.5]])
+    fingerprint = get_fingerprint(s)
+    dict_symmetry_datasets()
+    assert get_fingerprint(s) == fingerprint
+
+    # errors other than failed symmetry detection are not treated as P1
+    monkeypatch.setattr(SpacegroupAnalyzer, "get_symmetry_dataset", lambda self: {})
+    with pytest.raises(KeyError):
+        get_fingerprint(s)
+
+
+def test_get_leakage_report(dummy_save_dir):
+    mpt = MPTimeSplit(save_dir=dummy_save_dir)
+    mpt.load(dummy=True)
+    fingerprints = mpt.get_fingerprints()
+    assert len(fingerprints) == len(mpt.data)
+    assert any("fingerprint" in fname for fname in listdir(dummy_save_dir))
+
+    train_index, val_index = mpt.trainval_splits[0]
+    mpt.data.loc[mpt.data.index[val_index[0]], "fingerprint"] = fingerprints.iloc[
+        train_index[0]
+    ]
+    report = mpt.get_leakage_report(0)
+    leaked = report.loc[fingerprints.iloc[train_index[0]]]
+    assert mpt.data.material_id.iloc[val_index[0]] in leaked["val"]
+    assert mpt.data.material_id.iloc[train_index[0]] in leaked["train"]
+    assert list(mpt.get_leakage_report("test").columns) == ["train", "test"]
+
+
+def test_load_symmetry(dummy_save_dir):
+    mpt = MPTimeSplit(save_dir=dummy_save_dir)
+    data = mpt.load(dummy=True, symprec=0.1)
+    assert data.spacegroup_number.iloc[0] == 229
+    sym_struct = data.symmetrized_structure.iloc[0]
+    sga = SpacegroupAnalyzer(data.structure.iloc[0], symprec=0.1)
+    assert sym_struct.wyckoff_symbols == sga.get_symmetrized_structure().wyckoff_symbols
+    assert any("symmetry" in fname for fname in listdir(dummy_save_dir))
+
+    # second load attaches the stored result
+    mpt = MPTimeSplit(save_dir=dummy_save_dir)
+    cached = mpt.load(dummy=True, symprec=0.1)
+    assert cached.spacegroup_symbol.equals(data.spacegroup_symbol)
+
+
+def test_get_symmetry_info(monkeypatch, dict_symmetry_datasets):
+    from mp_time_split.utils.symmetry import get_symmetry_info
+
+    s = Structure(Lattice.cubic(3.0), ["V", "N"], [[0, 0, 0], [0.5, 0.5, 0.5]])
+    info = get_symmetry_info(s)
+    assert info["spacegroup_number"] == 221
+    dict_symmetry_datasets()
+    assert get_symmetry_info(s) == info
+
+    def fail(self):
+        raise ValueError("Symmetry detection failed")
+
+    monkeypatch.setattr(SpacegroupAnalyzer, "get_symmetry_dataset", fail)
+    assert get_symmetry_info(s) is None
+    # errors other than failed symmetry detection are raised
+    monkeypatch.setattr(SpacegroupAnalyzer, "get_symmetry_dataset", lambda self: {})
+    with pytest.raises(KeyError):
+        get_symmetry_info(s)
+
+
+def test_dummy_generator_batches(tmp_path):
+    gen = DummyGenerator(
+        compositions=[(["Ba", "Ti", "O"], [1, 1, 3]), (["Sr", "O"], [1, 1])],
+        spacegroups=[99, 221],
+        seed=42,
+    )
+    batches = list(gen.gen_batches(6, batch_size=4, n_jobs=2, save_dir=str(tmp_path)))
+    assert [len(batch) for batch in batches] == [4, 2]
+    assert len(listdir(tmp_path)) == 2
+
+    # reproducible regardless of the number of workers
+    serial = [s for batch in gen.gen_batches(6, batch_size=4) for s in batch]
+    assert serial == [s for batch in batches for s in batch]
+
+    fpaths = gen.gen_to_disk(3, str(tmp_path / "disk"), batch_size=2)
+    assert len(fpaths) == 2
+    assert len(loadfn(fpaths[0])) == 2
+
+
+def test_gen_batch_errors(monkeypatch):
+    from pyxtal import pyxtal
+    from pyxtal.msg import Comp_CompatibilityError
+
+    from mp_time_split.utils.gen import _gen_batch
+
+    grid = [(["Ba", "Ti", "O"], [1, 1, 3], 99)]
+
+    def incompatible(self, *args, **kwargs):
+        raise Comp_CompatibilityError("incompatible")
+
+    # generation failures are retried, up to `max_attempts`
+    monkeypatch.setattr(pyxtal, "from_random", incompatible)
+    with pytest.raises(RuntimeError, match="3 attempts"):
+        _gen_batch((0, 1, grid, 0, 3, None, True))
+
+    def broken(self, *args, **kwargs):
+        raise TypeError("unexpected keyword argument")
+
+    # anything else, e.g. an API change, is not hidden
+    monkeypatch.setattr(pyxtal, "from_random", broken)
+    with pytest.raises(TypeError):
+        _gen_batch((0, 1, grid, 0, 3, None, True))
+
+
+def test_neighbor_graphs(dummy_save_dir):
+    mpt = MPTimeSplit(save_dir=dummy_save_dir)
+    mpt.load(dummy=True)
+    graphs = mpt.get_neighbor_graphs(cutoff=4.0, max_num_nbr=6, n_jobs=2)
+    assert len(graphs) == len(mpt.data)
+    assert any(fname.endswith(".npz") for fname in listdir(dummy_save_dir))
+
+    _, val_graphs = mpt.get_train_and_val_graphs(0)
+    _, val_inputs, _, _ = mpt.get_train_and_val_data(0)
+    assert list(val_graphs.index) == list(val_inputs.index)
+    center, neighbor, image, distance = get_neighbor_list(
+        val_inputs.iloc[0], cutoff=4.0, max_num_nbr=6
+    )
+    np.testing.assert_array_equal(val_graphs[0]["neighbor"], neighbor)
+    np.testing.assert_allclose(val_graphs[0]["distance"], distance)
+    assert np.bincount(center).max() <= 6
+
+    # second call loads the stored neighbor lists
+    mpt = MPTimeSplit(save_dir=dummy_save_dir)
+    mpt.load(dummy=True)
+    mpt.get_neighbor_graphs(cutoff=4.0, max_num_nbr=6)
+    _, test_graphs = mpt.get_test_graphs()
+    _, test_inputs, _, _ = mpt.get_test_data()
+    assert list(test_graphs.index) == list(test_inputs.index)
+
+    # reloading with other filters discards the neighbor lists of the old selection
+    mpt.num_sites = (2, 2)
+    mpt.load(dummy=True)
+    with pytest.raises(NameError):
+        mpt.get_train_and_val_graphs(0)
+    with pytest.raises(NameError):
+        mpt.get_test_graphs()
+
+    # a stored file not covering the requested entries is an error
+    from mp_time_split.utils.graph import load_or_compute_neighbor_graphs
+
+    structures = mpt.data.structure.copy()
+    structures.index = structures.index + 1000
+    with pytest.raises(KeyError):
+        load_or_compute_neighbor_graphs(
+            structures, mpt.data_path, mpt.checksum, cutoff=4.0, max_num_nbr=6
+        )
+
+
+@pytest.mark.skipif(sys.version_info < (3, 8), reason="requires Python 3.8+")
+@pytest.mark.parametrize(
+    "fetch_kwargs",
+    [
+        dict(provenance_mode="bulk"),
+        dict(provenance_mode="targeted", partition_by="num_sites", num_partitions=2),
+        dict(partition_by="num_elements", num_partitions=2),
+        dict(one_by_one=True, max_workers=2),
+    ],
+)
+def test_fetch_data_record_replay(dummy_client, tmp_path, fetch_kwargs):
+    from mp_time_split.utils.api import RecordingClient, ReplayClient, fetch_data
+
+    record_dir = str(tmp_path)
+    expt_df = fetch_data(
+        num_sites=num_sites,
+        elements=elements,
+        client=RecordingClient(dummy_client, record_dir),
+        **fetch_kwargs,
+    )
+    dummy_expt_df_check = load_dataframe_from_json(dummy_data_path)
+    assert expt_df.sort_index().compare(dummy_expt_df_check.sort_index()).empty
+
+    replayed_df = fetch_data(
+        num_sites=num_sites,
+        elements=elements,
+        client=ReplayClient(record_dir, latency=0.01),
+        **fetch_kwargs,
+    )
+    assert replayed_df.compare(expt_df).empty
+    assert list(replayed_df.index) == list(expt_df.index)
+
+
+def test_cli_prefetch_args(dummy_save_dir, tmp_path, capsys):
+    from mp_time_split.core import main
+
+    empty_dir = tmp_path / "empty"
+    empty_dir.mkdir()
+
+    main(["-s", dummy_save_dir, "prefetch", "--dummy"])
+    checksum = capsys.readouterr().out.strip()
+    # an existing snapshot is only verified
+    main(["-s", dummy_save_dir, "prefetch", "--dummy", "--checksum", checksum])
+    assert capsys.readouterr().out.strip() == checksum
+
+    for args in [
+        ["prefetch", "--dummy", "--url", "file:///dev/null"],
+        ["prefetch", "--dummy", "--checksum", checksum],
+        ["prefetch", "--dummy", "--checksum", checksum, "--force"],
+    ]:
+        save_dir = dummy_save_dir if "--force" in args else str(empty_dir)
+        with pytest.raises(SystemExit) as excinfo:
+            main(["-s", save_dir, *args])
+        assert excinfo.value.code == 2
+        assert "--url" in capsys.readouterr().err
+    assert not listdir(empty_dir)
+
+
+@pytest.mark.parametrize("fmt", ["npy", "txt"])
+def test_cli_export(dummy_save_dir, fmt, capsys):
+    from mp_time_split.core import main
+    from mp_time_split.utils.constants import AVAILABLE_MODES, TEST_FOLD
+    from mp_time_split.utils.export import load_split_indices
+
+    main(["-s", dummy_save_dir, "prefetch", "--dummy"])
+    checksum = capsys.readouterr().out.strip()
+    main(["-s", dummy_save_dir, "verify", "--dummy", "--checksum", checksum])
+    with pytest.raises(ValueError):
+        main(["-s", dummy_save_dir, "verify", "--dummy", "--checksum", "0" * 32])
+
+    main(["-s", dummy_save_dir, "export", "--dummy", "--format", fmt])
+    export_dir = path.join(dummy_save_dir, "splits")
+    for mode in AVAILABLE_MODES:
+        mpt = MPTimeSplit(save_dir=dummy_save_dir, mode=mode)
+        mpt.load(dummy=True)
+        splits = dict(zip(mpt.folds, mpt.trainval_splits))
+        splits[TEST_FOLD] = mpt.test_split
+        for fold, (train_index, held_out_index) in splits.items():
+            train, held_out = load_split_indices(export_dir, mode=mode, fold=fold)
+            np.testing.assert_array_equal(train, train_index)
+            np.testing.assert_array_equal(held_out, held_out_index)
+            _, held_out_mid = load_split_indices(
+                export_dir, mode=mode, fold=fold, material_id=True
+            )
+            assert list(held_out_mid) == list(
+                mpt.data.material_id.iloc[held_out_index].astype(str)
+            )
+
+
+def _summarize_fold(snapshot, fold):
+    if fold == "test":
+        _, inputs, _, outputs = snapshot.get_test_data()
+    else:
+        _, inputs, _, outputs = snapshot.get_train_and_val_data(fold)
+    return [s.composition.reduced_formula for s in inputs], outputs.tolist()
+
+
+@pytest.mark.skipif(sys.version_info < (3, 8), reason="requires Python 3.8+")
+def test_shared_memory(dummy_save_dir):
+    from concurrent.futures import ProcessPoolExecutor
+
+    mpt = MPTimeSplit(save_dir=dummy_save_dir)
+    mpt.load(dummy=True)
+    folds = list(mpt.folds) + ["test"]
+    with mpt.to_shared_memory() as snapshot:
+        assert "material_id" in snapshot.columns
+        assert list(snapshot.index) == list(mpt.data.index)
+        structure, expected = snapshot.inputs[-1], mpt.inputs.iloc[-1]
+        assert structure.species == expected.species
+        np.testing.assert_allclose(structure.lattice.matrix, expected.lattice.matrix)
+        np.testing.assert_allclose(structure.frac_coords, expected.frac_coords)
+        with ProcessPoolExecutor(max_workers=2) as executor:
+            summaries = list(executor.map(_summarize_fold, [snapshot] * 6, folds))
+
+    for fold, (formulas, outputs) in zip(folds, summaries):
+        if fold == "test":
+            _, inputs, _, expected_outputs = mpt.get_test_data()
+        else:
+            _, inputs, _, expected_outputs = mpt.get_train_and_val_data(fold)
+        assert formulas == [s.composition.reduced_formula for s in inputs]
+        np.testing.assert_allclose(outputs, expected_outputs)
+
+
+@pytest.mark.parametrize("executor", ["thread", "process", "file_queue"])
+def test_evaluate_folds(dummy_save_dir, tmp_path, executor):
+    from sklearn.dummy import DummyRegressor
+    from sklearn.metrics import mean_absolute_error
+
+    from mp_time_split.utils.evaluate import evaluate_folds
+    from mp_time_split.utils.file_queue import FileQueueExecutor, run_file_queue_worker
+
+    mpt = MPTimeSplit(save_dir=dummy_save_dir)
+    mpt.load(dummy=True)
+    folds = list(mpt.folds) + ["test"]
+    if executor == "file_queue":
+        queue_dir = str(tmp_path / "queue")
+        executor = FileQueueExecutor(queue_dir, poll_interval=0.01)
+        worker = threading.Thread(
+            target=run_file_queue_worker,
+            args=(queue_dir,),
+            kwargs=dict(poll_interval=0.01, max_tasks=len(folds)),
+        )
+        worker.start()
+        scores = evaluate_folds(
+            mpt, DummyRegressor, mean_absolute_error, executor=executor
+        )
+        worker.join()
+        executor.shutdown()
+    else:
+        scores = evaluate_folds(
+            mpt, DummyRegressor, mean_absolute_error, executor=executor
+        )
+
+    assert list(scores.index) == folds
+    for fold in folds:
+        if fold == "test":
+            train_inputs, inputs, train_outputs, outputs = mpt.get_test_data()
+        else:
+            train_inputs, inputs, train_outputs, outputs = mpt.get_train_and_val_data(
+                fold
+            )
+        predictions = DummyRegressor().fit(train_inputs, train_outputs).predict(inputs)
+        assert scores.loc[fold, "score"] == mean_absolute_error(outputs, predictions)
+        assert scores.loc[fold, "num_held_out"] == len(inputs)
+
+
+def test_instrumentation(dummy_save_dir, dummy_client, tmp_path):
+    from mp_time_split.utils.instrument import collect
+
+    with collect(trace_memory=True) as collector:
+        mpt = MPTimeSplit(save_dir=dummy_save_dir)
+        mpt.load(dummy=True)
+        if sys.version_info >= (3, 8):
+            from mp_time_split.utils.api import fetch_data
+
+            fetch_data(provenance_mode="targeted", client=dummy_client)
+
+    summary = collector.summary()
+    assert summary["decode"]["items"] == len(mpt.data)
+    assert summary["verify"]["bytes"] == path.getsize(mpt.data_path)
+    assert summary["split"]["count"] == 1
+    assert all(r["wall_time"] >= 0 and "peak_memory" in r for r in collector.records)
+    if sys.version_info >= (3, 8):
+        assert summary["bibtex_parse"]["items"] == len(mpt.data)
+        assert summary["provenance_fetch"]["items"] == len(mpt.data)
+        assert summary["request"]["count"] >= 2
+
+    fpath = str(tmp_path / "metrics.json")
+    collector.to_json(fpath)
+    with open(fpath) as f:
+        assert json.load(f)["summary"] == json.loads(json.dumps(summary))
+
+
+def test_load_compact(dummy_save_dir):
+    from mp_time_split.utils.compact import to_material_id_str
+
+    mpt = MPTimeSplit(save_dir=dummy_save_dir)
+    data = mpt.load(dummy=True)
+    compact_mpt = MPTimeSplit(save_dir=dummy_save_dir)
+    compact_data = compact_mpt.load(dummy=True, compact=True)
+
+    assert str(compact_data.year.dtype) == "Int16"
+    assert compact_data.energy_above_hull.dtype == np.float32
+    assert compact_data.theoretical.dtype == bool
+    assert compact_data.material_id.dtype == np.int32
+    assert to_material_id_str(compact_data.material_id) == list(data.material_id)
+    assert list(compact_data.year) == list(data.year)
+    np.testing.assert_allclose(
+        compact_data.formation_energy_per_atom, data.formation_energy_per_atom, 1e-6
+    )
+    columns = ["material_id", "theoretical", "energy_above_hull", "year"]
+    assert (
+        compact_data[columns].memory_usage(deep=True).sum()
+        < data[columns].memory_usage(deep=True).sum() / 2
+    )
+    for fold in mpt.folds:
+        np.testing.assert_array_equal(
+            compact_mpt.trainval_splits[fold][1], mpt.trainval_splits[fold][1]
+        )
+
+
+def test_normalize_references(dummy_save_dir, tmp_path):
+    from mp_time_split.utils.references import denormalize_references
+    from mp_time_split.utils.snapshot import read_snapshot, write_snapshot
+
+    mpt = MPTimeSplit(save_dir=dummy_save_dir)
+    data = mpt.load(dummy=True)
+    assert mpt.reference_table is None
+    normalized_mpt = MPTimeSplit(save_dir=dummy_save_dir)
+    normalized_data = normalized_mpt.load(dummy=True, normalize_references=True)
+    table = normalized_mpt.reference_table
+
+    assert "references" not in normalized_data and "discovery" not in normalized_data
+    assert len(table) == len(data)
+    assert len(table.references) <= sum(len(refs) for refs in data.references)
+    pd.testing.assert_frame_equal(denormalize_references(normalized_data, table), data)
+
+    fpath = str(tmp_path / "snapshot.json.gz")
+    plain_fpath = str(tmp_path / "plain_snapshot.json.gz")
+    write_snapshot(data, fpath, normalize=True)
+    write_snapshot(data, plain_fpath)
+    assert path.getsize(fpath) < path.getsize(plain_fpath)
+    check_data, check_table = read_snapshot(fpath)
+    assert check_table is not None
+    pd.testing.assert_frame_equal(denormalize_references(check_data, check_table), data)
+
+
+def test_snapshot_store(dummy_save_dir):
+    from mp_time_split.utils.instrument import collect
+    from mp_time_split.utils.store import SnapshotStore
+
+    mpt = MPTimeSplit(save_dir=dummy_save_dir)
+    data = mpt.load(dummy=True, store=True)
+    # loaded from the store without the snapshot file
+    Path(get_snapshot_path(dummy_save_dir, dummy=True)).unlink()
+    store_mpt = MPTimeSplit(save_dir=dummy_save_dir)
+    pd.testing.assert_frame_equal(store_mpt.load(dummy=True, store=True), data)
+    assert store_mpt.checksum == mpt.checksum
+
+    # a new version sharing all but one entry only writes that entry
+    store = SnapshotStore(path.join(dummy_save_dir, "store"))
+    new_data = data.iloc[1:].copy()
+    new_data.iloc[0, new_data.columns.get_loc("energy_above_hull")] += 1.0
+    with collect() as collector:
+        version = store.add(new_data)
+    assert collector.records[0]["written"] == 1
+    assert sorted(store.versions()) == sorted([mpt.checksum, version])
+    pd.testing.assert_frame_equal(store.load(version, n_jobs=2), new_data)
+
+    store.remove(version)
+    assert store.gc() == 1
+    assert "dummy" in store and version not in store
+
+
+def test_encode_entry_version(monkeypatch):
+    import pymatgen
+    from monty.json import MontyDecoder
+
+    from mp_time_split.utils.store import _encode_entry
+
+    s = Structure(Lattice.cubic(3.0), ["V", "N"], [[0, 0, 0], [0.5, 0.5, 0.5]])
+    key, data = _encode_entry({"structure": s})
+    assert b"@version" not in data
+    assert json.loads(data, cls=MontyDecoder)["structure"] == s
+    # a new pymatgen version doesn't change the key of an identical entry
+    monkeypatch.setattr(pymatgen, "__version__", "0.0.0", raising=False)
+    assert _encode_entry({"structure": s}) == (key, data)
+
+
+@pytest.mark.parametrize(
+    "filters",
+    [
+        dict(num_sites=(2, 2)),
+        dict(elements=["V"], exclude_elements=["N", "C"]),
+        dict(exclude_elements="noble+radioactive"),
+    ],
+)
+def test_load_filtered(dummy_save_dir, filters):
+    from mp_time_split.utils.data import get_excluded_elements
+
+    data = MPTimeSplit(save_dir=dummy_save_dir).load(dummy=True)
+    mpt = MPTimeSplit(save_dir=dummy_save_dir, **filters)
+    filtered_data = mpt.load(dummy=True)
+
+    lo, hi = filters.get("num_sites", (0, np.inf))
+    elements = set(filters.get("elements", []))
+    excluded = set(get_excluded_elements(filters.get("exclude_elements")) or [])
+
+    def matches(s):
+        symbols = {e.symbol for e in s.composition.elements}
+        return lo <= len(s) <= hi and elements <= symbols and not excluded & symbols
+
+    expected = data[data.structure.apply(matches)]
+    assert 0 < len(filtered_data)
+    assert list(filtered_data.material_id) == list(expected.material_id)
+    assert filtered_data.year.is_monotonic_increasing
+    assert len(mpt.test_split[1]) + len(mpt.test_split[0]) == len(filtered_data)
+    # the index is stored next to the snapshot and reused
+    assert any("_index_" in name for name in listdir(dummy_save_dir))
+    check_data = MPTimeSplit(save_dir=dummy_save_dir, **filters).load(dummy=True)
+    pd.testing.assert_frame_equal(check_data, filtered_data)
+
+
+def test_load_default_cache_dir(tmp_path, monkeypatch):
+    from mp_time_split.core import get_cache_home
+
+    cache_dir = tmp_path / "cache"
+    monkeypatch.setenv("MP_TIME_CACHE", str(cache_dir))
+    data_home_files = sorted(listdir(get_data_home()))
+    mpt = MPTimeSplit(num_sites=num_sites, elements=elements)
+    assert mpt.cache_dir == get_cache_home() == str(cache_dir)
+    mpt.load(dummy=True)
+    mpt.get_symmetry()
+    # derived files go to the cache, never into the package data directory
+    assert sorted(listdir(get_data_home())) == data_home_files
+    assert any("_index_" in name for name in listdir(cache_dir))
+    assert any("_symmetry_" in name for name in listdir(cache_dir))
+
+
+def test_load_filtered_read_only(dummy_save_dir, monkeypatch):
+    from mp_time_split.utils.query import SnapshotIndex
+
+    def save(self, fpath):
+        raise PermissionError(f"read-only: {fpath}")
+
+    # e.g. the packaged dummy snapshot in a read-only install
+    monkeypatch.setattr(SnapshotIndex, "save", save)
+    mpt = MPTimeSplit(save_dir=dummy_save_dir, num_sites=(2, 2))
+    with pytest.warns(UserWarning, match="Could not store the index"):
+        data = mpt.load(dummy=True)
+    assert len(data) > 0 and (data.structure.apply(len) == 2).all()
+    assert not any("_index_" in name for name in listdir(dummy_save_dir))
+
+
+def test_snapshot_index():
+    from mp_time_split.utils.query import SnapshotIndex
+
+    structures = [
+        Structure(Lattice.cubic(3.0), ["V", "N"], [[0, 0, 0], [0.5, 0.5, 0.5]]),
+        Structure(Lattice.cubic(3.0), ["V"], [[0, 0, 0]]),
+        # elements in both words of the bitmask
+        Structure(
+            Lattice.cubic(3.0), ["U", "O", "O"], [[0, 0, 0], [0.5] * 3, [0.25] * 3]
+        ),
+    ]
+    index = SnapshotIndex.from_structures(structures)
+    np.testing.assert_array_equal(index.select(num_sites=(1, 2)), [1, 1, 0])
+    np.testing.assert_array_equal(index.select(elements=["V", "N"]), [1, 0, 0])
+    np.testing.assert_array_equal(index.select(elements=["U"]), [0, 0, 1])
+    np.testing.assert_array_equal(
+        index.select(exclude_elements="radioactive"), [1, 1, 0]
+    )
+    np.testing.assert_array_equal(
+        index.select(num_sites=(2, 3), exclude_elements=["N"]), [0, 0, 1]
+    )
+
+
+def test_block_snapshot(dummy_save_dir, tmp_path):
+    from mp_time_split.utils.blocks import (
+        is_block_snapshot,
+        read_block_snapshot,
+        write_block_snapshot,
+    )
+    from mp_time_split.utils.instrument import collect
+    from mp_time_split.utils.query import SnapshotIndex
+
+    data = MPTimeSplit(save_dir=dummy_save_dir).load(dummy=True)
+    fpath = str(tmp_path / "snapshot.blk")
+    footer = write_block_snapshot(data, fpath, block_size=2)
+    assert is_block_snapshot(fpath)
+    assert len(footer["blocks"]) == 6
+    pd.testing.assert_frame_equal(read_block_snapshot(fpath), data)
+
+    filters = dict(elements=["V", "N"])
+    with collect() as collector:
+        matching = read_block_snapshot(fpath, **filters)
+    (record,) = collector.records
+    assert record["blocks"] < record["total_blocks"]
+    expected = data[SnapshotIndex.from_structures(data.structure).select(**filters)]
+    pd.testing.assert_frame_equal(matching, expected)
+
+    years = (data.year.min(), data.year.median())
+    pd.testing.assert_frame_equal(
+        read_block_snapshot(fpath, years=years), data[data.year.between(*years)]
+    )
+
+    # the first load creates the block layout, which later loads read from
+    filters = dict(num_sites=(2, 2), exclude_elements=["N"])
+    mpt = MPTimeSplit(save_dir=dummy_save_dir, **filters)
+    filtered = mpt.load(dummy=True, block_size=3)
+    with collect() as collector:
+        check = MPTimeSplit(save_dir=dummy_save_dir, **filters).load(
+            dummy=True, block_size=3
+        )
+    decode_records = [r for r in collector.records if r["phase"] == "decode"]
+    assert decode_records[0]["total_blocks"] == 4
+    pd.testing.assert_frame_equal(check, filtered)
+
+
+@pytest.mark.parametrize("codec", ["raw", "gzip", "bgzf", "zstd"])
+@pytest.mark.parametrize("n_jobs", [None, 2])
+def test_codecs(codec, n_jobs):
+    import gzip
+
+    from mp_time_split.utils import codecs
+
+    if codec == "zstd":
+        pytest.importorskip("zstandard")
+    rng = np.random.default_rng(0)
+    # several blocks of partly compressible data
+    data = rng.integers(0, 16, 3 * codecs.BGZF_BLOCK_SIZE, dtype=np.uint8).tobytes()
+    compressed = codecs.compress(data, codec, n_jobs=n_jobs)
+    assert codecs.detect_codec(compressed[:64]) == codec
+    assert codecs.decompress(compressed, n_jobs=n_jobs) == data
+    if codec in ["gzip", "bgzf"]:
+        assert gzip.decompress(compressed) == data
+
+
+def test_load_bgzf(dummy_save_dir):
+    from mp_time_split.utils.instrument import collect
+    from mp_time_split.utils.snapshot import write_snapshot
+
+    data = MPTimeSplit(save_dir=dummy_save_dir).load(dummy=True)
+    # replace the snapshot with a BGZF-compressed one under the same name
+    write_snapshot(data, get_snapshot_path(dummy_save_dir, dummy=True), codec="bgzf")
+    with collect() as collector:
+        bgzf_data = MPTimeSplit(save_dir=dummy_save_dir).load(dummy=True, n_jobs=2)
+    (record,) = [r for r in collector.records if r["phase"] == "decompress"]
+    assert record["codec"] == "bgzf"
+    pd.testing.assert_frame_equal(bgzf_data, data)
+
+
+def test_aload(dummy_save_dir, tmp_path):
+    import asyncio
+    from hashlib import md5
+
+    from mp_time_split.utils.aio import LOADS
+    from mp_time_split.utils.instrument import collect
+
+    data = MPTimeSplit(save_dir=dummy_save_dir).load(dummy=True)
+
+    async def load_concurrently(mpts, **kwargs):
+        return await asyncio.gather(*(mpt.aload(**kwargs) for mpt in mpts))
+
+    mpts = [MPTimeSplit(save_dir=dummy_save_dir) for _ in range(3)]
+    with collect() as collector:
+        results = asyncio.run(load_concurrently(mpts, dummy=True))
+    # one load shared by all callers, each with its own frame
+    assert collector.summary()["decode"]["count"] == 1
+    assert len(LOADS) == 0
+    assert results[0] is not results[1]
+    for mpt, result in zip(mpts, results):
+        pd.testing.assert_frame_equal(result, data)
+        assert mpt.data is result
+        np.testing.assert_array_equal(mpt.test_split[1], mpts[0].test_split[1])
+
+    # streamed download with the checksum computed along the way
+    snapshot_path = get_snapshot_path(dummy_save_dir, dummy=True)
+    checksum = md5(Path(snapshot_path).read_bytes()).hexdigest()
+    mpt = MPTimeSplit(save_dir=str(tmp_path / "fresh"))
+    with collect() as collector:
+        result = asyncio.run(
+            mpt.aload(url=Path(snapshot_path).as_uri(), checksum=checksum)
+        )
+    assert "verify" not in collector.summary()
+    assert collector.summary()["download"]["bytes"] == path.getsize(snapshot_path)
+    assert mpt.checksum == checksum
+    pd.testing.assert_frame_equal(result, data)
+
+    # loads with different filters share the download into an empty directory
+    save_dir = str(tmp_path / "filtered")
+    mpts = [
+        MPTimeSplit(save_dir=save_dir, **filters)
+        for filters in [{}, dict(num_sites=(2, 2)), dict(exclude_elements="noble")]
+    ]
+    with collect() as collector:
+        results = asyncio.run(
+            load_concurrently(mpts, url=Path(snapshot_path).as_uri(), checksum=checksum)
+        )
+    assert collector.summary()["download"]["count"] == 1
+    assert not [name for name in listdir(save_dir) if name.endswith(".tmp")]
+    pd.testing.assert_frame_equal(results[0], data)
+    assert len(results[1]) < len(data)
+
+
+def test_phase_stack_async():
+    import asyncio
+
+    from mp_time_split.utils.instrument import _stack, collect, phase
+
+    async def nested(name):
+        with phase(name) as record:
+            await asyncio.sleep(0)
+            with phase("inner") as inner:
+                await asyncio.sleep(0)
+                assert _stack.get() == (record, inner)
+            await asyncio.sleep(0)
+            assert _stack.get() == (record,)
+
+    async def interleaved():
+        await asyncio.gather(nested("decode"), nested("filter"))
+
+    with collect() as collector:
+        asyncio.run(interleaved())
+    assert collector.summary()["inner"]["count"] == 2
+    assert _stack.get() == ()
+
+
+def test_afetch_data(dummy_client):
+    import asyncio
+
+    mpt = MPTimeSplit(num_sites=num_sites, elements=elements)
+    data = asyncio.run(mpt.afetch_data(client=dummy_client))
+    assert mpt.data is data and mpt.data_path is None
+    assert len(data) == len(mpt.test_split[0]) + len(mpt.test_split[1])
+
+
+def test_import_time():
+    code = (
+        "import sys, time\n"
+        "start = time.perf_counter()\n"
+        "import mp_time_split.core, mp_time_split.utils.export\n"
+        "import mp_time_split.utils.gen\n"
+        "elapsed = time.perf_counter() - start\n"
+        f"imported = [m for m in {HEAVY_MODULES} if m in sys.modules]\n"
+        "print(elapsed, *imported)\n"
+    )
+    # best of a few runs to be robust against a cold filesystem cache
+    timings = []
+    for _ in range(3):
+        result = subprocess.run(
+            [sys.executable, "-c", code], capture_output=True, text=True, check=True
+        )
+        elapsed, *imported = result.stdout.split()
+        assert not imported, f"heavy modules imported eagerly: {imported}"
+        timings.append(float(elapsed))
+    assert min(timings) < IMPORT_TIME_BUDGET
+
+
+def test_atomic_write(tmp_path):
+    from mp_time_split.utils.data import atomic_write
+
+    fpath = str(tmp_path / "out.bin")
+    with atomic_write(fpath) as f1, atomic_write(fpath) as f2:
+        f1.write(b"first")
+        f2.write(b"second")
+    assert Path(fpath).read_bytes() == b"first"
+    with pytest.raises(RuntimeError):
+        with atomic_write(fpath) as f:
+            f.write(b"partial")
+            raise RuntimeError
+    # the file is left as is and no temporary files remain
+    assert Path(fpath).read_bytes() == b"first"
+    assert listdir(tmp_path) == ["out.bin"]
+
+
+@pytest.mark.parametrize("n_jobs", [None, 2])
+def test_parallel_imap(n_jobs):
+    from mp_time_split.utils.parallel import parallel_imap, parallel_map
+
+    results = parallel_imap(abs, range(-5, 5), n_jobs=n_jobs)
+    # nothing is computed before the results are consumed
+    assert not isinstance(results, list)
+    assert list(results) == parallel_map(abs, range(-5, 5), n_jobs=n_jobs)
+    assert list(results) == []
+
+
+@pytest.mark.parametrize("n_jobs", [None, 2])
+def test_get_discovery_dict_fast(n_jobs):
+    from mp_time_split.utils.data import get_discovery_dict, scan_first_report
+
+    df = load_dataframe_from_json(dummy_data_path)
+    references = df.references.tolist()
+    assert all(scan_first_report(refs) is not None for refs in references)
+    assert get_discovery_dict(references, n_jobs=n_jobs, fast=True) == list(
+        df.discovery
+    )
+
+    # not handled by the scanner, falls back to pybtex
+    refs = ['@article{a,\n author = "{\\"O}zt{\\"u}rk, A.",\n year = "1999"\n}\n']
+    assert scan_first_report(refs) is None
+    assert get_discovery_dict([refs], fast=True) == get_discovery_dict([refs])
+
+
+def test_get_discovery_dict_cache(tmp_path, monkeypatch):
+    from mp_time_split.utils import data
+    from mp_time_split.utils.data import ReferenceCache, get_discovery_dict
+
+    df = load_dataframe_from_json(dummy_data_path)
+    references = df.references.tolist() * 2
+    cache_path = str(tmp_path / "reference_cache.json.gz")
+    cache = ReferenceCache(maxsize=5, cache_path=cache_path)
+    discovery = get_discovery_dict(references, cache=cache)
+    assert discovery == list(df.discovery) * 2
+    assert len(cache) == 5
+
+    # reloaded from disk, cached references are not parsed again
+    cache = ReferenceCache(cache_path=cache_path)
+    assert len(cache) == 5
+    parsed = []
+    parse = data._parse_first_report
+    monkeypatch.setattr(
+        data, "_parse_first_report", lambda refs: parsed.append(refs) or parse(refs)
+    )
+    assert get_discovery_dict(references, cache=cache) == discovery
+    assert len(parsed) == df.references.map(data.get_reference_key).nunique() - 5
+
+
+class _FlakyRoute:
+    """Route failing with `error` on its first `num_failures` calls."""
+
+    def __init__(self, route, num_failures=1, error=None):
+        from requests import ConnectionError
+
+        self.route = route
+        self.num_failures = num_failures
+        self.error = ConnectionError("connection reset") if error is None else error
+        self.num_calls = 0
+        self._lock = threading.Lock()
+
+    def __getattr__(self, name):
+        method = getattr(self.route, name)
+
+        def call(*args, **kwargs):
+            with self._lock:
+                self.num_calls += 1
+                fail = self.num_calls <= self.num_failures
+            if fail:
+                raise self.error
+            return method(*args, **kwargs)
+
+        return call
+
+
+@pytest.mark.skipif(sys.version_info < (3, 8), reason="requires Python 3.8+")
+@pytest.mark.parametrize(
+    "partition_kwargs",
+    [
+        dict(partition_by="num_sites", num_partitions=2),
+        dict(partition_by="num_sites", num_partitions=8),
+        dict(partition_by="num_elements", num_partitions=2),
+    ],
+)
+def test_search_summary(dummy_client, partition_kwargs):
+    from requests import HTTPError
+
+    from mp_time_split.utils.api import iter_search_summary, search_summary
+
+    search_kwargs = dict(num_sites=num_sites, elements=elements)
+    serial = dummy_client.summary.search(**search_kwargs)
+    partitioned = search_summary(
+        dummy_client, max_workers=3, **partition_kwargs, **search_kwargs
+    )
+    assert sorted(partitioned, key=lambda r: r.material_id) == sorted(
+        serial, key=lambda r: r.material_id
+    )
+    # streamed in completion order
+    streamed = iter_search_summary(
+        dummy_client, max_workers=3, **partition_kwargs, **search_kwargs
+    )
+    assert sorted(streamed, key=lambda r: r.material_id) == sorted(
+        serial, key=lambda r: r.material_id
+    )
+
+    # a failing sub-query is retried on its own
+    summary = dummy_client.summary
+    dummy_client.summary = _FlakyRoute(summary, num_failures=1)
+    retried = search_summary(
+        dummy_client, backoff=0, **partition_kwargs, **search_kwargs
+    )
+    assert retried == partitioned
+
+    # and fails the whole search once out of retries
+    dummy_client.summary = _FlakyRoute(summary, 10, HTTPError("503"))
+    with pytest.raises(HTTPError):
+        search_summary(
+            dummy_client, max_retries=1, backoff=0, **partition_kwargs, **search_kwargs
+        )
+
+
+@pytest.mark.skipif(sys.version_info < (3, 8), reason="requires Python 3.8+")
+@pytest.mark.parametrize("mode", ["auto", "bulk", "targeted"])
+def test_search_provenance(dummy_client, mode):
+    from requests import HTTPError
+
+    from mp_time_split.utils.api import search_provenance
+
+    docs = dummy_client.provenance.docs
+    # every other entry, in a different order than the documents
+    material_ids = [d.material_id for d in docs[::-2]]
+    serial = [dummy_client.provenance.get_data_by_id(mid) for mid in material_ids]
+    provenance = search_provenance(
+        dummy_client, material_ids, mode=mode, batch_size=3, max_workers=3
+    )
+    assert list(provenance.index) == material_ids
+    assert provenance.tolist() == serial
+    if mode != "bulk":
+        # "auto" is targeted since far fewer than all documents are needed
+        assert sorted(dummy_client.provenance.requested_ids) == sorted(material_ids)
+
+    # failing batches are retried on their own
+    route = dummy_client.provenance
+    dummy_client.provenance = _FlakyRoute(route, num_failures=2)
+    retried = search_provenance(
+        dummy_client, material_ids, mode="targeted", batch_size=3, backoff=0
+    )
+    assert retried.tolist() == serial
+
+    dummy_client.provenance = _FlakyRoute(route, 10, HTTPError("503"))
+    with pytest.raises(HTTPError):
+        search_provenance(
+            dummy_client, material_ids, mode="targeted", max_retries=1, backoff=0
+        )
+    # IDs without a provenance document are an error rather than silently dropped
+    dummy_client.provenance = route
+    with pytest.raises(KeyError):
+        search_provenance(dummy_client, material_ids + ["mp-0"], mode=mode)
+
+
+@pytest.mark.skipif(sys.version_info < (3, 8), reason="requires Python 3.8+")
+def test_fetch_data_columns(dummy_client):
+    from mp_time_split.utils.api import fetch_data, get_field_columns, take_columns
+
+    docs = dummy_client.summary.search(num_sites=num_sites)
+    fields = ["material_id", "theoretical", "energy_above_hull"]
+    # row by row, as before columnar assembly
+    rows = pd.DataFrame([{f: getattr(d, f) for f in fields} for d in docs])
+    columns = get_field_columns(docs, fields)
+    order = np.argsort(rows.energy_above_hull.values, kind="stable")[::-1]
+    take_columns(columns, order)
+    pd.testing.assert_frame_equal(
+        pd.DataFrame(columns), rows.iloc[order].reset_index(drop=True)
+    )
+
+    # all fields, missing ones filled with None
+    sparse = [SimpleNamespace(a=1), SimpleNamespace(b=2), SimpleNamespace(a=3, b=4)]
+    assert get_field_columns(sparse, None) == {"a": [1, None, 3], "b": [None, 2, 4]}
+    # projected fields must be present
+    with pytest.raises(AttributeError):
+        get_field_columns(sparse, ["a"])
+
+    expt_df, df = fetch_data(
+        fields=fields,
+        num_sites=num_sites,
+        client=dummy_client,
+        return_both_if_experimental=True,
+    )
+    rows.index = [
+        int(mid.replace("mp-", "").replace("mvc-", "-")) for mid in rows.material_id
+    ]
+    pd.testing.assert_frame_equal(df, rows.sort_index(kind="stable"))
+    # sorted by MPID, then stably by year
+    expected = load_dataframe_from_json(dummy_data_path)
+    expected = expected.sort_index(kind="stable").sort_values("year", kind="stable")
+    assert list(expt_df.index) == list(expected.index)
+    assert list(expt_df.material_id) == list(expected.material_id)
+    assert list(expt_df.year) == list(expected.year)
+    pd.testing.assert_frame_equal(
+        expt_df[fields].sort_index(), df.loc[expt_df.index, fields].sort_index()
+    )
+
+    # partitions streamed into the columns give the same frames
+    partitioned_expt_df, partitioned_df = fetch_data(
+        fields=fields,
+        num_sites=num_sites,
+        client=dummy_client,
+        return_both_if_experimental=True,
+        partition_by="num_sites",
+        num_partitions=2,
+        max_workers=2,
+    )
+    pd.testing.assert_frame_equal(partitioned_df, df)
+    pd.testing.assert_frame_equal(partitioned_expt_df, expt_df)
+
+
+@pytest.mark.skipif(sys.version_info < (3, 8), reason="requires Python 3.8+")
+def test_call_with_retry():
+    from requests import HTTPError
+
+    from mp_time_split.utils.api import call_with_retry
+    from mp_time_split.utils.instrument import collect
+
+    route = _FlakyRoute(SimpleNamespace(get=lambda x: x), num_failures=2)
+    with collect() as collector:
+        assert call_with_retry(route.get, 1, backoff=0) == 1
+    assert route.num_calls == 3
+    assert collector.records[0]["attempts"] == 3
+
+    route = _FlakyRoute(SimpleNamespace(get=lambda x: x), 5, HTTPError("503"))
+    with pytest.raises(HTTPError):
+        call_with_retry(route.get, 1, max_retries=2, backoff=0)
+    assert route.num_calls == 3
+
+    # programming errors are raised right away without any backoff
+    route = _FlakyRoute(SimpleNamespace(get=lambda x: x), 5, TypeError("bug"))
+    with pytest.raises(TypeError):
+        call_with_retry(route.get, 1, backoff=10.0)
+    assert route.num_calls == 1
+
+
+@pytest.mark.skipif(sys.version_info < (3, 8), reason="requires Python 3.8+")
+def test_get_provenance_one_by_one(dummy_client):
+    from mp_time_split.utils.api import fetch_data, get_provenance_one_by_one
+
+    material_ids = [d.material_id for d in dummy_client.provenance.docs]
+    serial = [dummy_client.provenance.get_data_by_id(mid) for mid in material_ids]
+    concurrent = get_provenance_one_by_one(dummy_client, material_ids, max_workers=4)
+    assert concurrent == serial
+
+    # transient errors are retried, the result is unaffected
+    provenance = dummy_client.provenance
+    dummy_client.provenance = _FlakyRoute(provenance, num_failures=3)
+    assert get_provenance_one_by_one(dummy_client, material_ids, backoff=0) == serial
+    assert dummy_client.provenance.num_calls == len(material_ids) + 3
+
+    dummy_client.provenance = provenance
+    expt_df = fetch_data(num_sites=num_sites, elements=elements, client=dummy_client)
+    dummy_client.provenance = _FlakyRoute(provenance, num_failures=2)
+    one_by_one_df = fetch_data(
+        num_sites=num_sites,
+        elements=elements,
+        client=dummy_client,
+        one_by_one=True,
+        max_workers=3,
+        backoff=0,
+    )
+    assert one_by_one_df.compare(expt_df).empty
+    assert list(one_by_one_df.index) == list(expt_df.index)
+
+    # other errors fail the whole fetch
+    dummy_client.provenance = _FlakyRoute(provenance, 1, KeyError("material_id"))
+    with pytest.raises(KeyError):
+        get_provenance_one_by_one(dummy_client, material_ids, backoff=10.0)
+
+
+@pytest.mark.skipif(sys.version_info < (3, 8), reason="requires Python 3.8+")
+def test_fetch_data_cache(dummy_client, tmp_path):
+    from mp_time_split.utils.api import fetch_data
+
+    cache_dir = str(tmp_path)
+    expt_df = fetch_data(
+        num_sites=num_sites, elements=elements, client=dummy_client, cache_dir=cache_dir
+    )
+    assert dummy_client.summary.requested_ids
+
+    # only new or changed entries are requested again
+    dummy_client.summary.requested_ids.clear()
+    dummy_client.provenance.requested_ids.clear()
+    changed = dummy_client.summary.docs[0]
+    changed.last_updated = "2023-01-01 00:00:00"
+    cached_df = fetch_data(
+        num_sites=num_sites, elements=elements, client=dummy_client, cache_dir=cache_dir
+    )
+    assert dummy_client.summary.requested_ids == [changed.material_id]
+    assert dummy_client.provenance.requested_ids in ([], [changed.material_id])
+    assert cached_df.compare(expt_df).empty
+
+    # documents cached for other criteria are not reused
+    dummy_client.summary.requested_ids.clear()
+    other_df = fetch_data(num_sites=(1, 1), client=dummy_client, cache_dir=cache_dir)
+    assert len(dummy_client.summary.requested_ids) == len(
+        dummy_client.summary.search(num_sites=(1, 1))
+    )
+    assert (other_df.structure.apply(len) == 1).all()
+
+
+@pytest.mark.skipif(sys.version_info < (3, 8), reason="requires Python 3.8+")
+def test_fetch_data_theoretical_none(dummy_client):
+    from mp_time_split.utils.api import fetch_data
+
+    # entries of unknown `theoretical` are not experimental, as in the baseline query
+    docs = dummy_client.summary.docs
+    docs[0].theoretical = None
+    expt_df, df = fetch_data(
+        num_sites=num_sites, client=dummy_client, return_both_if_experimental=True
+    )
+    assert str(docs[0].material_id) not in set(expt_df.material_id.apply(str))
+    assert set(expt_df.index) == set(df.query("theoretical == False").index)
+
+
 if __name__ == "__main__":
     # test_data_snapshot()
     test_data_snapshot_one_by_one()